@@ -0,0 +1,123 @@
+# apuracao_incremental.py
+import threading
+from armazenamento import executar_com_retentativa
+from verificacao_paralela import verificar_votos, item_de_voto, CONSULTA_VOTOS_COM_ELEITORES
+
+
+def criar_tabelas_apuracao(conn):
+    """Cria as tabelas materializadas da apuração incremental."""
+    # Contador de votos válidos por candidato, atualizado a cada voto verificado
+    conn.execute('''
+        CREATE TABLE IF NOT EXISTS apuracao_contagem (
+            candidato_id TEXT PRIMARY KEY,
+            votos INTEGER NOT NULL DEFAULT 0
+        )
+    ''')
+    # Votos descartados na verificação, para auditoria
+    conn.execute('''
+        CREATE TABLE IF NOT EXISTS apuracao_invalidos (
+            voto_id INTEGER PRIMARY KEY,
+            cpf TEXT NOT NULL,
+            nome TEXT NOT NULL,
+            motivo TEXT NOT NULL
+        )
+    ''')
+
+
+def processar_votos_pendentes(conn, num_workers=1, tamanho_lote=500):
+    """
+    Verifica os votos ainda não apurados, em lotes, e acumula o resultado nas
+    tabelas materializadas. As assinaturas são verificadas fora de qualquer
+    transação; só a gravação do resultado ocupa a trava de escrita, numa
+    transação curta que marca os votos como verificados. Um voto só é contado
+    por quem o marca (WHERE verificado = 0), de modo que nenhum voto é contado
+    duas vezes, nem mesmo com verificadores concorrentes.
+    Retorna a quantidade de votos processados.
+    """
+    def gravar_lote(conn, votos_pendentes, invalidos_por_cpf):
+        resultados = {}
+        invalidos = []
+        for voto_row in votos_pendentes:
+            # Verificado por outro verificador desde a leitura do lote: já foi contado
+            if not conn.execute('UPDATE votos SET verificado = 1 WHERE id = ? AND verificado = 0',
+                                (voto_row['id'],)).rowcount:
+                continue
+            invalido = invalidos_por_cpf.get(voto_row['eleitor_cpf'])
+            if invalido is None:
+                resultados[voto_row['candidato_id']] = resultados.get(voto_row['candidato_id'], 0) + 1
+            else:
+                invalidos.append((voto_row['id'], invalido['cpf'], invalido['nome'], invalido['motivo']))
+
+        conn.executemany('''
+            INSERT INTO apuracao_contagem (candidato_id, votos) VALUES (?, ?)
+            ON CONFLICT (candidato_id) DO UPDATE SET votos = votos + excluded.votos
+        ''', resultados.items())
+        conn.executemany('INSERT INTO apuracao_invalidos (voto_id, cpf, nome, motivo) VALUES (?, ?, ?, ?)',
+                         invalidos)
+        return sum(resultados.values()) + len(invalidos)
+
+    total = 0
+    while True:
+        votos_pendentes = conn.execute(
+            CONSULTA_VOTOS_COM_ELEITORES + ' WHERE v.verificado = 0 ORDER BY v.id LIMIT ?',
+            (tamanho_lote,)
+        ).fetchall()
+        if not votos_pendentes:
+            return total
+
+        itens = [item_de_voto(voto_row) for voto_row in votos_pendentes]
+        _, votos_invalidos = verificar_votos(itens, num_workers=num_workers, tamanho_lote=tamanho_lote)
+        # Cada CPF tem um único voto, então os inválidos voltam aos seus votos pelo CPF
+        invalidos_por_cpf = {invalido['cpf']: invalido for invalido in votos_invalidos}
+
+        total += executar_com_retentativa(
+            conn, lambda conn: gravar_lote(conn, votos_pendentes, invalidos_por_cpf))
+
+
+def ler_apuracao(conn):
+    """Lê o resultado materializado, sem verificar nenhuma assinatura."""
+    resultados = {row['candidato_id']: row['votos']
+                  for row in conn.execute('SELECT candidato_id, votos FROM apuracao_contagem WHERE votos > 0')}
+    votos_invalidos = [{'cpf': row['cpf'], 'nome': row['nome'], 'motivo': row['motivo']}
+                       for row in conn.execute('SELECT cpf, nome, motivo FROM apuracao_invalidos ORDER BY voto_id')]
+    pendentes = conn.execute('SELECT COUNT(*) FROM votos WHERE verificado = 0').fetchone()[0]
+    return resultados, votos_invalidos, pendentes
+
+
+class VerificadorEmSegundoPlano(threading.Thread):
+    """
+    Thread que verifica os votos pendentes assim que chegam, ou periodicamente,
+    mantendo as tabelas da apuração sempre atualizadas. `ao_processar`, se
+    informado, é chamado depois de cada rodada que verificou algum voto.
+    """
+
+    def __init__(self, abrir_conexao, intervalo=1.0, num_workers=1, tamanho_lote=500, ao_processar=None):
+        super().__init__(name='verificador-votos', daemon=True)
+        self.abrir_conexao = abrir_conexao
+        self.intervalo = intervalo
+        self.num_workers = num_workers
+        self.tamanho_lote = tamanho_lote
+        self.ao_processar = ao_processar
+        self._novos_votos = threading.Event()
+        self._parar = threading.Event()
+
+    def notificar(self):
+        """Avisa que há votos novos a verificar."""
+        self._novos_votos.set()
+
+    def parar(self):
+        self._parar.set()
+        self._novos_votos.set()
+
+    def run(self):
+        while not self._parar.is_set():
+            self._novos_votos.wait(self.intervalo)
+            self._novos_votos.clear()
+            conn = self.abrir_conexao()
+            try:
+                if processar_votos_pendentes(conn, self.num_workers, self.tamanho_lote) and self.ao_processar:
+                    self.ao_processar()
+            except Exception as e:
+                print(f"Erro ao verificar votos pendentes: {e}")
+            finally:
+                conn.close()
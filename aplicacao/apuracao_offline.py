@@ -0,0 +1,159 @@
+# apuracao_offline.py
+"""
+Apuração oficial fora do servidor, a partir de um snapshot exportado com
+snapshot_urna.py.
+
+O snapshot é mapeado em memória por cada processo verificador, que lê os votos
+do seu intervalo como fatias do arquivo (sem cópia e sem SQLite) e verifica as
+assinaturas; os processos usam todos os núcleos por padrão. Antes de apurar, o
+SHA-256 do snapshot é conferido com o digest gravado no arquivo e, com
+--sha256, com o digest publicado na exportação: um arquivo alterado não é apurado.
+Cada processo confere o digest de novo sobre o seu próprio mapeamento, o mesmo
+de onde lê os votos, então trocar o arquivo depois da primeira conferência
+também interrompe a apuração.
+
+O resultado tem a mesma estrutura da resposta de GET /apurar na recontagem
+(status_apuracao, resultado_final e votos_invalidos_detectados, na ordem da
+urna) e é gravado em --saida ou impresso; o resumo da execução vai para a saída de erro.
+
+Uso:
+    python apuracao_offline.py urna.snapshot [--sha256 <digest da exportação>] [--workers 8] [--saida resultado.json]
+"""
+import argparse
+import hmac
+import json
+import os
+import sys
+import time
+from concurrent.futures import ProcessPoolExecutor
+from crypto_utils import carregar_chave_publica_der, verificar_com_chave
+from snapshot_urna import Snapshot, SnapshotInvalidoError
+
+# Votos verificados por tarefa enviada a um processo
+TAMANHO_INTERVALO = 2000
+
+# Snapshot aberto em cada processo verificador, pelo inicializador do pool, ou
+# o erro que impediu a abertura, lançado na primeira tarefa do processo
+_snapshot = None
+_erro_abertura = None
+
+
+def _abrir_snapshot(caminho, digest):
+    """
+    Mapeia o snapshot neste processo e confere `digest` sobre o mapeamento: o
+    arquivo é reaberto pelo caminho e pode não ser mais o conferido em apurar_snapshot.
+    """
+    global _snapshot, _erro_abertura
+    try:
+        snapshot = Snapshot(caminho)
+        if not hmac.compare_digest(snapshot.calcular_digest(), digest):
+            snapshot.fechar()
+            raise SnapshotInvalidoError(f"'{caminho}' foi alterado depois da conferência do digest")
+    except (OSError, SnapshotInvalidoError) as e:
+        # Um erro no inicializador só chegaria ao processo principal como BrokenProcessPool
+        _erro_abertura = e
+        return
+    _snapshot = snapshot
+
+
+def apurar_intervalo(intervalo):
+    """
+    Verifica os votos de índice no intervalo [inicio, fim) do snapshot aberto
+    neste processo. Retorna a contagem parcial por candidato e os votos inválidos, na ordem.
+    """
+    if _erro_abertura is not None:
+        raise _erro_abertura
+    inicio, fim = intervalo
+    resultados = {}
+    votos_invalidos = []
+    for indice in range(inicio, fim):
+        _, _, cpf, candidato_id, nome, mensagem, assinatura, chave, tipo_chave = _snapshot.voto(indice)
+        if chave is None:
+            votos_invalidos.append({'cpf': cpf, 'nome': 'Desconhecido', 'motivo': 'Eleitor não registrado'})
+            continue
+        try:
+            public_key = carregar_chave_publica_der(chave)
+        except Exception:  # chave corrompida ou de um esquema não suportado, como na apuração do servidor
+            public_key = None
+        if public_key is not None and verificar_com_chave(assinatura, mensagem, public_key, tipo_chave):
+            resultados[candidato_id] = resultados.get(candidato_id, 0) + 1
+        else:
+            votos_invalidos.append({'cpf': cpf, 'nome': nome, 'motivo': 'Assinatura inválida'})
+    return resultados, votos_invalidos
+
+
+def apurar_snapshot(caminho, num_workers=None, sha256_esperado=None, tamanho_intervalo=TAMANHO_INTERVALO):
+    """
+    Confere o digest do snapshot e apura os votos. Retorna (resultado no formato
+    de /apurar, resumo da execução). Lança SnapshotInvalidoError se o arquivo
+    estiver corrompido ou não tiver o digest esperado.
+    """
+    inicio = time.perf_counter()
+    snapshot = Snapshot(caminho)
+    try:
+        digest = snapshot.calcular_digest()
+        if not hmac.compare_digest(digest, snapshot.digest_gravado()):
+            raise SnapshotInvalidoError(f"O conteúdo de '{caminho}' não confere com o digest gravado no arquivo")
+        if sha256_esperado is not None and not hmac.compare_digest(digest, sha256_esperado.lower()):
+            raise SnapshotInvalidoError(f"O digest de '{caminho}' ({digest}) não é o publicado na exportação")
+        num_votos = snapshot.num_votos
+        metadados = snapshot.metadados
+    finally:
+        snapshot.fechar()
+    segundos_digest = time.perf_counter() - inicio
+
+    num_workers = num_workers or os.cpu_count() or 1
+    intervalos = [(indice, min(indice + tamanho_intervalo, num_votos))
+                  for indice in range(0, num_votos, tamanho_intervalo)]
+    resultados = {}
+    votos_invalidos = []
+    with ProcessPoolExecutor(max_workers=num_workers, initializer=_abrir_snapshot,
+                             initargs=(caminho, digest)) as executor:
+        # map devolve os intervalos na ordem, então os inválidos seguem a ordem da urna
+        for resultados_intervalo, invalidos_intervalo in executor.map(apurar_intervalo, intervalos):
+            for candidato_id, quantidade in resultados_intervalo.items():
+                resultados[candidato_id] = resultados.get(candidato_id, 0) + quantidade
+            votos_invalidos.extend(invalidos_intervalo)
+
+    segundos = time.perf_counter() - inicio
+    resultado = {
+        'status_apuracao': 'Finalizada',
+        'resultado_final': resultados,
+        'votos_invalidos_detectados': votos_invalidos,
+    }
+    resumo = {
+        'snapshot': caminho,
+        'sha256': digest,
+        'origem': metadados.get('origem'),
+        'exportado_em': metadados.get('exportado_em'),
+        'votos': num_votos,
+        'workers': num_workers,
+        'segundos_digest': round(segundos_digest, 3),
+        'segundos': round(segundos, 3),
+        'votos_por_segundo': round(num_votos / segundos, 1) if segundos else None,
+    }
+    return resultado, resumo
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('snapshot', help='arquivo gravado por snapshot_urna.py')
+    parser.add_argument('--sha256', help='digest impresso pela exportação; o snapshot só é apurado se conferir')
+    parser.add_argument('--workers', type=int, help='processos verificadores (padrão: número de CPUs)')
+    parser.add_argument('--saida', help='arquivo onde o resultado em JSON é gravado (padrão: saída padrão)')
+    args = parser.parse_args()
+
+    try:
+        resultado, resumo = apurar_snapshot(args.snapshot, args.workers, args.sha256)
+    except (OSError, SnapshotInvalidoError) as e:
+        sys.exit(str(e))
+    if args.saida:
+        with open(args.saida, 'w', encoding='utf-8') as f:
+            json.dump(resultado, f, ensure_ascii=False, indent=2)
+    else:
+        print(json.dumps(resultado, ensure_ascii=False, indent=2))
+    print(json.dumps(resumo, ensure_ascii=False), file=sys.stderr)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,199 @@
+# apuracao_retomavel.py
+"""
+Apuração retomável, gravada em checkpoints encadeados por hash.
+
+A apuração avança pela urna em ordem de id. A cada bloco de votos verificado,
+é gravado um checkpoint com o último id apurado, a contagem acumulada, os votos
+inválidos do bloco e o hash encadeado de todos os votos apurados até ali. Se o
+processo cair no meio, a próxima execução continua do último checkpoint, e
+uma apuração posterior só verifica os votos que chegaram depois dele.
+
+A cadeia é h_n = SHA-256(h_{n-1} || voto), começando em 32 bytes zero, sobre
+o id, o CPF, o candidato, a mensagem assinada e a assinatura de cada voto.
+Um auditor pode recalcular a cadeia e a contagem direto da urna, sem verificar
+nenhuma assinatura, e conferir por amostragem os veredictos gravados.
+"""
+import hashlib
+import json
+import time
+from armazenamento import executar_com_retentativa
+from crypto_utils import verificar_assinatura_mensagem
+from verificacao_paralela import verificar_votos, item_de_voto, CONSULTA_VOTOS_COM_ELEITORES
+
+HASH_INICIAL = bytes(32)
+
+
+def criar_tabela_checkpoints(conn):
+    """Cria a tabela de checkpoints da apuração retomável."""
+    # contagem_json é acumulada até ultimo_voto_id; invalidos_json traz só os
+    # votos inválidos do bloco apurado neste checkpoint
+    conn.execute('''
+        CREATE TABLE IF NOT EXISTS apuracao_checkpoints (
+            id INTEGER PRIMARY KEY AUTOINCREMENT,
+            ultimo_voto_id INTEGER NOT NULL,
+            votos_apurados INTEGER NOT NULL,
+            contagem_json TEXT NOT NULL,
+            invalidos_json TEXT NOT NULL,
+            hash_cadeia BLOB NOT NULL,
+            criado_em REAL NOT NULL
+        )
+    ''')
+
+
+def _campo(valor):
+    if isinstance(valor, str):
+        valor = valor.encode('utf-8')
+    return len(valor).to_bytes(4, 'big') + valor
+
+
+def encadear(hash_anterior, voto_id, cpf, candidato_id, mensagem_assinada, assinatura):
+    """Próximo elo da cadeia: o hash anterior seguido do voto, com cada campo prefixado pelo tamanho."""
+    return hashlib.sha256(hash_anterior + voto_id.to_bytes(8, 'big') + _campo(cpf) + _campo(candidato_id)
+                          + _campo(mensagem_assinada) + _campo(assinatura)).digest()
+
+
+def _checkpoint_de_linha(row):
+    return {
+        'id': row['id'],
+        'ultimo_voto_id': row['ultimo_voto_id'],
+        'votos_apurados': row['votos_apurados'],
+        'contagem': json.loads(row['contagem_json']),
+        'hash_cadeia': row['hash_cadeia'],
+        'criado_em': row['criado_em'],
+    }
+
+
+def ultimo_checkpoint(conn):
+    """Retorna o checkpoint mais recente, ou None se a apuração nunca foi iniciada."""
+    row = conn.execute('SELECT * FROM apuracao_checkpoints ORDER BY id DESC LIMIT 1').fetchone()
+    return _checkpoint_de_linha(row) if row is not None else None
+
+
+def listar_invalidos(conn):
+    """Votos inválidos de todos os checkpoints, na ordem da urna."""
+    votos_invalidos = []
+    for (invalidos_json,) in conn.execute('SELECT invalidos_json FROM apuracao_checkpoints ORDER BY id'):
+        votos_invalidos.extend(json.loads(invalidos_json))
+    return votos_invalidos
+
+
+def contar_pendentes(conn, checkpoint):
+    ultimo_voto_id = checkpoint['ultimo_voto_id'] if checkpoint else 0
+    return conn.execute('SELECT COUNT(*) FROM votos WHERE id > ?', (ultimo_voto_id,)).fetchone()[0]
+
+
+def avancar_apuracao(conn, num_workers=1, tamanho_lote=500, votos_por_checkpoint=5000, deve_parar=None):
+    """
+    Verifica os votos posteriores ao último checkpoint, gravando um checkpoint a
+    cada `votos_por_checkpoint` votos, até alcançar o fim da urna ou até
+    `deve_parar()` retornar True. Retorna a quantidade de votos apurados agora.
+
+    Cada checkpoint só é gravado se o último checkpoint ainda for aquele de onde
+    o bloco partiu; se outro processo avançou antes, o bloco é descartado e a
+    apuração continua a partir do checkpoint dele.
+    """
+    total = 0
+    while deve_parar is None or not deve_parar():
+        checkpoint = ultimo_checkpoint(conn)
+        ultimo_voto_id = checkpoint['ultimo_voto_id'] if checkpoint else 0
+        votos = conn.execute(CONSULTA_VOTOS_COM_ELEITORES + ' WHERE v.id > ? ORDER BY v.id LIMIT ?',
+                             (ultimo_voto_id, votos_por_checkpoint)).fetchall()
+        if not votos:
+            return total
+
+        hash_cadeia = checkpoint['hash_cadeia'] if checkpoint else HASH_INICIAL
+        for voto_row in votos:
+            hash_cadeia = encadear(hash_cadeia, voto_row['id'], voto_row['eleitor_cpf'], voto_row['candidato_id'],
+                                   voto_row['mensagem_assinada'], voto_row['assinatura'])
+
+        itens = [item_de_voto(voto_row) for voto_row in votos]
+        resultados, votos_invalidos = verificar_votos(itens, num_workers=num_workers, tamanho_lote=tamanho_lote)
+
+        contagem = dict(checkpoint['contagem']) if checkpoint else {}
+        for candidato_id, quantidade in resultados.items():
+            contagem[candidato_id] = contagem.get(candidato_id, 0) + quantidade
+        # verificar_votos preserva a ordem; o CPF é único na urna e identifica o voto
+        id_por_cpf = {voto_row['eleitor_cpf']: voto_row['id'] for voto_row in votos}
+        invalidos = [dict(invalido, voto_id=id_por_cpf[invalido['cpf']]) for invalido in votos_invalidos]
+
+        def gravar(conn):
+            atual = conn.execute('SELECT MAX(id) FROM apuracao_checkpoints').fetchone()[0]
+            if atual != (checkpoint['id'] if checkpoint else None):
+                return False
+            conn.execute('''
+                INSERT INTO apuracao_checkpoints
+                    (ultimo_voto_id, votos_apurados, contagem_json, invalidos_json, hash_cadeia, criado_em)
+                VALUES (?, ?, ?, ?, ?, ?)
+            ''', (votos[-1]['id'], (checkpoint['votos_apurados'] if checkpoint else 0) + len(votos),
+                  json.dumps(contagem, sort_keys=True), json.dumps(invalidos, ensure_ascii=False),
+                  hash_cadeia, time.time()))
+            return True
+
+        if executar_com_retentativa(conn, gravar):
+            total += len(votos)
+    return total
+
+
+def auditar(conn, amostra=0):
+    """
+    Confere os checkpoints contra a urna sem verificar as assinaturas: recalcula
+    a cadeia de hash em cada checkpoint e a contagem do último a partir dos votos
+    guardados e dos inválidos registrados. Com `amostra`, verifica de novo as
+    assinaturas de até `amostra` votos sorteados e compara com o veredicto gravado.
+    """
+    checkpoints = [_checkpoint_de_linha(row) for row in
+                   conn.execute('SELECT * FROM apuracao_checkpoints ORDER BY id')]
+    if not checkpoints:
+        return {'checkpoints': 0, 'cadeia_confere': None, 'contagem_confere': None}
+
+    # Cadeia: um único passe pela urna, comparando o hash em cada fronteira de checkpoint
+    ultimo = checkpoints[-1]
+    hash_cadeia = HASH_INICIAL
+    proximo = 0
+    checkpoint_divergente = None
+    votos_lidos = 0
+    for voto_row in conn.execute('SELECT id, eleitor_cpf, candidato_id, mensagem_assinada, assinatura '
+                                 'FROM votos WHERE id <= ? ORDER BY id', (ultimo['ultimo_voto_id'],)):
+        hash_cadeia = encadear(hash_cadeia, voto_row['id'], voto_row['eleitor_cpf'], voto_row['candidato_id'],
+                               voto_row['mensagem_assinada'], voto_row['assinatura'])
+        votos_lidos += 1
+        while proximo < len(checkpoints) and checkpoints[proximo]['ultimo_voto_id'] == voto_row['id']:
+            if checkpoint_divergente is None and (checkpoints[proximo]['hash_cadeia'] != hash_cadeia or
+                                                  checkpoints[proximo]['votos_apurados'] != votos_lidos):
+                checkpoint_divergente = checkpoints[proximo]['id']
+            proximo += 1
+    if checkpoint_divergente is None and proximo < len(checkpoints):
+        # Algum checkpoint aponta para um voto que não está mais na urna
+        checkpoint_divergente = checkpoints[proximo]['id']
+
+    # Contagem: votos por candidato até o último checkpoint, menos os inválidos registrados
+    invalidos = listar_invalidos(conn)
+    ids_invalidos = {invalido['voto_id'] for invalido in invalidos}
+    contagem_recalculada = {}
+    for voto_id, candidato_id in conn.execute('SELECT id, candidato_id FROM votos WHERE id <= ?',
+                                              (ultimo['ultimo_voto_id'],)):
+        if voto_id not in ids_invalidos:
+            contagem_recalculada[candidato_id] = contagem_recalculada.get(candidato_id, 0) + 1
+
+    relatorio = {
+        'checkpoints': len(checkpoints),
+        'ultimo_voto_id': ultimo['ultimo_voto_id'],
+        'hash_cadeia': ultimo['hash_cadeia'].hex(),
+        'cadeia_confere': checkpoint_divergente is None,
+        'checkpoint_divergente': checkpoint_divergente,
+        'contagem_confere': contagem_recalculada == ultimo['contagem'],
+    }
+
+    if amostra:
+        ids_sorteados = conn.execute('SELECT id FROM votos WHERE id <= ? ORDER BY RANDOM() LIMIT ?',
+                                     (ultimo['ultimo_voto_id'], amostra)).fetchall()
+        divergencias = []
+        for (voto_id,) in ids_sorteados:
+            voto_row = conn.execute(CONSULTA_VOTOS_COM_ELEITORES + ' WHERE v.id = ?', (voto_id,)).fetchone()
+            cpf, _, _, mensagem, assinatura, chave_publica, tipo_chave = item_de_voto(voto_row)
+            valido = chave_publica is not None and verificar_assinatura_mensagem(
+                assinatura, mensagem, chave_publica, cpf=cpf, tipo_chave=tipo_chave)
+            if valido == (voto_id in ids_invalidos):
+                divergencias.append({'voto_id': voto_id, 'cpf': cpf, 'valido_agora': valido})
+        relatorio['amostra'] = {'verificados': len(ids_sorteados), 'divergencias': divergencias}
+    return relatorio
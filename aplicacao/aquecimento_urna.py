@@ -0,0 +1,93 @@
+# aquecimento_urna.py
+"""
+Leitura da urna na inicialização do servidor. Uma única passada por partição
+sobre eleitores e votos monta o índice de admissão e separa as chaves
+públicas a carregar no cache de chaves.
+
+Com a urna mantida entre execuções (servidor.py --producao), é essa leitura
+que deixa o servidor pronto depois de uma queda: votos repetidos continuam
+recusados pelo índice, e a primeira apuração encontra as chaves já
+desserializadas, em vez de carregá-las voto a voto.
+"""
+import time
+from array import array
+from indice_admissao import IndiceAdmissao, chave_cpf
+
+# Eleitores e votos lidos na ordem do CPF, pelos índices da PRIMARY KEY e do
+# UNIQUE, e combinados como numa junção por intercalação: cada linha é lida uma
+# única vez, sem uma busca no índice por eleitor. A chave pública só é lida
+# quando vai para o cache; sem ela, a leitura fica só nos índices.
+CONSULTA_ELEITORES = 'SELECT cpf, {chave} FROM eleitores ORDER BY cpf'
+CONSULTA_VOTOS = 'SELECT eleitor_cpf FROM votos ORDER BY eleitor_cpf'
+
+
+def eleitores_e_votos(conn, ler_chaves=False):
+    """
+    Gera (cpf, registrado, votou, chave_publica_der) de cada CPF com registro ou
+    voto na partição, na ordem do CPF. A chave é None sem `ler_chaves` ou sem registro.
+    """
+    votos = conn.execute(CONSULTA_VOTOS)
+    voto = next(votos, None)
+    for cpf, chave_publica_der in conn.execute(CONSULTA_ELEITORES.format(
+            chave='chave_publica_der' if ler_chaves else 'NULL')):
+        # Votos de CPFs sem registro, que o índice também recusa como já votados
+        while voto is not None and voto[0] < cpf:
+            yield voto[0], False, True, None
+            voto = next(votos, None)
+        votou = voto is not None and voto[0] == cpf
+        if votou:
+            voto = next(votos, None)
+        yield cpf, True, votou, chave_publica_der
+    while voto is not None:
+        yield voto[0], False, True, None
+        voto = next(votos, None)
+
+
+def ler_urna(conexoes, montar_indice=True, limite_chaves=0):
+    """
+    Percorre eleitores e votos de cada partição uma única vez. Retorna o índice
+    de admissão (ou None, sem `montar_indice`), as chaves [(cpf, chave_publica_der)]
+    de até `limite_chaves` eleitores que já votaram e o resumo da leitura.
+    """
+    inicio = time.perf_counter()
+    registrados = array('q')
+    votaram = array('q')
+    chaves = []
+    eleitores = votos = 0
+    for conn in conexoes:
+        for cpf, registrado, votou, chave_publica_der in eleitores_e_votos(conn, ler_chaves=limite_chaves > 0):
+            eleitores += registrado
+            votos += votou
+            if votou and registrado and len(chaves) < limite_chaves:
+                chaves.append((cpf, chave_publica_der))
+            if not montar_indice:
+                continue
+            # CPFs gravados fora da forma normalizada nunca são consultados pelo servidor
+            chave = chave_cpf(cpf)
+            if chave is None:
+                continue
+            if registrado:
+                registrados.append(chave)
+            if votou:
+                votaram.append(chave)
+
+    indice = IndiceAdmissao(registrados, votaram) if montar_indice else None
+    resumo = {
+        'eleitores': eleitores,
+        'votos': votos,
+        'chaves': len(chaves),
+        'segundos': time.perf_counter() - inicio,
+    }
+    return indice, chaves, resumo
+
+
+def carregar_chaves(cache, chaves):
+    """Desserializa as chaves no cache de chaves públicas. Retorna quantas foram carregadas."""
+    carregadas = 0
+    for cpf, chave_publica_der in chaves:
+        try:
+            cache.obter(cpf, chave_publica_der)
+        except Exception:  # chave inválida: a apuração a reporta, como sempre
+            continue
+        carregadas += 1
+    return carregadas
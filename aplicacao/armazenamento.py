@@ -0,0 +1,192 @@
+# armazenamento.py
+import os
+import queue
+import random
+import sqlite3
+import threading
+import time
+from metricas import registro
+
+# Ajustes do SQLite aplicados a toda conexão aberta pelo servidor
+SQLITE_SYNCHRONOUS = os.environ.get('SQLITE_SYNCHRONOUS', 'NORMAL')
+SQLITE_CACHE_SIZE = int(os.environ.get('SQLITE_CACHE_SIZE', -64000))  # negativo = KiB
+SQLITE_MMAP_SIZE = int(os.environ.get('SQLITE_MMAP_SIZE', 256 * 1024 * 1024))
+SQLITE_BUSY_TIMEOUT_MS = int(os.environ.get('SQLITE_BUSY_TIMEOUT_MS', 5000))
+
+# Quantidade máxima de conexões ociosas mantidas por arquivo de banco
+SQLITE_POOL_TAMANHO = int(os.environ.get('SQLITE_POOL_TAMANHO', 16))
+
+# Quantas vezes uma transação é refeita quando o banco continua ocupado
+SQLITE_MAX_RETENTATIVAS = int(os.environ.get('SQLITE_MAX_RETENTATIVAS', 5))
+
+# Limite de parâmetros por consulta com IN (...) no SQLite
+MAX_PARAMETROS_CONSULTA = 900
+
+_VALORES_SYNCHRONOUS = {'OFF', 'NORMAL', 'FULL', 'EXTRA'}
+
+metrica_conexoes_abertas = registro.contador(
+    'votacao_banco_conexoes_abertas_total', 'Conexões SQLite abertas (as reaproveitadas do pool não contam)')
+metrica_retentativas = registro.contador(
+    'votacao_banco_retentativas_total', 'Transações refeitas porque o banco estava ocupado por outro escritor')
+metrica_banco_ocupado = registro.contador(
+    'votacao_banco_ocupado_total', 'Transações abandonadas após esgotar as retentativas (respondidas com 503)')
+
+
+class BancoOcupadoError(Exception):
+    """O banco continuou bloqueado por outro escritor mesmo após as retentativas."""
+
+
+class ConexaoReutilizavel(sqlite3.Connection):
+    """
+    Conexão que volta para o pool ao ser fechada. O close() desfaz uma transação
+    deixada aberta, para que a próxima requisição receba a conexão limpa.
+    """
+
+    pool = None
+    devolvida = False
+
+    def close(self):
+        if self.devolvida:
+            return
+        if self.in_transaction:
+            self.rollback()
+        if self.pool is None or not self.pool.devolver(self):
+            self.fechar()
+
+    def fechar(self):
+        """Fecha a conexão de fato."""
+        self.devolvida = True
+        super().close()
+
+
+def _configurar_conexao(conn):
+    synchronous = SQLITE_SYNCHRONOUS.upper()
+    if synchronous not in _VALORES_SYNCHRONOUS:
+        raise ValueError(f"Valor inválido para SQLITE_SYNCHRONOUS: {SQLITE_SYNCHRONOUS}")
+    conn.execute('PRAGMA journal_mode = WAL')
+    conn.execute(f'PRAGMA synchronous = {synchronous}')
+    conn.execute(f'PRAGMA cache_size = {int(SQLITE_CACHE_SIZE)}')
+    conn.execute(f'PRAGMA mmap_size = {int(SQLITE_MMAP_SIZE)}')
+    conn.execute(f'PRAGMA busy_timeout = {int(SQLITE_BUSY_TIMEOUT_MS)}')
+
+
+def abrir_conexao(caminho_banco):
+    """
+    Abre uma conexão configurada como as do pool, mas que não volta para ele:
+    para threads de longa duração que mantêm a própria conexão.
+    """
+    conn = sqlite3.connect(caminho_banco, timeout=SQLITE_BUSY_TIMEOUT_MS / 1000,
+                           factory=ConexaoReutilizavel, check_same_thread=False)
+    conn.row_factory = sqlite3.Row
+    _configurar_conexao(conn)
+    metrica_conexoes_abertas.incrementar()
+    return conn
+
+
+class PoolConexoes:
+    """
+    Pool de conexões já abertas e configuradas para um arquivo de banco. Cada
+    thread recebe uma conexão exclusiva enquanto atende a requisição e a devolve
+    ao chamar close(); conexões excedentes são fechadas de fato.
+    """
+
+    def __init__(self, caminho_banco, tamanho_maximo=SQLITE_POOL_TAMANHO):
+        self.caminho_banco = caminho_banco
+        self.tamanho_maximo = tamanho_maximo
+        self._livres = queue.LifoQueue()
+
+    def obter(self):
+        try:
+            conn = self._livres.get_nowait()
+            conn.devolvida = False
+            return conn
+        except queue.Empty:
+            pass
+        conn = abrir_conexao(self.caminho_banco)
+        conn.pool = self
+        return conn
+
+    def devolver(self, conn):
+        """Guarda a conexão para reuso. Retorna False se o pool já estiver cheio."""
+        if self._livres.qsize() >= self.tamanho_maximo:
+            return False
+        conn.devolvida = True
+        self._livres.put_nowait(conn)
+        return True
+
+    def fechar_todas(self):
+        """Fecha as conexões livres do pool."""
+        while True:
+            try:
+                self._livres.get_nowait().fechar()
+            except queue.Empty:
+                return
+
+
+_pools = {}
+_pools_lock = threading.Lock()
+
+
+def obter_conexao(caminho_banco):
+    """Retorna uma conexão do pool do arquivo de banco informado."""
+    pool = _pools.get(caminho_banco)
+    if pool is None:
+        with _pools_lock:
+            pool = _pools.setdefault(caminho_banco, PoolConexoes(caminho_banco))
+    return pool.obter()
+
+
+def fechar_pools():
+    """Fecha as conexões livres de todos os pools."""
+    with _pools_lock:
+        pools = list(_pools.values())
+    for pool in pools:
+        pool.fechar_todas()
+
+
+def _banco_ocupado(erro):
+    mensagem = str(erro).lower()
+    return 'locked' in mensagem or 'busy' in mensagem
+
+
+def executar_com_retentativa(conn, operacao, max_retentativas=None):
+    """
+    Executa `operacao(conn)` dentro de uma transação de escrita (BEGIN IMMEDIATE)
+    e confirma ao final. Se o banco estiver ocupado por outro escritor mesmo após
+    o busy_timeout, desfaz a transação e tenta de novo com espera crescente.
+    Lança BancoOcupadoError quando as retentativas se esgotam.
+    """
+    if max_retentativas is None:
+        max_retentativas = SQLITE_MAX_RETENTATIVAS
+    for tentativa in range(max_retentativas + 1):
+        try:
+            conn.execute('BEGIN IMMEDIATE')
+            resultado = operacao(conn)
+            conn.commit()
+            return resultado
+        except sqlite3.OperationalError as e:
+            if conn.in_transaction:
+                conn.rollback()
+            if not _banco_ocupado(e):
+                raise
+            if tentativa == max_retentativas:
+                metrica_banco_ocupado.incrementar()
+                raise BancoOcupadoError(str(e)) from e
+            metrica_retentativas.incrementar()
+            time.sleep(min(0.05 * 2 ** tentativa, 1.0) * random.uniform(0.5, 1.5))
+        except Exception:
+            if conn.in_transaction:
+                conn.rollback()
+            raise
+
+
+def buscar_cpfs_existentes(conn, tabela, coluna, cpfs):
+    """Retorna quais dos CPFs informados aparecem na tabela, consultando em blocos."""
+    cpfs = list(cpfs)
+    encontrados = set()
+    for inicio in range(0, len(cpfs), MAX_PARAMETROS_CONSULTA):
+        bloco = cpfs[inicio:inicio + MAX_PARAMETROS_CONSULTA]
+        marcadores = ', '.join('?' * len(bloco))
+        encontrados.update(row[0] for row in conn.execute(
+            f'SELECT {coluna} FROM {tabela} WHERE {coluna} IN ({marcadores})', bloco))
+    return encontrados
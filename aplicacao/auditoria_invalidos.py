@@ -0,0 +1,89 @@
+# auditoria_invalidos.py
+"""
+Leitura paginada dos votos inválidos da apuração, para GET /apurar/invalidos.
+
+Cada voto inválido é identificado pela partição e pelo id do voto, e a posição
+na listagem é o cursor 'particao:voto_id'. Os registros saem na ordem da urna
+(partição, depois id), de modo que continuar depois de um cursor nunca repete
+nem pula registros, mesmo com votos novos chegando entre uma página e outra.
+
+Nos modos incremental e retomável os inválidos já estão gravados na urna e são
+lidos aos poucos com um cursor do SQLite; na recontagem, eles vêm da última
+recontagem completa, guardada no cache da apuração, e são localizados na urna
+na primeira página pedida (ver localizar_invalidos). Sem o cache, a recontagem
+não oferece a listagem: cada página refaria a apuração inteira.
+"""
+import bisect
+import json
+from armazenamento import MAX_PARAMETROS_CONSULTA
+
+
+def ler_cursor(texto):
+    """(particao, voto_id) de um cursor 'particao:voto_id'; sem cursor, o início da urna."""
+    if not texto:
+        return 0, 0
+    particao, separador, voto_id = texto.partition(':')
+    if not separador or not particao.isdigit() or not voto_id.isdigit():
+        raise ValueError(f"Cursor inválido: '{texto}'")
+    return int(particao), int(voto_id)
+
+
+def formatar_cursor(particao, voto_id):
+    return f'{particao}:{voto_id}'
+
+
+def invalidos_incrementais(conn, depois_de_id=0, motivo=None):
+    """Gera (voto_id, registro) da tabela apuracao_invalidos, a partir do voto seguinte a `depois_de_id`."""
+    consulta = 'SELECT voto_id, cpf, nome, motivo FROM apuracao_invalidos WHERE voto_id > ?'
+    parametros = [depois_de_id]
+    if motivo is not None:
+        consulta += ' AND motivo = ?'
+        parametros.append(motivo)
+    for row in conn.execute(consulta + ' ORDER BY voto_id', parametros):
+        yield row['voto_id'], {'cpf': row['cpf'], 'nome': row['nome'], 'motivo': row['motivo']}
+
+
+def invalidos_checkpoints(conn, depois_de_id=0, motivo=None):
+    """Gera (voto_id, registro) dos checkpoints da apuração retomável, um checkpoint por vez."""
+    # Cada checkpoint guarda os inválidos do bloco de votos até ultimo_voto_id
+    for (invalidos_json,) in conn.execute(
+            'SELECT invalidos_json FROM apuracao_checkpoints WHERE ultimo_voto_id > ? ORDER BY id', (depois_de_id,)):
+        for invalido in json.loads(invalidos_json):
+            if invalido['voto_id'] > depois_de_id and (motivo is None or invalido['motivo'] == motivo):
+                yield invalido['voto_id'], {'cpf': invalido['cpf'], 'nome': invalido['nome'],
+                                            'motivo': invalido['motivo']}
+
+
+def localizar_invalidos(urna, votos_invalidos):
+    """
+    Associa cada voto inválido de uma recontagem ao seu voto na urna. Cada CPF
+    vota uma única vez, então o CPF encontra o id do voto na sua partição.
+    Retorna [(particao, voto_id, registro)] na ordem da urna.
+    """
+    localizados = []
+    for particao, invalidos in urna.agrupar(votos_invalidos, lambda invalido: invalido['cpf']).items():
+        cpfs = [invalido['cpf'] for _, invalido in invalidos]
+        ids = {}
+        conn = urna.conexao(particao)
+        try:
+            for inicio in range(0, len(cpfs), MAX_PARAMETROS_CONSULTA):
+                bloco = cpfs[inicio:inicio + MAX_PARAMETROS_CONSULTA]
+                marcadores = ', '.join('?' * len(bloco))
+                ids.update((row[1], row[0]) for row in conn.execute(
+                    f'SELECT id, eleitor_cpf FROM votos WHERE eleitor_cpf IN ({marcadores})', bloco))
+        finally:
+            conn.close()
+        # Um voto apagado depois da recontagem não tem mais id e sai da listagem
+        localizados.extend((particao, ids[invalido['cpf']], invalido)
+                           for _, invalido in invalidos if invalido['cpf'] in ids)
+    localizados.sort(key=lambda localizado: (localizado[0], localizado[1]))
+    return localizados
+
+
+def paginar_localizados(localizados, particao, depois_de_id, motivo=None):
+    """Gera (particao, voto_id, registro) de uma lista de localizar_invalidos, depois do cursor."""
+    inicio = bisect.bisect_right(localizados, (particao, depois_de_id),
+                                 key=lambda localizado: (localizado[0], localizado[1]))
+    for indice in range(inicio, len(localizados)):
+        if motivo is None or localizados[indice][2]['motivo'] == motivo:
+            yield localizados[indice]
@@ -0,0 +1,107 @@
+# cache_apuracao.py
+"""
+Cache do último resultado de GET /apurar, guardado junto da versão da urna em
+que foi calculado.
+
+A versão é um contador em memória que o servidor avança a cada escrita que
+pode mudar a apuração (eleitores registrados, votos gravados ou drenados da
+fila, votos verificados no modo incremental). Enquanto a versão não muda, o
+resultado guardado é servido sem consultar o banco nem verificar assinaturas,
+e um cliente que já tem o ETag da versão atual recebe 304.
+
+Quando a versão muda, apenas uma requisição recalcula: as demais que chegam
+durante o cálculo esperam por ele e recebem o mesmo resultado.
+"""
+import os
+import threading
+
+
+class ResultadoApuracao:
+    """
+    Corpo JSON já serializado de uma apuração e a versão da urna em que foi
+    calculado. `corpo_resumido` é o mesmo resultado sem a lista de votos
+    inválidos. `detalhes` guarda o que mais o cálculo quiser reaproveitar
+    enquanto a versão valer (na recontagem, os votos inválidos).
+    """
+
+    def __init__(self, versao, etag, corpo, corpo_resumido, detalhes=None):
+        self.versao = versao
+        self.etag = etag
+        self.corpo = corpo
+        self.corpo_resumido = corpo_resumido
+        self.detalhes = detalhes
+        self._derivado = None
+        self._trava_derivado = threading.Lock()
+
+    def derivado(self, calcular):
+        """
+        `calcular(detalhes)`, feito só na primeira chamada e guardado junto do
+        resultado: quem não pede o derivado não paga por ele.
+        """
+        with self._trava_derivado:
+            if self._derivado is None:
+                self._derivado = calcular(self.detalhes)
+            return self._derivado
+
+
+class CacheApuracao:
+    """Versão da urna e o resultado da apuração calculado na versão mais recente."""
+
+    def __init__(self):
+        # O ETag inclui uma marca do processo: depois de reiniciar, a versão
+        # recomeça do zero e os ETags antigos não podem coincidir com os novos
+        self._geracao = os.urandom(4).hex()
+        self._versao = 0
+        self._resultado = None
+        self._calculando = False
+        self._condicao = threading.Condition()
+
+    @property
+    def versao(self):
+        return self._versao
+
+    def etag(self, versao=None):
+        """O ETag (sem aspas) do resultado da versão informada, ou da versão atual."""
+        return f'{self._geracao}-{self._versao if versao is None else versao}'
+
+    def invalidar(self):
+        """Avança a versão da urna. Chamar depois que a escrita foi confirmada no banco."""
+        with self._condicao:
+            self._versao += 1
+
+    def obter(self, calcular):
+        """
+        Retorna o ResultadoApuracao da versão atual, chamando `calcular()` (que
+        retorna os corpos serializados, completo e resumido, e os detalhes) se ele ainda não existir. Cálculos
+        simultâneos da mesma versão são feitos uma única vez. Retorna também se
+        o resultado foi calculado nesta chamada, reaproveitado do cache ou
+        compartilhado com um cálculo em andamento.
+        """
+        esperou = False
+        with self._condicao:
+            while True:
+                resultado = self._resultado
+                if resultado is not None and resultado.versao == self._versao:
+                    return resultado, 'compartilhado' if esperou else 'cache'
+                if not self._calculando:
+                    self._calculando = True
+                    # A versão é lida antes do cálculo: uma escrita durante o
+                    # cálculo a avança, e o resultado já nasce desatualizado
+                    versao = self._versao
+                    break
+                esperou = True
+                self._condicao.wait()
+
+        resultado = None
+        try:
+            corpo, corpo_resumido, detalhes = calcular()
+            resultado = ResultadoApuracao(versao, self.etag(versao), corpo, corpo_resumido, detalhes)
+        finally:
+            # O resultado é publicado antes de acordar quem espera, para que
+            # ninguém recomece o cálculo da mesma versão
+            with self._condicao:
+                if resultado is not None:
+                    self._resultado = resultado
+                self._calculando = False
+                self._condicao.notify_all()
+        return resultado, 'calculado'
@@ -1,66 +1,25 @@
 # cliente.py
-import requests
 import json
 import base64
+import importlib
 import os
+import queue
+import threading
 import customtkinter as ctk
 from tkinter import filedialog, messagebox
-from crypto_utils import assinar_dados, gerar_e_salvar_chaves
 
 API_URL = 'http://127.0.0.1:5000'
 
+# requests, crypto_utils (cryptography) e validacao_cpf (NumPy) levam juntos
+# mais tempo para importar que a própria interface: são importados só pelas
+# janelas que os usam, para que a janela principal apareça logo, e
+# pré-carregados numa thread de fundo assim que ela está na tela.
+MODULOS_PRECARREGADOS = ('requests', 'crypto_utils', 'validacao_cpf')
+
 # Define a aparência geral da aplicação
 ctk.set_appearance_mode("dark")  # Opções: "dark", "light", "system"
 ctk.set_default_color_theme("blue")
 
-def validar_cpf(cpf):
-    """
-    Valida um CPF, verificando formato, dígitos repetidos e os dígitos verificadores.
-    
-    Args:
-        cpf: O CPF a ser validado, podendo conter ou não pontuação.
-
-    Returns:
-        True se o CPF for válido, False caso contrário.
-    """
-    
-    cpf_limpo = ''.join(filter(str.isdigit, cpf))
-
-    if len(cpf_limpo) != 11:
-        return False
-
-    if len(set(cpf_limpo)) == 1:
-        return False
-
-    try:
-        # Cálculo do primeiro dígito verificador
-        soma = 0
-        for i in range(9):
-            soma += int(cpf_limpo[i]) * (10 - i)
-        
-        resto = soma % 11
-        digito_verificador_1 = 0 if resto < 2 else 11 - resto
-
-        if digito_verificador_1 != int(cpf_limpo[9]):
-            return False
-
-        # Cálculo do segundo dígito verificador
-        soma = 0
-        for i in range(10):
-            soma += int(cpf_limpo[i]) * (11 - i)
-            
-        resto = soma % 11
-        digito_verificador_2 = 0 if resto < 2 else 11 - resto
-
-        if digito_verificador_2 != int(cpf_limpo[10]):
-            return False
-
-    except (ValueError, IndexError):
-        
-        return False
-
-    return True
-
 class AplicacaoCliente(ctk.CTk):
     def __init__(self):
         super().__init__()
@@ -84,6 +43,8 @@ class AplicacaoCliente(ctk.CTk):
         self.btn_sair = ctk.CTkButton(self, text="Sair", command=self.destroy, fg_color="red", hover_color="#C00000")
         self.btn_sair.grid(row=4, column=0, padx=40, pady=10, sticky="ew")
 
+        self.after(100, lambda: threading.Thread(target=precarregar_modulos, daemon=True).start())
+
     def abrir_janela_registro(self):
         JanelaRegistro(self)
 
@@ -94,11 +55,21 @@ class AplicacaoCliente(ctk.CTk):
         JanelaApuracao(self)
 
 
+def precarregar_modulos():
+    for nome in MODULOS_PRECARREGADOS:
+        try:
+            importlib.import_module(nome)
+        except ImportError:
+            # O erro aparece para o usuário quando a janela que usa o módulo o importar
+            pass
+
+
 class JanelaRegistro(ctk.CTkToplevel):
     def __init__(self, parent):
+        from crypto_utils import ESQUEMAS_ASSINATURA, ESQUEMA_PADRAO
         super().__init__(parent)
         self.title("Registrar Eleitor")
-        self.geometry("400x250")
+        self.geometry("400x300")
         self.transient(parent) # Mantém a janela no topo da principal
         self.grid_columnconfigure(0, weight=1)
 
@@ -111,10 +82,18 @@ class JanelaRegistro(ctk.CTkToplevel):
         self.entry_nome = ctk.CTkEntry(self, placeholder_text="Nome Completo")
         self.entry_nome.grid(row=2, column=0, padx=20, pady=5, sticky="ew")
 
+        # Esquema de assinatura das chaves que serão geradas
+        self.var_esquema = ctk.StringVar(value=ESQUEMA_PADRAO)
+        self.menu_esquema = ctk.CTkOptionMenu(self, values=list(ESQUEMAS_ASSINATURA), variable=self.var_esquema)
+        self.menu_esquema.grid(row=3, column=0, padx=20, pady=5, sticky="ew")
+
         self.btn_registrar = ctk.CTkButton(self, text="Gerar Chaves e Registrar", command=self.registrar_eleitor)
-        self.btn_registrar.grid(row=3, column=0, padx=20, pady=20, sticky="ew")
+        self.btn_registrar.grid(row=4, column=0, padx=20, pady=20, sticky="ew")
 
     def registrar_eleitor(self):
+        import requests
+        from crypto_utils import gerar_e_salvar_chaves
+        from validacao_cpf import validar_cpf
         cpf = self.entry_cpf.get()
         nome = self.entry_nome.get()
 
@@ -128,7 +107,7 @@ class JanelaRegistro(ctk.CTkToplevel):
 
         try:
             cpf_limpo = ''.join(filter(str.isdigit, cpf))
-            arq_pub, arq_priv = gerar_e_salvar_chaves(cpf_limpo)
+            arq_pub, arq_priv = gerar_e_salvar_chaves(cpf_limpo, self.var_esquema.get())
             messagebox.showinfo("Chaves Geradas", f"Chaves salvas como:\n- {arq_pub}\n- {arq_priv}\nGuarde sua chave privada em local seguro!", parent=self)
 
             with open(arq_pub, "r") as f:
@@ -201,6 +180,9 @@ class JanelaVotacao(ctk.CTkToplevel):
             self.label_chave.configure(text="Nenhuma chave selecionada", text_color="gray")
 
     def votar(self):
+        import requests
+        from crypto_utils import assinar_dados
+        from validacao_cpf import validar_cpf
         eleitor_cpf = self.entry_cpf.get()
         candidato_id = self.var_candidato.get()
 
@@ -254,6 +236,18 @@ class JanelaVotacao(ctk.CTkToplevel):
             messagebox.showerror("Erro Inesperado", f"Ocorreu um erro: {e}", parent=self)
 
 class JanelaApuracao(ctk.CTkToplevel):
+    """
+    Mostra o resultado de /apurar e a auditoria dos votos inválidos, lida em
+    páginas de /apurar/invalidos. As requisições rodam numa thread de fundo, que
+    entrega o texto em blocos por uma fila; a janela insere os blocos à medida
+    que chegam, sem travar a interface mesmo com muitos votos inválidos.
+    """
+
+    # Votos inválidos pedidos por página e linhas de texto entregues por bloco à interface
+    LIMITE_PAGINA_INVALIDOS = 5000
+    LINHAS_POR_BLOCO = 500
+    INTERVALO_ATUALIZACAO_MS = 50
+
     def __init__(self, parent):
         super().__init__(parent)
         self.title("Apuração dos Votos")
@@ -265,57 +259,126 @@ class JanelaApuracao(ctk.CTkToplevel):
         self.textbox = ctk.CTkTextbox(self, state="disabled", font=("Courier New", 12))
         self.textbox.grid(row=0, column=0, padx=10, pady=10, sticky="nsew")
 
+        self.btn_atualizar = ctk.CTkButton(self, text="Atualizar", command=self.buscar_e_exibir_resultados)
+        self.btn_atualizar.grid(row=1, column=0, padx=10, pady=(0, 10), sticky="ew")
+
+        # ETag da última apuração exibida: se a urna não mudou, o servidor responde 304 sem apurar de novo
+        self.etag = None
+        self._mensagens = queue.Queue()
+        self._cancelado = threading.Event()
+        self.protocol("WM_DELETE_WINDOW", self.fechar)
+
         self.buscar_e_exibir_resultados()
 
-    def buscar_e_exibir_resultados(self):
-        self.textbox.configure(state="normal")
-        self.textbox.delete("1.0", "end")
-        self.textbox.insert("1.0", "Buscando resultados no servidor...")
-        self.textbox.configure(state="disabled")
-        self.update_idletasks()
+    def fechar(self):
+        # A thread de fundo para na próxima página ou bloco
+        self._cancelado.set()
+        self.destroy()
 
+    def buscar_e_exibir_resultados(self):
+        self.btn_atualizar.configure(state="disabled")
+        if self.etag is None:
+            self._substituir_texto("Buscando resultados no servidor...")
+        threading.Thread(target=self._buscar_em_segundo_plano, args=(self.etag,), daemon=True).start()
+        self.after(self.INTERVALO_ATUALIZACAO_MS, self._consumir_mensagens)
+
+    def _buscar_em_segundo_plano(self, etag):
+        """Roda fora da thread da interface: só conversa com a janela pela fila de mensagens."""
+        import requests
         try:
-            response = requests.get(f"{API_URL}/apurar")
+            cabecalhos = {'If-None-Match': etag} if etag else {}
+            # A lista de inválidos vem paginada de /apurar/invalidos: aqui, só a quantidade
+            response = requests.get(f"{API_URL}/apurar", params={'invalidos': 0}, headers=cabecalhos)
+            if response.status_code == 304:
+                # Nenhum voto novo: o resultado exibido continua valendo
+                return
             response.raise_for_status() # Lança um erro para status >= 400
-            
             dados = response.json()
-            
-            texto_resultado = f"--- APURAÇÃO FINALIZADA ---\n\n"
-            texto_resultado += "Resultado Final:\n"
-            texto_resultado += "----------------\n"
+
+            linhas = ["--- APURAÇÃO FINALIZADA ---\n", "Resultado Final:", "----------------"]
             if dados['resultado_final']:
                 for candidato, votos in dados['resultado_final'].items():
-                    texto_resultado += f"Candidato {candidato}: {votos} voto(s)\n"
-
+                    linhas.append(f"Candidato {candidato}: {votos} voto(s)")
             else:
-                texto_resultado += "Nenhum voto válido contabilizado.\n"
-
-            texto_resultado += "\n\n"
-            texto_resultado += "Auditoria de Votos Inválidos:\n"
-            texto_resultado += "-----------------------------\n"
-            if dados['votos_invalidos_detectados']:
-                for voto_invalido in dados['votos_invalidos_detectados']:
-                    texto_resultado += f"- CPF: {voto_invalido['cpf']} (Nome: {voto_invalido['nome']})\n"
-                    texto_resultado += f"  Motivo: {voto_invalido['motivo']}\n"
-                
-            else:
-                texto_resultado += "Nenhum voto inválido detectado.\n"
+                linhas.append("Nenhum voto válido contabilizado.")
+            linhas += ["\n", "Auditoria de Votos Inválidos:", "-----------------------------"]
+            self._mensagens.put(('substituir', "\n".join(linhas) + "\n", response.headers.get('ETag')))
 
-            self.textbox.configure(state="normal")
-            self.textbox.delete("1.0", "end")
-            self.textbox.insert("1.0", texto_resultado)
-            self.textbox.configure(state="disabled")
+            if dados['total_votos_invalidos'] == 0:
+                self._mensagens.put(('anexar', "Nenhum voto inválido detectado.\n"))
+                return
+            for bloco in self._ler_invalidos():
+                self._mensagens.put(('anexar', "".join(bloco)))
 
         except requests.exceptions.ConnectionError:
-            messagebox.showerror("Erro de Conexão", "Não foi possível conectar ao servidor.", parent=self)
-            self.destroy()
+            self._mensagens.put(('erro', "Erro de Conexão", "Não foi possível conectar ao servidor."))
         except requests.exceptions.HTTPError as e:
-            messagebox.showerror("Erro no Servidor", f"O servidor retornou um erro: {e}", parent=self)
-            self.destroy()
+            self._mensagens.put(('erro', "Erro no Servidor", f"O servidor retornou um erro: {e}"))
         except Exception as e:
-            messagebox.showerror("Erro Inesperado", f"Ocorreu um erro: {e}", parent=self)
-            self.destroy()
+            self._mensagens.put(('erro', "Erro Inesperado", f"Ocorreu um erro: {e}"))
+        finally:
+            self._mensagens.put(('fim',))
+
+    def _ler_invalidos(self):
+        """Percorre as páginas NDJSON de /apurar/invalidos, gerando blocos de texto já formatados."""
+        import requests
+        cursor = None
+        while not self._cancelado.is_set():
+            parametros = {'limite': self.LIMITE_PAGINA_INVALIDOS}
+            if cursor:
+                parametros['cursor'] = cursor
+            recebidos = 0
+            bloco = []
+            with requests.get(f"{API_URL}/apurar/invalidos", params=parametros, stream=True) as response:
+                response.raise_for_status()
+                for linha in response.iter_lines():
+                    if not linha:
+                        continue
+                    voto_invalido = json.loads(linha)
+                    cursor = voto_invalido['cursor']
+                    recebidos += 1
+                    bloco.append(f"- CPF: {voto_invalido['cpf']} (Nome: {voto_invalido['nome']})\n"
+                                 f"  Motivo: {voto_invalido['motivo']}\n")
+                    if len(bloco) >= self.LINHAS_POR_BLOCO:
+                        yield bloco
+                        bloco = []
+                        if self._cancelado.is_set():
+                            return
+            if bloco:
+                yield bloco
+            if recebidos < self.LIMITE_PAGINA_INVALIDOS:
+                return
+
+    def _consumir_mensagens(self):
+        """Aplica na janela, na thread da interface, o que a thread de fundo já entregou."""
+        if self._cancelado.is_set():
+            return
+        while True:
+            try:
+                mensagem = self._mensagens.get_nowait()
+            except queue.Empty:
+                self.after(self.INTERVALO_ATUALIZACAO_MS, self._consumir_mensagens)
+                return
+            if mensagem[0] == 'substituir':
+                self._substituir_texto(mensagem[1])
+                self.etag = mensagem[2]
+            elif mensagem[0] == 'anexar':
+                self.textbox.configure(state="normal")
+                self.textbox.insert("end", mensagem[1])
+                self.textbox.configure(state="disabled")
+            elif mensagem[0] == 'erro':
+                messagebox.showerror(mensagem[1], mensagem[2], parent=self)
+                self.fechar()
+                return
+            else:
+                self.btn_atualizar.configure(state="normal")
+                return
 
+    def _substituir_texto(self, texto):
+        self.textbox.configure(state="normal")
+        self.textbox.delete("1.0", "end")
+        self.textbox.insert("1.0", texto)
+        self.textbox.configure(state="disabled")
 
 if __name__ == '__main__':
     app = AplicacaoCliente()
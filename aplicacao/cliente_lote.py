@@ -0,0 +1,232 @@
+# cliente_lote.py
+"""
+Cliente de votação sem interface gráfica, para enviar muitos votos de uma vez.
+
+Lê um arquivo JSONL com um voto por linha:
+
+    {"cpf": "...", "candidato_id": "...", "chave_privada": "chaves/eleitor_..._privada.pem"}
+
+Os votos são assinados em um pool de processos, e cada processo reaproveita
+as chaves privadas que já carregou. Os votos assinados são enviados por sessões
+HTTP com conexões keep-alive: em lotes para /votar_lote ou, com --individual
+(ou se o servidor não tiver /votar_lote), um por um para /votar. Falhas de
+conexão e respostas 502/503/504 são repetidas com espera exponencial. Ao final
+são impressas as contagens por status e a vazão.
+
+Uso:
+    python cliente_lote.py votos.jsonl --servidor http://127.0.0.1:5000 [--conexoes 4] [--tamanho-lote 500]
+"""
+import argparse
+import base64
+import json
+import os
+import random
+import sys
+import threading
+import time
+from collections import deque
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor
+import requests
+from crypto_utils import assinar_bytes, carregar_chave_privada, mensagem_canonica
+from verificacao_paralela import dividir_em_lotes
+
+TAMANHO_LOTE_ENVIO = 500
+
+# Respostas que indicam um problema passageiro do servidor
+STATUS_REPETIR = {502, 503, 504}
+
+# Status de /votar traduzidos para os mesmos nomes usados por /votar_lote
+STATUS_POR_CODIGO = {200: 'ok', 400: 'invalido', 404: 'nao_registrado', 409: 'ja_votou'}
+
+
+def ler_entradas(caminho_entrada, ao_rejeitar):
+    """Lê o arquivo JSONL linha a linha, gerando (linha, cpf, candidato_id, caminho da chave privada)."""
+    with open(caminho_entrada, encoding='utf-8') as f:
+        for numero_linha, linha in enumerate(f, 1):
+            if not linha.strip():
+                continue
+            try:
+                dados = json.loads(linha)
+                yield numero_linha, dados['cpf'], dados['candidato_id'], dados['chave_privada']
+            except (ValueError, KeyError, TypeError):
+                ao_rejeitar({'linha': numero_linha, 'motivo': 'Linha inválida: são esperados cpf, candidato_id e chave_privada'})
+
+
+def assinar_entradas(lote):
+    """
+    Assina um lote de entradas dentro de um processo do pool.
+    Retorna [(linha, cpf, payload ou None, erro ou None)] e o tempo gasto.
+    """
+    inicio = time.perf_counter()
+    assinados = []
+    for numero_linha, cpf, candidato_id, caminho_chave in lote:
+        voto_data = {"eleitor_cpf": cpf, "candidato_id": candidato_id}
+        try:
+            assinatura = assinar_bytes(carregar_chave_privada(caminho_chave), mensagem_canonica(voto_data))
+        except (OSError, ValueError, TypeError) as e:
+            assinados.append((numero_linha, cpf, None, f'Falha ao assinar: {e}'))
+            continue
+        payload = {"voto_data": voto_data, "assinatura_b64": base64.b64encode(assinatura).decode('utf-8')}
+        assinados.append((numero_linha, cpf, payload, None))
+    return assinados, time.perf_counter() - inicio
+
+
+class EnviadorVotos:
+    """
+    Envia votos assinados ao servidor. Cada thread usa a sua própria sessão do
+    requests, que mantém a conexão aberta entre as requisições.
+    """
+
+    def __init__(self, url_servidor, individual=False, max_tentativas=5, timeout=60):
+        self.url_servidor = url_servidor.rstrip('/')
+        self.individual = individual
+        self.max_tentativas = max_tentativas
+        self.timeout = timeout
+        self.requisicoes = 0
+        self.repeticoes = 0
+        self._local = threading.local()
+        self._lock = threading.Lock()
+
+    def _sessao(self):
+        sessao = getattr(self._local, 'sessao', None)
+        if sessao is None:
+            sessao = self._local.sessao = requests.Session()
+        return sessao
+
+    def _post(self, caminho, **kwargs):
+        """POST com novas tentativas e espera exponencial (ou a pedida em Retry-After)."""
+        for tentativa in range(self.max_tentativas):
+            ultima = tentativa == self.max_tentativas - 1
+            espera = min(0.25 * 2 ** tentativa, 10.0) * random.uniform(0.5, 1.5)
+            with self._lock:
+                self.requisicoes += 1
+            try:
+                resposta = self._sessao().post(self.url_servidor + caminho, timeout=self.timeout, **kwargs)
+            except (requests.exceptions.ConnectionError, requests.exceptions.Timeout):
+                if ultima:
+                    raise
+            else:
+                if resposta.status_code not in STATUS_REPETIR or ultima:
+                    return resposta
+                if resposta.headers.get('Retry-After', '').isdigit():
+                    espera = float(resposta.headers['Retry-After'])
+            with self._lock:
+                self.repeticoes += 1
+            time.sleep(espera)
+
+    def enviar_um(self, payload):
+        resposta = self._post('/votar', json=payload)
+        return STATUS_POR_CODIGO.get(resposta.status_code, f'http_{resposta.status_code}')
+
+    def enviar(self, payloads):
+        """Envia os votos e retorna um status por voto, na mesma ordem."""
+        if not self.individual:
+            resposta = self._post('/votar_lote', json=payloads)
+            if resposta.status_code in (404, 405):
+                # Servidor sem /votar_lote: segue enviando um voto por requisição
+                self.individual = True
+            elif resposta.status_code == 200:
+                return [item['status'] for item in resposta.json()['itens']]
+            else:
+                return [f'http_{resposta.status_code}'] * len(payloads)
+        return [self.enviar_um(payload) for payload in payloads]
+
+
+def votar_em_massa(caminho_entrada, url_servidor, num_workers=None, conexoes=4,
+                   tamanho_lote=TAMANHO_LOTE_ENVIO, individual=False, max_tentativas=5, ao_rejeitar=None):
+    """
+    Assina e envia todos os votos do arquivo, com a assinatura do próximo lote
+    acontecendo enquanto os anteriores são enviados. Retorna um resumo com as
+    contagens por status, o tempo total e a vazão.
+    """
+    status = {}
+    tempo_assinatura = 0.0
+    enviados = 0
+    proximo_relatorio = tamanho_lote * 10
+
+    def rejeitar(registro):
+        status['invalido_local'] = status.get('invalido_local', 0) + 1
+        if ao_rejeitar is not None:
+            ao_rejeitar(registro)
+
+    def contar(resultado):
+        nonlocal enviados, proximo_relatorio
+        for status_voto in resultado:
+            status[status_voto] = status.get(status_voto, 0) + 1
+        enviados += len(resultado)
+        if enviados >= proximo_relatorio:
+            print(f"{enviados} votos enviados ({enviados / (time.perf_counter() - inicio):.0f}/s)", file=sys.stderr)
+            proximo_relatorio += tamanho_lote * 10
+
+    enviador = EnviadorVotos(url_servidor, individual, max_tentativas)
+
+    def enviar_lote(assinados):
+        payloads = [payload for _, _, payload, _ in assinados if payload is not None]
+        try:
+            return enviador.enviar(payloads) if payloads else []
+        except requests.exceptions.RequestException as e:
+            print(f"Falha ao enviar {len(payloads)} voto(s): {e}", file=sys.stderr)
+            return ['erro_envio'] * len(payloads)
+
+    num_workers = num_workers or os.cpu_count() or 1
+    inicio = time.perf_counter()
+    with ProcessPoolExecutor(max_workers=num_workers) as assinadores, \
+            ThreadPoolExecutor(max_workers=conexoes) as envios:
+        assinaturas_pendentes = deque()
+        envios_pendentes = deque()
+
+        def receber_assinatura():
+            nonlocal tempo_assinatura
+            assinados, segundos = assinaturas_pendentes.popleft().result()
+            tempo_assinatura += segundos
+            for numero_linha, cpf, payload, erro in assinados:
+                if payload is None:
+                    rejeitar({'linha': numero_linha, 'cpf': cpf, 'motivo': erro})
+            envios_pendentes.append(envios.submit(enviar_lote, assinados))
+            # Limita os lotes assinados à espera de envio
+            while len(envios_pendentes) > conexoes * 2:
+                contar(envios_pendentes.popleft().result())
+
+        for lote in dividir_em_lotes(ler_entradas(caminho_entrada, rejeitar), tamanho_lote):
+            assinaturas_pendentes.append(assinadores.submit(assinar_entradas, lote))
+            if len(assinaturas_pendentes) >= num_workers * 2:
+                receber_assinatura()
+        while assinaturas_pendentes:
+            receber_assinatura()
+        while envios_pendentes:
+            contar(envios_pendentes.popleft().result())
+
+    segundos = time.perf_counter() - inicio
+    return {
+        'votos_enviados': enviados,
+        'status': status,
+        'requisicoes': enviador.requisicoes,
+        'tentativas_repetidas': enviador.repeticoes,
+        'modo': 'individual' if enviador.individual else 'lote',
+        'segundos': round(segundos, 3),
+        'segundos_assinatura': round(tempo_assinatura, 3),
+        'votos_por_segundo': round(enviados / segundos, 1) if segundos else None,
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('arquivo', help='JSONL com cpf, candidato_id e chave_privada em cada linha')
+    parser.add_argument('--servidor', default='http://127.0.0.1:5000')
+    parser.add_argument('--workers', type=int, help='processos assinadores (padrão: número de CPUs)')
+    parser.add_argument('--conexoes', type=int, default=4, help='requisições simultâneas ao servidor')
+    parser.add_argument('--tamanho-lote', type=int, default=TAMANHO_LOTE_ENVIO)
+    parser.add_argument('--individual', action='store_true', help='envia um voto por requisição para /votar')
+    parser.add_argument('--tentativas', type=int, default=5, help='tentativas por requisição')
+    args = parser.parse_args()
+
+    def ao_rejeitar(registro):
+        print(f"Linha {registro['linha']} rejeitada: {registro['motivo']}", file=sys.stderr)
+
+    resumo = votar_em_massa(args.arquivo, args.servidor, args.workers, args.conexoes, args.tamanho_lote,
+                            args.individual, args.tentativas, ao_rejeitar)
+    print(json.dumps(resumo, ensure_ascii=False, indent=2))
+
+
+if __name__ == '__main__':
+    main()
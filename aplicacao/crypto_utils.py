@@ -1,37 +1,98 @@
 # crypto_utils.py
 import json
 import os
+import hashlib
+import threading
+from collections import OrderedDict
 from cryptography.hazmat.primitives import serialization
-from cryptography.hazmat.primitives.asymmetric import rsa
+from cryptography.hazmat.primitives.asymmetric import rsa, ec, ed25519
 from cryptography.hazmat.primitives import hashes
 from cryptography.hazmat.primitives.asymmetric import padding
 
-def gerar_e_salvar_chaves(cpf_eleitor):
+# Esquemas de assinatura suportados. O esquema de cada eleitor é gravado no
+# registro e decide como as assinaturas dele são verificadas.
+ESQUEMA_RSA = 'rsa-2048'
+ESQUEMA_ED25519 = 'ed25519'
+ESQUEMA_ECDSA = 'ecdsa-p256'
+ESQUEMAS_ASSINATURA = (ESQUEMA_RSA, ESQUEMA_ED25519, ESQUEMA_ECDSA)
+
+ESQUEMA_PADRAO = os.environ.get('ESQUEMA_ASSINATURA', ESQUEMA_RSA)
+
+# Único tamanho de chave RSA do esquema ESQUEMA_RSA
+TAMANHO_CHAVE_RSA = 2048
+
+
+def gerar_chave_privada(esquema=ESQUEMA_RSA):
+    """Gera uma chave privada do esquema de assinatura informado."""
+    if esquema == ESQUEMA_RSA:
+        return rsa.generate_private_key(
+            public_exponent=65537,
+            key_size=TAMANHO_CHAVE_RSA,
+        )
+    if esquema == ESQUEMA_ED25519:
+        return ed25519.Ed25519PrivateKey.generate()
+    if esquema == ESQUEMA_ECDSA:
+        return ec.generate_private_key(ec.SECP256R1())
+    raise ValueError(f"Esquema de assinatura desconhecido: {esquema}")
+
+
+def identificar_esquema(chave):
+    """
+    Retorna o esquema de assinatura de uma chave (pública ou privada).
+    Lança ValueError se o tipo de chave não for suportado.
+    """
+    if isinstance(chave, (rsa.RSAPublicKey, rsa.RSAPrivateKey)):
+        # O esquema é gravado como 'rsa-2048': chaves de outro tamanho não são aceitas com esse rótulo
+        if chave.key_size != TAMANHO_CHAVE_RSA:
+            raise ValueError(f"Chave RSA de {chave.key_size} bits não suportada (esperado: {TAMANHO_CHAVE_RSA})")
+        return ESQUEMA_RSA
+    if isinstance(chave, (ed25519.Ed25519PublicKey, ed25519.Ed25519PrivateKey)):
+        return ESQUEMA_ED25519
+    if isinstance(chave, (ec.EllipticCurvePublicKey, ec.EllipticCurvePrivateKey)) and isinstance(chave.curve, ec.SECP256R1):
+        return ESQUEMA_ECDSA
+    raise ValueError(f"Tipo de chave não suportado: {type(chave).__name__}")
+
+
+def caminhos_chaves_eleitor(cpf_eleitor, pasta_chaves="chaves", particionar=False):
     """
-    Gera um par de chaves RSA para um eleitor e salva em arquivos .pem
-    dentro de uma pasta chamada 'chaves'.
+    Retorna os caminhos dos arquivos da chave pública e privada do eleitor.
+    Com `particionar`, os arquivos ficam em subpastas derivadas do hash do CPF
+    (ex.: chaves/3f/a1/), para não acumular milhões de arquivos numa pasta só.
+    """
+    if particionar:
+        hash_cpf = hashlib.sha256(cpf_eleitor.encode('utf-8')).hexdigest()
+        pasta_chaves = os.path.join(pasta_chaves, hash_cpf[:2], hash_cpf[2:4])
+    return (os.path.join(pasta_chaves, f"eleitor_{cpf_eleitor}_publica.pem"),
+            os.path.join(pasta_chaves, f"eleitor_{cpf_eleitor}_privada.pem"))
+
+
+def _gravar_arquivo(caminho, conteudo):
+    # Grava em um arquivo temporário e renomeia, para nunca deixar uma chave pela metade
+    temporario = caminho + ".tmp"
+    with open(temporario, "wb") as f:
+        f.write(conteudo)
+    os.replace(temporario, caminho)
+
+
+def gerar_e_salvar_chaves(cpf_eleitor, esquema=ESQUEMA_PADRAO, pasta_chaves="chaves", particionar=False):
+    """
+    Gera um par de chaves para um eleitor, no esquema de assinatura escolhido
+    (RSA-2048 por padrão), e salva em arquivos .pem dentro de uma pasta chamada 'chaves'.
+    A chave pública é gravada por último: se ela existe, o par está completo.
     Retorna os nomes dos arquivos da chave pública e privada.
     """
+    nome_arquivo_publico, nome_arquivo_privado = caminhos_chaves_eleitor(cpf_eleitor, pasta_chaves, particionar)
+    os.makedirs(os.path.dirname(nome_arquivo_publico), exist_ok=True)
     
-    PASTA_CHAVES = "chaves"
-    os.makedirs(PASTA_CHAVES, exist_ok=True)
-    
-    private_key = rsa.generate_private_key(
-        public_exponent=65537,
-        key_size=2048,
-    )
+    private_key = gerar_chave_privada(esquema)
 
-    nome_arquivo_privado = os.path.join(PASTA_CHAVES, f"eleitor_{cpf_eleitor}_privada.pem")
-    nome_arquivo_publico = os.path.join(PASTA_CHAVES, f"eleitor_{cpf_eleitor}_publica.pem")
-    
     # Salva a chave privada em um arquivo PEM
     pem_private = private_key.private_bytes(
         encoding=serialization.Encoding.PEM,
         format=serialization.PrivateFormat.PKCS8,
         encryption_algorithm=serialization.NoEncryption()
     )
-    with open(nome_arquivo_privado, "wb") as f:
-        f.write(pem_private)
+    _gravar_arquivo(nome_arquivo_privado, pem_private)
 
     # Salva a chave pública em um arquivo PEM
     public_key = private_key.public_key()
@@ -39,46 +100,221 @@ def gerar_e_salvar_chaves(cpf_eleitor):
         encoding=serialization.Encoding.PEM,
         format=serialization.PublicFormat.SubjectPublicKeyInfo
     )
-    with open(nome_arquivo_publico, "wb") as f:
-        f.write(pem_public)
+    _gravar_arquivo(nome_arquivo_publico, pem_public)
     
     return nome_arquivo_publico, nome_arquivo_privado
 
 def assinar_dados(dados, caminho_chave_privada):
     """
     Assina o voto do eleitor utilizando a chave privada do mesmo, 
-    com o algoritmo de Hash criptográfico SHA-256
+    com o algoritmo de Hash criptográfico SHA-256 (RSA e ECDSA) ou com Ed25519,
+    conforme o tipo da chave.
     Retorna os dados assinados
     """
+    private_key = carregar_chave_privada(caminho_chave_privada)
+    return assinar_bytes(private_key, mensagem_canonica(dados))
+
+
+# Quantidade máxima de chaves privadas desserializadas mantidas em memória
+TAMANHO_CACHE_CHAVES_PRIVADAS = int(os.environ.get('TAMANHO_CACHE_CHAVES_PRIVADAS', 1024))
+
+_cache_chaves_privadas = OrderedDict()
+_cache_chaves_privadas_lock = threading.Lock()
+
+
+def carregar_chave_privada(caminho_chave_privada):
+    """
+    Carrega a chave privada de um arquivo PEM, reaproveitando a chave já
+    desserializada enquanto o arquivo não mudar (mesma data de modificação e
+    tamanho), já que gerar chaves de novo para o mesmo CPF sobrescreve o arquivo.
+    """
+    estado = os.stat(caminho_chave_privada)
+    marca = (estado.st_mtime_ns, estado.st_size)
+    with _cache_chaves_privadas_lock:
+        entrada = _cache_chaves_privadas.get(caminho_chave_privada)
+        if entrada is not None and entrada[0] == marca:
+            _cache_chaves_privadas.move_to_end(caminho_chave_privada)
+            return entrada[1]
+
     with open(caminho_chave_privada, "rb") as key_file:
         private_key = serialization.load_pem_private_key(
             key_file.read(),
             password=None,
         )
-    dados_bytes = json.dumps(dados, sort_keys=True).encode('utf-8')
-    assinatura = private_key.sign(
-        dados_bytes,
-        padding.PKCS1v15(),
-        hashes.SHA256()
+
+    with _cache_chaves_privadas_lock:
+        _cache_chaves_privadas[caminho_chave_privada] = (marca, private_key)
+        _cache_chaves_privadas.move_to_end(caminho_chave_privada)
+        while len(_cache_chaves_privadas) > TAMANHO_CACHE_CHAVES_PRIVADAS:
+            _cache_chaves_privadas.popitem(last=False)
+    return private_key
+
+
+def mensagem_canonica(dados):
+    """Serialização canônica dos dados do voto: são exatamente estes bytes que são assinados."""
+    return json.dumps(dados, sort_keys=True).encode('utf-8')
+
+
+def assinar_bytes(private_key, dados_bytes):
+    """Assina os bytes com a chave privada, usando o esquema correspondente ao tipo da chave."""
+    esquema = identificar_esquema(private_key)
+    if esquema == ESQUEMA_RSA:
+        return private_key.sign(dados_bytes, padding.PKCS1v15(), hashes.SHA256())
+    if esquema == ESQUEMA_ECDSA:
+        return private_key.sign(dados_bytes, ec.ECDSA(hashes.SHA256()))
+    return private_key.sign(dados_bytes)
+
+# Quantidade máxima de chaves públicas desserializadas mantidas em memória
+TAMANHO_CACHE_CHAVES = int(os.environ.get('TAMANHO_CACHE_CHAVES', 65536))
+
+
+def carregar_chave_publica(chave_publica):
+    """
+    Desserializa uma chave pública, aceitando tanto o texto PEM quanto os bytes DER.
+    Lança ValueError se a chave for inválida.
+    """
+    if isinstance(chave_publica, str):
+        chave_publica = chave_publica.encode('utf-8')
+    if chave_publica.lstrip().startswith(b'-----BEGIN'):
+        return serialization.load_pem_public_key(chave_publica)
+    return serialization.load_der_public_key(chave_publica)
+
+
+def carregar_chave_publica_der(chave_der):
+    """
+    Desserializa uma chave pública DER a partir de qualquer objeto de bytes,
+    inclusive uma fatia de memoryview, sem copiá-la. Lança ValueError se a chave for inválida.
+    """
+    return serialization.load_der_public_key(chave_der)
+
+
+def validar_chave_publica_pem(chave_publica_pem_string):
+    """
+    Valida uma chave pública em formato PEM e a converte para a forma compacta DER.
+    Retorna (bytes DER, esquema de assinatura), ou lança ValueError se a chave for
+    inválida ou de um tipo não suportado.
+    """
+    try:
+        public_key = serialization.load_pem_public_key(chave_publica_pem_string.encode('utf-8'))
+    except (ValueError, TypeError, AttributeError) as e:
+        raise ValueError(f"Chave pública inválida: {e}") from e
+    esquema = identificar_esquema(public_key)
+    chave_der = public_key.public_bytes(
+        encoding=serialization.Encoding.DER,
+        format=serialization.PublicFormat.SubjectPublicKeyInfo
     )
-    return assinatura
+    return chave_der, esquema
+
+
+class CacheChavesPublicas:
+    """
+    Cache LRU de chaves públicas já desserializadas, indexado pelo CPF do eleitor.
+    Cada entrada guarda o hash da chave de origem: se a chave registrada para o CPF
+    mudar, a entrada antiga é descartada e a nova chave é carregada.
+    """
+
+    def __init__(self, capacidade=TAMANHO_CACHE_CHAVES):
+        self.capacidade = capacidade
+        self._entradas = OrderedDict()
+        self._lock = threading.Lock()
+
+    def obter(self, cpf, chave_publica):
+        """Retorna a chave pública do eleitor, carregando-a apenas na primeira vez."""
+        if isinstance(chave_publica, str):
+            chave_publica = chave_publica.encode('utf-8')
+        hash_chave = hashlib.sha256(chave_publica).digest()
+
+        with self._lock:
+            entrada = self._entradas.get(cpf)
+            if entrada is not None and entrada[0] == hash_chave:
+                self._entradas.move_to_end(cpf)
+                return entrada[1]
+
+        public_key = carregar_chave_publica(chave_publica)
+
+        with self._lock:
+            self._entradas[cpf] = (hash_chave, public_key)
+            self._entradas.move_to_end(cpf)
+            while len(self._entradas) > self.capacidade:
+                self._entradas.popitem(last=False)
+        return public_key
+
+    def invalidar(self, cpf):
+        """Remove a chave do eleitor do cache."""
+        with self._lock:
+            self._entradas.pop(cpf, None)
+
+    def limpar(self):
+        with self._lock:
+            self._entradas.clear()
+
+    def __len__(self):
+        return len(self._entradas)
+
+
+# Cache compartilhado pelo processo (cada processo verificador possui o seu)
+cache_chaves = CacheChavesPublicas()
+
+
+def _verificar_rsa(public_key, assinatura_bytes, dados_bytes):
+    public_key.verify(assinatura_bytes, dados_bytes, padding.PKCS1v15(), hashes.SHA256())
 
-def verificar_assinatura(assinatura_bytes, dados, chave_publica_pem_string):
+
+def _verificar_ed25519(public_key, assinatura_bytes, dados_bytes):
+    public_key.verify(assinatura_bytes, dados_bytes)
+
+
+def _verificar_ecdsa(public_key, assinatura_bytes, dados_bytes):
+    public_key.verify(assinatura_bytes, dados_bytes, ec.ECDSA(hashes.SHA256()))
+
+
+_VERIFICADORES = {
+    ESQUEMA_RSA: _verificar_rsa,
+    ESQUEMA_ED25519: _verificar_ed25519,
+    ESQUEMA_ECDSA: _verificar_ecdsa,
+}
+
+
+def verificar_assinatura(assinatura_bytes, dados, chave_publica, cpf=None, tipo_chave=None):
     """
     Função que verifica se a assinatura de um determinado voto é válida, utilizando a chave pública do eleitor, salva no sistema.
+    A chave pode ser informada em PEM ou DER; quando o CPF é informado, a chave desserializada é reaproveitada do cache.
+    O esquema de verificação segue o tipo de chave registrado para o eleitor (tipo_chave) ou, na falta dele, o tipo da própria chave.
     Retorna True se a assinatura for válida e False caso contrário
     """
+    return verificar_assinatura_mensagem(assinatura_bytes, mensagem_canonica(dados), chave_publica, cpf, tipo_chave)
+
+
+def verificar_assinatura_mensagem(assinatura_bytes, mensagem_bytes, chave_publica, cpf=None, tipo_chave=None):
+    """
+    Igual a verificar_assinatura, mas recebe a mensagem já na forma canônica,
+    como ela fica guardada na urna, sem serializar os dados de novo.
+    """
+    public_key = obter_chave_verificacao(chave_publica, cpf)
+    return public_key is not None and verificar_com_chave(assinatura_bytes, mensagem_bytes, public_key, tipo_chave)
+
+
+def obter_chave_verificacao(chave_publica, cpf=None):
+    """
+    Desserializa a chave pública do eleitor (pelo cache, quando o CPF é informado).
+    Retorna None se a chave for inválida.
+    """
     try:
-        public_key = serialization.load_pem_public_key(
-            chave_publica_pem_string.encode('utf-8')
-        )
-        dados_bytes = json.dumps(dados, sort_keys=True).encode('utf-8')
-        public_key.verify(
-            assinatura_bytes,
-            dados_bytes,
-            padding.PKCS1v15(),
-            hashes.SHA256()
-        )
+        if cpf is not None:
+            return cache_chaves.obter(cpf, chave_publica)
+        return carregar_chave_publica(chave_publica)
+    except Exception:
+        return None
+
+
+def verificar_com_chave(assinatura_bytes, mensagem_bytes, public_key, tipo_chave=None):
+    """Verifica a assinatura com uma chave já desserializada. Retorna True ou False."""
+    try:
+        esquema = identificar_esquema(public_key)
+        # Uma chave que não corresponde ao tipo registrado nunca é aceita
+        if tipo_chave is not None and tipo_chave != esquema:
+            return False
+        _VERIFICADORES[esquema](public_key, assinatura_bytes, mensagem_bytes)
         return True
     except Exception:
-        return False
\ No newline at end of file
+        return False
@@ -0,0 +1,391 @@
+# fila_votos.py
+"""
+Fila de votos com log de escrita antecipada (write-ahead) e group commit.
+
+No modo INGESTAO_MODO=fila, /votar grava o voto em um log só de acréscimo e
+responde assim que o log está em disco. Uma thread junta os votos que chegam
+num intervalo curto (ou até um limite de gravações) e faz um único fsync para
+todos eles. Outra thread drena o log para a tabela votos em transações grandes
+e grava, na mesma transação, até onde o log já foi aplicado.
+
+O log de cada arquivo de banco fica em segmentos <banco>.fila.000001,
+<banco>.fila.000002, ... Cada registro é [tamanho][crc32][cpf][candidato]
+[mensagem][assinatura], com cada campo prefixado pelo seu tamanho. Na
+inicialização, os registros posteriores ao ponto gravado no banco são
+reaplicados antes de o servidor aceitar votos. Um registro incompleto no fim
+do último segmento (queda no meio de uma escrita) é descartado, porque aquele
+voto nunca foi confirmado ao eleitor. Como o ponto de aplicação e os votos
+entram na mesma transação, cada voto confirmado entra na urna exatamente uma vez.
+
+Enquanto um voto está no log e ainda não chegou à urna, o CPF fica reservado
+na fila, e um segundo voto do mesmo eleitor é recusado antes da drenagem. As
+apurações leem só a tabela votos, então um voto aparece nelas após ser drenado.
+"""
+import glob
+import os
+import struct
+import threading
+import time
+import zlib
+from armazenamento import abrir_conexao, executar_com_retentativa, SQLITE_SYNCHRONOUS
+from metricas import registro
+
+# Espera máxima para juntar gravações em um mesmo fsync, e quantas gravações
+# disparam o fsync sem esperar o intervalo. A espera só acontece quando o fsync
+# anterior cobriu mais de uma gravação, ou seja, quando há votos concorrentes;
+# um eleitor sozinho não paga o intervalo.
+FILA_INTERVALO_FSYNC = float(os.environ.get('FILA_INTERVALO_FSYNC', 0.002))
+FILA_LIMITE_GRUPO = int(os.environ.get('FILA_LIMITE_GRUPO', 64))
+
+# Votos por transação da drenagem, e espera para acumular votos antes de drenar
+FILA_VOTOS_POR_TRANSACAO = int(os.environ.get('FILA_VOTOS_POR_TRANSACAO', 5000))
+FILA_INTERVALO_DRENAGEM = float(os.environ.get('FILA_INTERVALO_DRENAGEM', 0.05))
+
+# Tamanho a partir do qual o segmento atual é fechado e um novo é aberto
+FILA_TAMANHO_SEGMENTO = int(os.environ.get('FILA_TAMANHO_SEGMENTO', 64 * 1024 * 1024))
+
+# Quantidade máxima de bytes lidos do log por vez
+JANELA_LEITURA = 8 * 1024 * 1024
+
+_CABECALHO = struct.Struct('>II')
+_TAMANHO_CAMPO = struct.Struct('>I')
+
+metrica_grupo_fsync = registro.histograma(
+    'votacao_fila_gravacoes_por_fsync', 'Gravações no log da fila cobertas por um mesmo fsync',
+    limites=(1, 2, 4, 8, 16, 32, 64, 128, 256))
+metrica_conflitos = registro.contador(
+    'votacao_fila_conflitos_total', 'Votos do log ignorados na drenagem porque o CPF já tinha voto na urna')
+
+
+class FilaIndisponivelError(Exception):
+    """O log da fila não pode receber votos (falha de gravação ou fila encerrada)."""
+
+
+class LogCorrompidoError(Exception):
+    """Um registro do log, fora do fim do último segmento, está incompleto ou não confere com o CRC."""
+
+
+def criar_tabela_fila(conn):
+    """Cria a tabela com o ponto até onde o log da fila já foi aplicado à urna."""
+    # Todos os segmentos anteriores a `segmento` já foram aplicados, e o atual até o byte `posicao`
+    conn.execute('''
+        CREATE TABLE IF NOT EXISTS fila_votos_progresso (
+            id INTEGER PRIMARY KEY CHECK (id = 1),
+            segmento INTEGER NOT NULL,
+            posicao INTEGER NOT NULL
+        )
+    ''')
+
+
+def codificar_registro(voto):
+    """Serializa (cpf, candidato_id, mensagem_assinada, assinatura) como um registro do log."""
+    corpo = b''.join(_TAMANHO_CAMPO.pack(len(campo)) + campo for campo in (
+        voto[0].encode('utf-8'), voto[1].encode('utf-8'), voto[2], voto[3]))
+    return _CABECALHO.pack(len(corpo), zlib.crc32(corpo)) + corpo
+
+
+def _decodificar_corpo(corpo):
+    campos = []
+    posicao = 0
+    for _ in range(4):
+        (tamanho,) = _TAMANHO_CAMPO.unpack_from(corpo, posicao)
+        posicao += _TAMANHO_CAMPO.size
+        campos.append(bytes(corpo[posicao:posicao + tamanho]))
+        posicao += tamanho
+    return campos[0].decode('utf-8'), campos[1].decode('utf-8'), campos[2], campos[3]
+
+
+def ler_registros(caminho, posicao=0, limite=None, max_registros=None):
+    """
+    Lê os registros de um segmento a partir do byte `posicao`, sem passar do
+    byte `limite` nem de JANELA_LEITURA bytes. Para no primeiro registro
+    incompleto ou corrompido. Retorna (votos, posição logo após o último registro lido).
+    """
+    votos = []
+    with open(caminho, 'rb') as f:
+        f.seek(posicao)
+        dados = f.read(JANELA_LEITURA if limite is None else min(max(limite - posicao, 0), JANELA_LEITURA))
+    deslocamento = 0
+    while max_registros is None or len(votos) < max_registros:
+        if len(dados) - deslocamento < _CABECALHO.size:
+            break
+        tamanho, crc = _CABECALHO.unpack_from(dados, deslocamento)
+        corpo = memoryview(dados)[deslocamento + _CABECALHO.size:deslocamento + _CABECALHO.size + tamanho]
+        if len(corpo) < tamanho or zlib.crc32(corpo) != crc:
+            break
+        votos.append(_decodificar_corpo(corpo))
+        deslocamento += _CABECALHO.size + tamanho
+    return votos, posicao + deslocamento
+
+
+def caminho_segmento(caminho_banco, numero):
+    return f'{caminho_banco}.fila.{numero:06d}'
+
+
+def listar_segmentos(caminho_banco):
+    """Números dos segmentos de log existentes para o arquivo de banco, em ordem."""
+    numeros = []
+    for caminho in glob.glob(glob.escape(caminho_banco) + '.fila.*'):
+        sufixo = caminho.rsplit('.', 1)[1]
+        if sufixo.isdigit():
+            numeros.append(int(sufixo))
+    return sorted(numeros)
+
+
+def _sincronizar_pasta(caminho):
+    """fsync da pasta, para que a criação ou remoção de um segmento também sobreviva a uma queda."""
+    fd = os.open(os.path.dirname(os.path.abspath(caminho)), os.O_RDONLY)
+    try:
+        os.fsync(fd)
+    finally:
+        os.close(fd)
+
+
+class FilaVotos:
+    """
+    Log de votos de um arquivo de banco, com a thread de group commit e a de
+    drenagem. Use iniciar() antes de anexar votos e encerrar() ao final.
+    """
+
+    def __init__(self, caminho_banco, ao_drenar=None):
+        self.caminho_banco = caminho_banco
+        # Chamado com a conexão da drenagem após cada transação (o modo incremental avisa o verificador)
+        self.ao_drenar = ao_drenar
+        self.votos_recuperados = 0
+        self._cond = threading.Condition()
+        self._reservados = set()
+        self._gravacoes = 0
+        self._gravacoes_duraveis = 0
+        self._ultimo_grupo = 0
+        self._posicao_duravel = (0, 0)
+        self._segmento = 0
+        self._arquivo = None
+        self._erro = None
+        self._parar = False
+        self._threads = []
+        self._conn = None
+        # Até onde a drenagem já aplicou o log
+        self._aplicado = (0, 0)
+
+    # -- Inicialização e recuperação --
+
+    def iniciar(self):
+        """Reaplica o log pendente à urna, abre um segmento novo e inicia as threads."""
+        self._conn = abrir_conexao(self.caminho_banco)
+        # A drenagem confirma poucas transações grandes; com FULL, cada uma já está em
+        # disco quando o segmento correspondente é apagado
+        self._conn.execute('PRAGMA synchronous = FULL')
+
+        segmento, posicao = self._ler_progresso()
+        segmentos = listar_segmentos(self.caminho_banco)
+        for numero in segmentos:
+            if numero < segmento:
+                continue
+            caminho = caminho_segmento(self.caminho_banco, numero)
+            inicio = posicao if numero == segmento else 0
+            while True:
+                votos, fim = ler_registros(caminho, inicio, max_registros=FILA_VOTOS_POR_TRANSACAO)
+                if not votos:
+                    break
+                self._aplicar(votos, numero, fim)
+                self.votos_recuperados += len(votos)
+                inicio = fim
+            if numero != segmentos[-1] and inicio != os.path.getsize(caminho):
+                raise LogCorrompidoError(f"O segmento '{caminho}' está corrompido no byte {inicio}")
+
+        # Tudo aplicado: o log recomeça num segmento novo e os antigos são apagados
+        self._segmento = max(segmentos + [segmento]) + 1
+        self._abrir_segmento()
+        self._avancar_progresso(self._segmento, 0)
+        for numero in segmentos:
+            os.remove(caminho_segmento(self.caminho_banco, numero))
+        self._posicao_duravel = self._aplicado = (self._segmento, 0)
+
+        for alvo in (self._sincronizar_continuamente, self._drenar_continuamente):
+            thread = threading.Thread(target=alvo, daemon=True)
+            thread.start()
+            self._threads.append(thread)
+
+    def _ler_progresso(self):
+        row = self._conn.execute('SELECT segmento, posicao FROM fila_votos_progresso WHERE id = 1').fetchone()
+        return (row['segmento'], row['posicao']) if row else (0, 0)
+
+    def _abrir_segmento(self):
+        caminho = caminho_segmento(self.caminho_banco, self._segmento)
+        self._arquivo = open(caminho, 'ab')
+        _sincronizar_pasta(caminho)
+
+    # -- Gravação com group commit --
+
+    def reservar(self, cpf):
+        """Reserva o CPF para um voto na fila. Retorna False se ele já tem um voto na fila."""
+        with self._cond:
+            if cpf in self._reservados:
+                return False
+            self._reservados.add(cpf)
+            return True
+
+    def liberar(self, cpfs):
+        """Libera as reservas de votos que não foram gravados no log."""
+        with self._cond:
+            self._reservados.difference_update(cpfs)
+
+    def anexar(self, votos):
+        """
+        Grava os votos (cpf, candidato_id, mensagem_assinada, assinatura), já
+        reservados, no log e retorna quando estiverem em disco. Lança
+        FilaIndisponivelError se o log não puder ser gravado.
+        """
+        registros = b''.join(codificar_registro(voto) for voto in votos)
+        with self._cond:
+            if self._erro is not None or self._parar:
+                raise FilaIndisponivelError(f'A fila de votos não está aceitando gravações: {self._erro or "encerrada"}')
+            self._arquivo.write(registros)
+            self._gravacoes += 1
+            gravacao = self._gravacoes
+            self._cond.notify_all()
+            while self._gravacoes_duraveis < gravacao and self._erro is None:
+                self._cond.wait()
+            if self._gravacoes_duraveis < gravacao:
+                raise FilaIndisponivelError(f'Falha ao gravar o log da fila de votos: {self._erro}')
+
+    def _sincronizar_continuamente(self):
+        while True:
+            with self._cond:
+                while self._gravacoes == self._gravacoes_duraveis and not self._parar:
+                    self._cond.wait()
+                if self._gravacoes == self._gravacoes_duraveis:
+                    return
+                # Sob carga concorrente, espera um pouco para que outras gravações entrem no mesmo fsync
+                prazo = time.monotonic() + FILA_INTERVALO_FSYNC
+                while (self._ultimo_grupo > 1 and self._gravacoes - self._gravacoes_duraveis < FILA_LIMITE_GRUPO
+                       and not self._parar):
+                    restante = prazo - time.monotonic()
+                    if restante <= 0:
+                        break
+                    self._cond.wait(restante)
+                gravacoes = self._gravacoes
+                self._arquivo.flush()
+                posicao = (self._segmento, self._arquivo.tell())
+                arquivo = self._arquivo
+
+            # O fsync acontece fora do lock: novas gravações seguem para o próximo grupo
+            try:
+                os.fsync(arquivo.fileno())
+            except OSError as e:
+                with self._cond:
+                    self._erro = e
+                    self._cond.notify_all()
+                return
+
+            with self._cond:
+                self._ultimo_grupo = gravacoes - self._gravacoes_duraveis
+                metrica_grupo_fsync.observar(self._ultimo_grupo)
+                self._gravacoes_duraveis = gravacoes
+                self._posicao_duravel = posicao
+                if posicao[1] >= FILA_TAMANHO_SEGMENTO:
+                    self._trocar_segmento()
+                self._cond.notify_all()
+
+    def _trocar_segmento(self):
+        """Fecha o segmento atual (com tudo em disco) e abre o próximo. Chamado com o lock."""
+        self._arquivo.flush()
+        os.fsync(self._arquivo.fileno())
+        self._arquivo.close()
+        self._gravacoes_duraveis = self._gravacoes
+        self._segmento += 1
+        self._abrir_segmento()
+        self._posicao_duravel = (self._segmento, 0)
+
+    # -- Drenagem para a urna --
+
+    def _aplicar(self, votos, segmento, posicao):
+        """Insere os votos e avança o ponto de aplicação do log na mesma transação."""
+        def gravar(conn):
+            antes = conn.total_changes
+            conn.executemany('INSERT OR IGNORE INTO votos (eleitor_cpf, candidato_id, mensagem_assinada, assinatura) '
+                             'VALUES (?, ?, ?, ?)', votos)
+            # As reservas impedem dois votos do mesmo CPF; um conflito aqui só
+            # acontece se a urna foi alterada por fora do servidor
+            conflitos = len(votos) - (conn.total_changes - antes)
+            conn.execute('''
+                INSERT INTO fila_votos_progresso (id, segmento, posicao) VALUES (1, ?, ?)
+                ON CONFLICT (id) DO UPDATE SET segmento = excluded.segmento, posicao = excluded.posicao
+            ''', (segmento, posicao))
+            return conflitos
+
+        conflitos = executar_com_retentativa(self._conn, gravar)
+        if conflitos:
+            metrica_conflitos.incrementar(conflitos)
+
+    def _avancar_progresso(self, segmento, posicao):
+        executar_com_retentativa(self._conn, lambda conn: conn.execute(
+            'INSERT INTO fila_votos_progresso (id, segmento, posicao) VALUES (1, ?, ?) '
+            'ON CONFLICT (id) DO UPDATE SET segmento = excluded.segmento, posicao = excluded.posicao',
+            (segmento, posicao)))
+
+    def _drenar_continuamente(self):
+        while True:
+            with self._cond:
+                while self._posicao_duravel == self._aplicado and not self._parar:
+                    self._cond.wait()
+                if self._parar:
+                    # O que faltar é drenado por encerrar(), depois do último fsync
+                    return
+            # Acumula votos por um instante, para drenar em transações grandes
+            time.sleep(FILA_INTERVALO_DRENAGEM)
+            with self._cond:
+                duravel = self._posicao_duravel
+
+            try:
+                self._drenar_ate(duravel)
+            except Exception as e:
+                # Os votos continuam no log e são reaplicados na próxima inicialização
+                with self._cond:
+                    self._erro = e
+                    self._cond.notify_all()
+                return
+
+    def _drenar_ate(self, duravel):
+        """Aplica o log do ponto já aplicado até a posição durável informada."""
+        segmento, posicao = self._aplicado
+        while (segmento, posicao) < duravel:
+            caminho = caminho_segmento(self.caminho_banco, segmento)
+            limite = duravel[1] if segmento == duravel[0] else None
+            votos, fim = ler_registros(caminho, posicao, limite, FILA_VOTOS_POR_TRANSACAO)
+            if votos:
+                self._aplicar(votos, segmento, fim)
+                posicao = fim
+                self._aplicado = (segmento, posicao)
+                self.liberar([voto[0] for voto in votos])
+                if self.ao_drenar is not None:
+                    self.ao_drenar(self._conn)
+            elif segmento < duravel[0]:
+                # Segmento fechado e todo aplicado: passa para o próximo e apaga este
+                segmento, posicao = segmento + 1, 0
+                self._avancar_progresso(segmento, posicao)
+                self._aplicado = (segmento, posicao)
+                os.remove(caminho)
+                _sincronizar_pasta(caminho)
+            else:
+                raise LogCorrompidoError(f"Registro inválido no segmento '{caminho}', byte {posicao}")
+
+    # -- Encerramento --
+
+    def encerrar(self):
+        """Para de aceitar votos, grava o que falta no log e drena tudo para a urna."""
+        with self._cond:
+            if self._parar:
+                return
+            self._parar = True
+            self._cond.notify_all()
+        for thread in self._threads:
+            thread.join()
+        with self._cond:
+            if self._arquivo is not None:
+                self._arquivo.close()
+        if self._conn is not None:
+            if self._erro is None:
+                self._drenar_ate(self._posicao_duravel)
+            self._conn.execute(f'PRAGMA synchronous = {SQLITE_SYNCHRONOUS}')
+            self._conn.fechar()
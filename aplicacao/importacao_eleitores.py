@@ -0,0 +1,253 @@
+# importacao_eleitores.py
+"""
+Importação em massa de eleitores a partir de arquivos NDJSON, uma linha por
+eleitor no formato gerado por preparar_payload.py:
+
+    {"cpf": "...", "nome": "...", "chave_publica_pem": "-----BEGIN PUBLIC KEY-----..."}
+
+As linhas são lidas uma a uma e gravadas em transações por lote. O número da
+última linha confirmada é gravado na mesma transação, de modo que uma importação
+interrompida retoma exatamente do ponto em que parou.
+
+Uso:
+    python importacao_eleitores.py eleitores.jsonl [--banco votacao_database.db] [--particoes 1]
+                                   [--relatorio rejeitados.jsonl]
+"""
+import argparse
+import glob
+import json
+import os
+import sqlite3
+import sys
+import time
+from armazenamento import executar_com_retentativa, buscar_cpfs_existentes
+from crypto_utils import validar_chave_publica_pem, cache_chaves
+from urna import Urna, registrar_particao
+from validacao_cpf import normalizar_cpf
+
+TAMANHO_LOTE_IMPORTACAO = 1000
+
+
+def criar_tabela_progresso(conn):
+    """Cria a tabela com a última linha confirmada de cada importação."""
+    conn.execute('''
+        CREATE TABLE IF NOT EXISTS importacao_progresso (
+            id_importacao TEXT PRIMARY KEY,
+            ultima_linha INTEGER NOT NULL
+        )
+    ''')
+
+
+def ler_progresso(conn, id_importacao):
+    row = conn.execute('SELECT ultima_linha FROM importacao_progresso WHERE id_importacao = ?',
+                       (id_importacao,)).fetchone()
+    return row[0] if row else 0
+
+
+def preparar_urna(urna):
+    """
+    Cria as tabelas do servidor em todas as partições da urna, conferindo a versão
+    do esquema e a divisão gravada por registrar_particao. Lança ValueError se a
+    urna existente tiver outro número de partições; nesse caso, nada é gravado e os
+    arquivos que seriam criados são apagados.
+    """
+    from servidor import criar_tabelas, verificar_esquema
+
+    existentes = [os.path.exists(caminho) for caminho in urna.caminhos]
+    if not any(existentes):
+        # Uma urna com outro número de partições não tem nenhum dos arquivos esperados
+        raiz, extensao = os.path.splitext(urna.caminho_base)
+        outros = [caminho for caminho in
+                  [urna.caminho_base] + glob.glob(f'{glob.escape(raiz)}.particao*{glob.escape(extensao)}')
+                  if caminho not in urna.caminhos and os.path.exists(caminho)]
+        if outros:
+            raise ValueError(f"A urna '{urna.caminho_base}' não tem as {urna.num_particoes} partição(ões) pedidas, "
+                             f"mas existe '{sorted(outros)[0]}'; confira o número de partições")
+
+    conexoes = []
+    try:
+        for indice, caminho in enumerate(urna.caminhos):
+            conn = sqlite3.connect(caminho, isolation_level=None)
+            conexoes.append(conn)
+            conn.execute('BEGIN IMMEDIATE')
+            verificar_esquema(conn, caminho)
+            criar_tabelas(conn)
+            if urna.num_particoes > 1:
+                registrar_particao(conn, indice, urna.num_particoes)
+    except Exception:
+        for conn in conexoes:
+            conn.rollback()
+            conn.close()
+        for caminho, existia in zip(urna.caminhos, existentes):
+            if not existia and os.path.exists(caminho):
+                os.remove(caminho)
+        raise
+    for conn in conexoes:
+        conn.commit()
+        conn.close()
+
+
+def interpretar_linha(linha):
+    """
+    Valida uma linha do arquivo e retorna (cpf_normalizado, nome, chave_publica_der, tipo_chave).
+    Lança ValueError com o motivo da rejeição.
+    """
+    try:
+        dados = json.loads(linha)
+    except ValueError:
+        raise ValueError('JSON inválido')
+    if not isinstance(dados, dict) or not all(dados.get(campo) for campo in ('cpf', 'nome', 'chave_publica_pem')):
+        raise ValueError('Dados incompletos')
+
+    cpf = normalizar_cpf(dados['cpf'])
+    if cpf is None:
+        raise ValueError('CPF inválido')
+    try:
+        chave_publica_der, tipo_chave = validar_chave_publica_pem(dados['chave_publica_pem'])
+    except (ValueError, AttributeError):
+        raise ValueError('Chave pública inválida')
+    return cpf, dados['nome'], chave_publica_der, tipo_chave
+
+
+def importar_eleitores(urna, linhas, id_importacao=None, tamanho_lote=TAMANHO_LOTE_IMPORTACAO, ao_rejeitar=None,
+                       ao_registrar=None):
+    """
+    Importa os eleitores de um iterável de linhas NDJSON (str ou bytes) para a urna.
+
+    Cada lote é gravado em uma transação própria; eleitores já registrados ou
+    repetidos no arquivo são reportados como conflito sem interromper a importação.
+    Com `id_importacao`, as linhas até a última confirmada são puladas e o progresso
+    é atualizado junto com cada lote. Cada linha rejeitada é passada para
+    `ao_rejeitar({'linha', 'cpf', 'motivo'})`, sem ser acumulada na memória, e o
+    CPF de cada eleitor gravado é passado para `ao_registrar(cpf)`.
+    Retorna um resumo com as contagens e a última linha confirmada.
+
+    Numa urna particionada, cada lote vira uma transação por partição e o progresso
+    fica na partição 0, gravada por último. Se a importação parar entre essas
+    transações, a retomada refaz o lote e os eleitores já gravados dele aparecem
+    como conflito.
+    """
+    conn = urna.conexao(0)
+    try:
+        retomar_apos = ler_progresso(conn, id_importacao) if id_importacao else 0
+    finally:
+        conn.close()
+    resumo = {'registrados': 0, 'conflitos': 0, 'invalidos': 0,
+              'linhas_puladas': retomar_apos, 'ultima_linha_confirmada': retomar_apos}
+
+    def rejeitar(numero_linha, cpf, motivo):
+        if ao_rejeitar is not None:
+            ao_rejeitar({'linha': numero_linha, 'cpf': cpf, 'motivo': motivo})
+
+    def gravar_particao(conn, itens, ultima_linha):
+        def gravar(conn):
+            ja_registrados = buscar_cpfs_existentes(conn, 'eleitores', 'cpf', {item[1] for item in itens})
+            novos = []
+            conflitos = []
+            for numero_linha, cpf, nome, chave_publica_der, tipo_chave in itens:
+                if cpf in ja_registrados:
+                    conflitos.append((numero_linha, cpf))
+                    continue
+                ja_registrados.add(cpf)
+                novos.append((cpf, nome, chave_publica_der, tipo_chave))
+            conn.executemany('INSERT INTO eleitores (cpf, nome, chave_publica_der, tipo_chave) VALUES (?, ?, ?, ?)', novos)
+            if ultima_linha is not None:
+                conn.execute('''
+                    INSERT INTO importacao_progresso (id_importacao, ultima_linha) VALUES (?, ?)
+                    ON CONFLICT (id_importacao) DO UPDATE SET ultima_linha = excluded.ultima_linha
+                ''', (id_importacao, ultima_linha))
+            return novos, conflitos
+
+        return executar_com_retentativa(conn, gravar)
+
+    def gravar_lote(lote, ultima_linha):
+        grupos = urna.agrupar(lote, lambda item: item[1])
+        if id_importacao:
+            grupos.setdefault(0, [])
+        novos = []
+        conflitos = []
+        for indice in sorted(grupos, reverse=True):
+            conn = urna.conexao(indice)
+            try:
+                novos_particao, conflitos_particao = gravar_particao(
+                    conn, [item for _, item in grupos[indice]],
+                    ultima_linha if indice == 0 and id_importacao else None)
+            finally:
+                conn.close()
+            novos.extend(novos_particao)
+            conflitos.extend(conflitos_particao)
+
+        for cpf, _, _, _ in novos:
+            cache_chaves.invalidar(cpf)
+            if ao_registrar is not None:
+                ao_registrar(cpf)
+        for numero_linha, cpf in sorted(conflitos):
+            rejeitar(numero_linha, cpf, 'CPF já registrado')
+        resumo['registrados'] += len(novos)
+        resumo['conflitos'] += len(conflitos)
+        resumo['ultima_linha_confirmada'] = ultima_linha
+
+    lote = []
+    numero_linha = retomar_apos
+    for numero_linha, linha in enumerate(linhas, 1):
+        if numero_linha <= retomar_apos or not linha.strip():
+            continue
+        try:
+            cpf, nome, chave_publica_der, tipo_chave = interpretar_linha(linha)
+        except ValueError as e:
+            resumo['invalidos'] += 1
+            rejeitar(numero_linha, None, str(e))
+        else:
+            lote.append((numero_linha, cpf, nome, chave_publica_der, tipo_chave))
+
+        # O progresso avança também sobre linhas inválidas, que não seriam aceitas numa nova tentativa
+        if numero_linha - resumo['ultima_linha_confirmada'] >= tamanho_lote:
+            gravar_lote(lote, numero_linha)
+            lote = []
+
+    if numero_linha > resumo['ultima_linha_confirmada']:
+        gravar_lote(lote, numero_linha)
+
+    return resumo
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('arquivo', help='arquivo NDJSON com os eleitores')
+    parser.add_argument('--banco', default='votacao_database.db', help='banco de dados do servidor')
+    parser.add_argument('--particoes', type=int, default=int(os.environ.get('URNA_NUM_PARTICOES', 1)),
+                        help='número de partições da urna (padrão: URNA_NUM_PARTICOES ou 1)')
+    parser.add_argument('--id-importacao', help='identificador usado para retomar a importação (padrão: o caminho do arquivo)')
+    parser.add_argument('--tamanho-lote', type=int, default=TAMANHO_LOTE_IMPORTACAO)
+    parser.add_argument('--relatorio', help='arquivo NDJSON onde as linhas rejeitadas são registradas')
+    args = parser.parse_args()
+
+    urna = Urna(args.banco, args.particoes)
+    try:
+        preparar_urna(urna)
+    except (ValueError, sqlite3.Error) as e:
+        sys.exit(str(e))
+
+    relatorio = open(args.relatorio, 'a', encoding='utf-8') if args.relatorio else None
+
+    def ao_rejeitar(registro):
+        if relatorio is not None:
+            relatorio.write(json.dumps(registro, ensure_ascii=False) + '\n')
+
+    inicio = time.perf_counter()
+    try:
+        with open(args.arquivo, 'rb') as arquivo:
+            resumo = importar_eleitores(urna, arquivo, args.id_importacao or os.path.abspath(args.arquivo),
+                                        args.tamanho_lote, ao_rejeitar)
+    finally:
+        if relatorio is not None:
+            relatorio.close()
+
+    resumo['segundos'] = round(time.perf_counter() - inicio, 2)
+    print(json.dumps(resumo, ensure_ascii=False, indent=2))
+    if resumo['invalidos'] or resumo['conflitos']:
+        print(f"{resumo['invalidos'] + resumo['conflitos']} linha(s) rejeitada(s).", file=sys.stderr)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,121 @@
+# indice_admissao.py
+"""
+Índice em memória das checagens de admissão de um voto: se o CPF está
+registrado e se já votou.
+
+O índice é carregado da urna na inicialização do servidor (aquecimento_urna.py)
+e atualizado a cada escrita feita pelo servidor, para que os votos obviamente
+recusados (eleitor não registrado ou voto repetido) sejam respondidos sem
+consultar o SQLite. O banco continua sendo a palavra final: um voto admitido
+pelo índice ainda passa pelo insert com a restrição UNIQUE.
+
+Os CPFs normalizados (11 dígitos) são guardados como inteiros em arrays
+ordenados de int64, com 8 bytes por CPF, em vez dos ~60 bytes de um set de
+strings do Python.
+"""
+import threading
+try:
+    import numpy as np
+except ImportError:  # sem NumPy, os conjuntos ficam em sets do Python
+    np = None
+
+# Quantidade de inserções acumuladas antes de serem fundidas ao array ordenado
+LIMITE_RECENTES = 65536
+
+
+def chave_cpf(cpf):
+    """O CPF normalizado como inteiro, ou None se não tiver exatamente 11 dígitos ASCII."""
+    if isinstance(cpf, str) and len(cpf) == 11 and cpf.isascii() and cpf.isdigit():
+        return int(cpf)
+    return None
+
+
+class ConjuntoCompacto:
+    """
+    Conjunto de inteiros guardado como um array ordenado, mais um set com as
+    inserções recentes. Quando o set passa de LIMITE_RECENTES elementos, ele é
+    fundido ao array. Leituras não usam lock.
+    """
+
+    def __init__(self, valores=()):
+        if np is None:
+            self._base = set(valores)
+        else:
+            base = np.array(valores, dtype=np.int64)
+            # Valores lidos na ordem de um índice já chegam ordenados e sem repetição
+            if len(base) > 1 and not (base[1:] > base[:-1]).all():
+                base = np.unique(base)
+            self._base = base
+        self._recentes = set()
+        self._lock = threading.Lock()
+
+    def __len__(self):
+        return len(self._base) + len(self._recentes)
+
+    def __contains__(self, valor):
+        # As inserções recentes são consultadas antes do array: uma fusão só
+        # retira um valor do set depois de publicar o array que já o contém
+        if valor in self._recentes:
+            return True
+        base = self._base
+        if np is None:
+            return valor in base
+        posicao = base.searchsorted(valor)
+        return posicao < len(base) and base[posicao] == valor
+
+    def adicionar(self, valor):
+        if valor in self:
+            return
+        self._recentes.add(valor)
+        if len(self._recentes) >= LIMITE_RECENTES:
+            self._fundir()
+
+    def _fundir(self):
+        with self._lock:
+            # Outra thread pode ter acabado de fundir os mesmos valores
+            if len(self._recentes) < LIMITE_RECENTES:
+                return
+            recentes = set(self._recentes)
+            if np is None:
+                self._base = self._base | recentes
+            else:
+                base = self._base
+                novos = np.sort(np.fromiter(recentes, dtype=np.int64, count=len(recentes)))
+                posicoes = base.searchsorted(novos)
+                if len(base):
+                    ja_presentes = base[np.minimum(posicoes, len(base) - 1)] == novos
+                else:
+                    ja_presentes = np.zeros(len(novos), dtype=bool)
+                novos, posicoes = novos[~ja_presentes], posicoes[~ja_presentes]
+                self._base = np.insert(base, posicoes, novos)
+            self._recentes -= recentes
+
+
+class IndiceAdmissao:
+    """CPFs registrados e CPFs que já votaram, consultados antes de ir ao banco."""
+
+    def __init__(self, registrados=(), votaram=()):
+        self.registrados = ConjuntoCompacto(registrados)
+        self.votaram = ConjuntoCompacto(votaram)
+
+    def admissao(self, cpf):
+        """'ja_votou', 'nao_registrado' ou 'registrado' (o voto segue para o banco)."""
+        chave = chave_cpf(cpf)
+        if chave is None:
+            # A urna só guarda CPFs normalizados; outra forma nunca está registrada
+            return 'nao_registrado'
+        if chave in self.votaram:
+            return 'ja_votou'
+        if chave not in self.registrados:
+            return 'nao_registrado'
+        return 'registrado'
+
+    def registrar(self, cpf):
+        chave = chave_cpf(cpf)
+        if chave is not None:
+            self.registrados.adicionar(chave)
+
+    def marcar_voto(self, cpf):
+        chave = chave_cpf(cpf)
+        if chave is not None:
+            self.votaram.adicionar(chave)
@@ -0,0 +1,167 @@
+# metricas.py
+"""
+Métricas do servidor no formato de exposição em texto do Prometheus, sem
+dependências externas. Os contadores e histogramas ficam em um registro global
+do processo e são lidos por GET /metrics.
+"""
+import threading
+import time
+from contextlib import contextmanager
+
+# Limites (em segundos) dos histogramas de latência, iguais aos do cliente oficial do Prometheus
+LIMITES_PADRAO = (0.005, 0.01, 0.025, 0.05, 0.075, 0.1, 0.25, 0.5, 0.75, 1.0, 2.5, 5.0, 7.5, 10.0)
+
+TIPO_CONTEUDO = 'text/plain; version=0.0.4; charset=utf-8'
+
+
+def _escapar(valor):
+    return str(valor).replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n')
+
+
+def _formatar_rotulos(nomes, valores, extra=None):
+    pares = [f'{nome}="{_escapar(valor)}"' for nome, valor in zip(nomes, valores)]
+    if extra is not None:
+        pares.append(f'{extra[0]}="{extra[1]}"')
+    return '{' + ','.join(pares) + '}' if pares else ''
+
+
+def _formatar_numero(valor):
+    return repr(float(valor)) if isinstance(valor, float) else str(valor)
+
+
+class _Metrica:
+    tipo = None
+
+    def __init__(self, nome, ajuda, rotulos=()):
+        self.nome = nome
+        self.ajuda = ajuda
+        self.rotulos = tuple(rotulos)
+        self._valores = {}
+        self._lock = threading.Lock()
+
+    def _chave(self, rotulos):
+        if set(rotulos) != set(self.rotulos):
+            raise ValueError(f"A métrica {self.nome} espera os rótulos {self.rotulos}, recebeu {tuple(rotulos)}")
+        return tuple(str(rotulos[nome]) for nome in self.rotulos)
+
+    def exposicao(self):
+        linhas = [f'# HELP {self.nome} {self.ajuda}', f'# TYPE {self.nome} {self.tipo}']
+        with self._lock:
+            valores = sorted(self._valores.items())
+        if not valores and not self.rotulos:
+            # Métricas sem rótulos aparecem desde o início, zeradas
+            valores = [((), self._serie_vazia())]
+        for chave, valor in valores:
+            linhas.extend(self._linhas_serie(chave, valor))
+        return linhas
+
+
+class Contador(_Metrica):
+    """Valor que só cresce, como a quantidade de requisições atendidas."""
+
+    tipo = 'counter'
+
+    def incrementar(self, valor=1, **rotulos):
+        chave = self._chave(rotulos)
+        with self._lock:
+            self._valores[chave] = self._valores.get(chave, 0) + valor
+
+    def valor(self, **rotulos):
+        with self._lock:
+            return self._valores.get(self._chave(rotulos), 0)
+
+    def _serie_vazia(self):
+        return 0
+
+    def _linhas_serie(self, chave, valor):
+        return [f'{self.nome}{_formatar_rotulos(self.rotulos, chave)} {_formatar_numero(valor)}']
+
+
+class Histograma(_Metrica):
+    """Distribuição de durações em faixas cumulativas, com soma e contagem."""
+
+    tipo = 'histogram'
+
+    def __init__(self, nome, ajuda, rotulos=(), limites=LIMITES_PADRAO):
+        super().__init__(nome, ajuda, rotulos)
+        self.limites = tuple(sorted(limites))
+
+    def observar(self, valor, **rotulos):
+        chave = self._chave(rotulos)
+        with self._lock:
+            serie = self._valores.get(chave)
+            if serie is None:
+                serie = self._valores[chave] = self._serie_vazia()
+            for indice, limite in enumerate(self.limites):
+                if valor <= limite:
+                    serie[indice] += 1
+                    break
+            serie[-2] += valor
+            serie[-1] += 1
+
+    def _serie_vazia(self):
+        # [contagem por faixa..., soma, contagem total]
+        return [0] * len(self.limites) + [0.0, 0]
+
+    @contextmanager
+    def cronometrar(self, **rotulos):
+        """Observa o tempo gasto dentro do bloco `with`."""
+        inicio = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.observar(time.perf_counter() - inicio, **rotulos)
+
+    def _linhas_serie(self, chave, serie):
+        linhas = []
+        acumulado = 0
+        # As faixas são cumulativas; a última (+Inf) é a contagem total
+        for limite, quantidade in zip(self.limites, serie):
+            acumulado += quantidade
+            rotulos = _formatar_rotulos(self.rotulos, chave, ('le', _formatar_numero(limite)))
+            linhas.append(f'{self.nome}_bucket{rotulos} {acumulado}')
+        rotulos = _formatar_rotulos(self.rotulos, chave, ('le', '+Inf'))
+        linhas.append(f'{self.nome}_bucket{rotulos} {serie[-1]}')
+        rotulos = _formatar_rotulos(self.rotulos, chave)
+        linhas.append(f'{self.nome}_sum{rotulos} {_formatar_numero(serie[-2])}')
+        linhas.append(f'{self.nome}_count{rotulos} {serie[-1]}')
+        return linhas
+
+
+class RegistroMetricas:
+    """Conjunto das métricas do processo, na ordem em que foram criadas."""
+
+    def __init__(self):
+        self._metricas = {}
+        self._lock = threading.Lock()
+
+    def _registrar(self, metrica):
+        # Registrar de novo o mesmo nome (ex.: módulo importado como __main__ e
+        # pelo nome) devolve a métrica já existente
+        with self._lock:
+            existente = self._metricas.get(metrica.nome)
+            if existente is not None:
+                if type(existente) is not type(metrica) or existente.rotulos != metrica.rotulos:
+                    raise ValueError(f"Métrica {metrica.nome} já registrada com outro tipo ou rótulos")
+                return existente
+            self._metricas[metrica.nome] = metrica
+        return metrica
+
+    def contador(self, nome, ajuda, rotulos=()):
+        return self._registrar(Contador(nome, ajuda, rotulos))
+
+    def histograma(self, nome, ajuda, rotulos=(), limites=LIMITES_PADRAO):
+        return self._registrar(Histograma(nome, ajuda, rotulos, limites))
+
+    def exposicao(self):
+        """Todas as métricas no formato de texto do Prometheus."""
+        with self._lock:
+            metricas = list(self._metricas.values())
+        linhas = []
+        for metrica in metricas:
+            linhas.extend(metrica.exposicao())
+        return '\n'.join(linhas) + '\n'
+
+
+# Registro compartilhado pelo processo do servidor
+registro = RegistroMetricas()
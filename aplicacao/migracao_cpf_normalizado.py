@@ -0,0 +1,146 @@
+# migracao_cpf_normalizado.py
+"""
+Normaliza os CPFs já gravados na urna e une os eleitores duplicados pela pontuação.
+
+Antes da normalização no servidor, o mesmo eleitor podia ser registrado como
+123.456.789-09 e como 12345678909, e votar uma vez com cada forma. Para cada
+CPF com mais de uma forma, a migração mantém:
+
+    - o primeiro voto (menor id), como o servidor teria feito ao recusar o segundo;
+    - o registro do eleitor cuja forma do CPF assinou esse voto (ou, se ninguém
+      votou, o registro mais antigo), para que o voto mantido continue verificável.
+
+Os demais registros e votos são apagados e listados no resumo. Os CPFs mantidos
+passam a ser guardados só com os dígitos. As mensagens assinadas não mudam.
+
+Se algo mudar numa partição, as apurações materializadas dela (incremental e
+checkpoints da retomável) são zeradas e os votos voltam a ser não verificados,
+porque os CPFs e os votos que elas registraram mudaram. CPFs inválidos são
+apenas contados. Cada partição é migrada em uma transação; rode com o servidor parado.
+
+Uso:
+    python migracao_cpf_normalizado.py votacao_database.db [--particoes 4] [--simular]
+"""
+import argparse
+import json
+import os
+import sqlite3
+import sys
+import time
+from urna import caminhos_particoes, registrar_particao
+from validacao_cpf import normalizar_cpfs
+
+# Tabelas das apurações materializadas, zeradas quando a urna muda
+TABELAS_APURACAO = ('apuracao_contagem', 'apuracao_invalidos', 'apuracao_checkpoints')
+
+
+def agrupar_formas(linhas):
+    """
+    Recebe [(id, cpf)] e retorna ({cpf normalizado: [(id, cpf)]} dos CPFs que
+    aparecem em alguma forma diferente da normalizada, quantidade de CPFs inválidos).
+    """
+    normalizados = normalizar_cpfs(cpf for _, cpf in linhas)
+    afetados = {normalizado for (_, cpf), normalizado in zip(linhas, normalizados)
+                if normalizado is not None and normalizado != cpf}
+    grupos = {}
+    for linha, normalizado in zip(linhas, normalizados):
+        if normalizado in afetados:
+            grupos.setdefault(normalizado, []).append(linha)
+    return grupos, normalizados.count(None)
+
+
+def migrar_particao(conn):
+    """Normaliza os CPFs de uma partição, sem confirmar a transação. Retorna o resumo da partição."""
+    eleitores = conn.execute('SELECT rowid, cpf FROM eleitores ORDER BY rowid').fetchall()
+    votos = conn.execute('SELECT id, eleitor_cpf FROM votos ORDER BY id').fetchall()
+    eleitores_por_cpf, eleitores_invalidos = agrupar_formas(eleitores)
+    votos_por_cpf, votos_invalidos = agrupar_formas(votos)
+
+    eleitores_removidos = []
+    votos_removidos = []
+    eleitores_normalizados = []
+    votos_normalizados = []
+    for cpf in eleitores_por_cpf.keys() | votos_por_cpf.keys():
+        registros = eleitores_por_cpf.get(cpf) or []
+        votos_cpf = votos_por_cpf.get(cpf) or []
+        if votos_cpf:
+            voto_id, forma_assinante = votos_cpf[0]
+            votos_removidos.extend({'voto_id': voto_id, 'cpf': forma} for voto_id, forma in votos_cpf[1:])
+            votos_normalizados.append((cpf, voto_id))
+            mantido = next((registro for registro in registros if registro[1] == forma_assinante), None)
+        else:
+            mantido = None
+        if registros:
+            mantido = mantido or registros[0]
+            eleitores_removidos.extend(registro for registro in registros if registro != mantido)
+            eleitores_normalizados.append((cpf, mantido[0]))
+
+    # Os duplicados saem antes, para que os CPFs normalizados não esbarrem nas chaves únicas
+    conn.executemany('DELETE FROM votos WHERE id = ?', [(voto['voto_id'],) for voto in votos_removidos])
+    conn.executemany('DELETE FROM eleitores WHERE rowid = ?', [(rowid,) for rowid, _ in eleitores_removidos])
+    conn.executemany('UPDATE votos SET eleitor_cpf = ? WHERE id = ?', votos_normalizados)
+    conn.executemany('UPDATE eleitores SET cpf = ? WHERE rowid = ?', eleitores_normalizados)
+
+    alterada = bool(votos_removidos or eleitores_removidos or votos_normalizados or eleitores_normalizados)
+    if alterada:
+        tabelas = {nome for (nome,) in conn.execute("SELECT name FROM sqlite_master WHERE type = 'table'")}
+        for tabela in TABELAS_APURACAO:
+            if tabela in tabelas:
+                conn.execute(f'DELETE FROM {tabela}')
+        conn.execute('UPDATE votos SET verificado = 0')
+
+    return {
+        'eleitores_normalizados': len(eleitores_normalizados),
+        'eleitores_removidos': [{'cpf': cpf} for _, cpf in eleitores_removidos],
+        'votos_normalizados': len(votos_normalizados),
+        'votos_removidos': votos_removidos,
+        'eleitores_cpf_invalido': eleitores_invalidos,
+        'votos_cpf_invalido': votos_invalidos,
+        'apuracao_zerada': alterada,
+    }
+
+
+def migrar(caminho_banco, num_particoes=1, simular=False):
+    """Migra todas as partições da urna. Com `simular`, nada é gravado. Retorna o resumo por partição."""
+    caminhos = caminhos_particoes(caminho_banco, num_particoes)
+    for caminho in caminhos:
+        if not os.path.exists(caminho):
+            raise ValueError(f"Partição '{caminho}' não encontrada")
+
+    resumo = []
+    for indice, caminho in enumerate(caminhos):
+        conn = sqlite3.connect(caminho, isolation_level=None)
+        try:
+            if num_particoes > 1:
+                registrar_particao(conn, indice, num_particoes)
+            conn.execute('BEGIN IMMEDIATE')
+            try:
+                resumo_particao = migrar_particao(conn)
+                conn.execute('ROLLBACK' if simular else 'COMMIT')
+            except Exception:
+                conn.execute('ROLLBACK')
+                raise
+        finally:
+            conn.close()
+        resumo.append(dict(resumo_particao, arquivo=caminho))
+    return resumo
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('banco', help='caminho base da urna (o DATABASE_NAME do servidor)')
+    parser.add_argument('--particoes', type=int, default=1, help='número de partições da urna')
+    parser.add_argument('--simular', action='store_true', help='mostra o que mudaria, sem gravar nada')
+    args = parser.parse_args()
+
+    inicio = time.perf_counter()
+    try:
+        particoes = migrar(args.banco, args.particoes, args.simular)
+    except (ValueError, sqlite3.Error) as e:
+        sys.exit(str(e))
+    print(json.dumps({'simulacao': args.simular, 'particoes': particoes,
+                      'segundos': round(time.perf_counter() - inicio, 2)}, ensure_ascii=False, indent=2))
+
+
+if __name__ == '__main__':
+    main()
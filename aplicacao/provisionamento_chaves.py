@@ -0,0 +1,124 @@
+# provisionamento_chaves.py
+"""
+Provisionamento em massa de chaves de eleitores, sem interface gráfica.
+
+Lê uma lista de eleitores em CSV (colunas cpf e nome), gera os pares de chaves
+em paralelo em um pool de processos e os grava em subpastas particionadas de
+'chaves/'. As chaves públicas são reunidas em um arquivo NDJSON no formato de
+/registrar_eleitores_lote e, se um servidor for informado, enviadas a ele em
+um único envio em streaming.
+
+Uma execução interrompida pode ser repetida com os mesmos argumentos: eleitores
+cuja chave pública já existe em disco não têm as chaves geradas de novo, e o
+registro no servidor retoma a partir da última linha confirmada.
+
+Uso:
+    python provisionamento_chaves.py eleitores.csv --servidor http://127.0.0.1:5000
+"""
+import argparse
+import csv
+import json
+import os
+import sys
+import time
+from concurrent.futures import ProcessPoolExecutor
+from crypto_utils import ESQUEMAS_ASSINATURA, ESQUEMA_PADRAO, caminhos_chaves_eleitor, gerar_e_salvar_chaves
+from validacao_cpf import normalizar_cpf
+from verificacao_paralela import dividir_em_lotes
+
+TAMANHO_LOTE_PROVISIONAMENTO = 256
+
+
+def provisionar_eleitor(tarefa):
+    """
+    Garante que o eleitor tenha um par de chaves em disco e retorna
+    (chave pública PEM, True se as chaves foram geradas agora).
+    """
+    cpf, pasta_chaves, esquema = tarefa
+    arquivo_publico, _ = caminhos_chaves_eleitor(cpf, pasta_chaves, particionar=True)
+    gerada = False
+    if not os.path.exists(arquivo_publico):
+        gerar_e_salvar_chaves(cpf, esquema, pasta_chaves, particionar=True)
+        gerada = True
+    with open(arquivo_publico, "r") as f:
+        return f.read(), gerada
+
+
+def ler_eleitores(caminho_csv, ao_rejeitar):
+    """Lê o CSV linha a linha, gerando (cpf normalizado, nome) dos eleitores válidos."""
+    with open(caminho_csv, newline='', encoding='utf-8') as f:
+        for numero_linha, linha in enumerate(csv.DictReader(f), 2):
+            cpf = normalizar_cpf(linha.get('cpf') or '')
+            nome = (linha.get('nome') or '').strip()
+            if cpf is None or not nome:
+                ao_rejeitar({'linha': numero_linha, 'cpf': linha.get('cpf'), 'motivo': 'CPF inválido ou nome ausente'})
+                continue
+            yield cpf, nome
+
+
+def provisionar(caminho_csv, arquivo_registro, pasta_chaves="chaves", esquema=ESQUEMA_PADRAO,
+                num_workers=None, ao_rejeitar=None):
+    """
+    Gera as chaves que faltam e escreve o arquivo NDJSON de registro na ordem
+    do CSV, de modo que execuções repetidas produzam as mesmas linhas.
+    Retorna um resumo com as contagens.
+    """
+    resumo = {'eleitores': 0, 'chaves_geradas': 0, 'chaves_existentes': 0, 'rejeitados': 0}
+
+    def rejeitar(registro):
+        resumo['rejeitados'] += 1
+        if ao_rejeitar is not None:
+            ao_rejeitar(registro)
+
+    inicio = time.perf_counter()
+    with ProcessPoolExecutor(max_workers=num_workers or os.cpu_count() or 1) as executor, \
+            open(arquivo_registro, 'w', encoding='utf-8') as saida:
+        for lote in dividir_em_lotes(ler_eleitores(caminho_csv, rejeitar), TAMANHO_LOTE_PROVISIONAMENTO):
+            tarefas = [(cpf, pasta_chaves, esquema) for cpf, _ in lote]
+            for (cpf, nome), (chave_publica_pem, gerada) in zip(lote, executor.map(provisionar_eleitor, tarefas)):
+                saida.write(json.dumps({'cpf': cpf, 'nome': nome, 'chave_publica_pem': chave_publica_pem}) + '\n')
+                resumo['chaves_geradas' if gerada else 'chaves_existentes'] += 1
+            resumo['eleitores'] += len(lote)
+            print(f"{resumo['eleitores']} eleitores provisionados "
+                  f"({resumo['eleitores'] / (time.perf_counter() - inicio):.0f}/s)", file=sys.stderr)
+    return resumo
+
+
+def registrar_no_servidor(url_servidor, arquivo_registro, id_importacao):
+    """Envia o arquivo NDJSON para /registrar_eleitores_lote em streaming."""
+    import requests
+    with open(arquivo_registro, 'rb') as f:
+        response = requests.post(f"{url_servidor.rstrip('/')}/registrar_eleitores_lote",
+                                 params={'id_importacao': id_importacao}, data=f,
+                                 headers={'Content-Type': 'application/x-ndjson'})
+    response.raise_for_status()
+    return response.json()
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('arquivo', help='CSV com as colunas cpf e nome')
+    parser.add_argument('--pasta-chaves', default='chaves')
+    parser.add_argument('--esquema', choices=ESQUEMAS_ASSINATURA, default=ESQUEMA_PADRAO)
+    parser.add_argument('--workers', type=int, help='processos geradores (padrão: número de CPUs)')
+    parser.add_argument('--registro', help='arquivo NDJSON de registro (padrão: <arquivo>.registro.jsonl)')
+    parser.add_argument('--servidor', help='URL do servidor onde as chaves públicas serão registradas')
+    args = parser.parse_args()
+
+    arquivo_registro = args.registro or args.arquivo + '.registro.jsonl'
+
+    def ao_rejeitar(registro):
+        print(f"Linha {registro['linha']} rejeitada: {registro['motivo']}", file=sys.stderr)
+
+    resumo = provisionar(args.arquivo, arquivo_registro, args.pasta_chaves, args.esquema, args.workers, ao_rejeitar)
+    resumo['arquivo_registro'] = arquivo_registro
+
+    if args.servidor:
+        resposta = registrar_no_servidor(args.servidor, arquivo_registro, os.path.abspath(arquivo_registro))
+        resumo['registro_servidor'] = {chave: valor for chave, valor in resposta.items() if chave != 'rejeitados'}
+
+    print(json.dumps(resumo, ensure_ascii=False, indent=2))
+
+
+if __name__ == '__main__':
+    main()
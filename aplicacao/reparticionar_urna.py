@@ -0,0 +1,145 @@
+# reparticionar_urna.py
+"""
+Redistribui uma urna existente em outro número de partições (arquivos SQLite).
+
+Lê os eleitores e os votos de todas as partições de origem e os grava nos
+arquivos de destino pelo hash do CPF, como o servidor faria. Os arquivos de
+origem não são alterados; os de destino não podem existir. Com --para 1, as
+partições são reunidas de volta em um único arquivo.
+
+Os votos são copiados na ordem da urna de origem e recebem novos ids. As
+apurações materializadas (incremental e checkpoints da retomável) não são
+copiadas: os votos chegam marcados como não verificados e são apurados de novo.
+
+Uso:
+    python reparticionar_urna.py votacao_database.db --de 1 --para 4
+    python reparticionar_urna.py votacao_database.db --de 4 --para 8 --destino nova_urna.db
+"""
+import argparse
+import json
+import os
+import sqlite3
+import sys
+import time
+from urna import caminhos_particoes, indice_particao, registrar_particao
+
+TAMANHO_BLOCO = 1000
+
+
+class _Gravador:
+    """Acumula as linhas de cada partição de destino e as grava em blocos."""
+
+    def __init__(self, conexoes, sql):
+        self.conexoes = conexoes
+        self.sql = sql
+        self.pendentes = [[] for _ in conexoes]
+        self.gravadas = [0] * len(conexoes)
+
+    def adicionar(self, indice, linha):
+        self.pendentes[indice].append(linha)
+        if len(self.pendentes[indice]) >= TAMANHO_BLOCO:
+            self._gravar(indice)
+
+    def _gravar(self, indice):
+        self.conexoes[indice].executemany(self.sql, self.pendentes[indice])
+        self.gravadas[indice] += len(self.pendentes[indice])
+        self.pendentes[indice] = []
+
+    def finalizar(self):
+        for indice in range(len(self.conexoes)):
+            self._gravar(indice)
+        return self.gravadas
+
+
+def reparticionar(caminho_origem, particoes_origem, caminho_destino, particoes_destino):
+    """
+    Copia a urna de origem para os arquivos de destino. Em caso de erro, os
+    arquivos de destino são apagados. Retorna um resumo com as contagens por partição.
+    """
+    # Importado aqui para que o módulo possa ser lido sem o Flask instalado
+    from servidor import criar_tabelas
+
+    origens = caminhos_particoes(caminho_origem, particoes_origem)
+    destinos = caminhos_particoes(caminho_destino, particoes_destino)
+    for caminho in origens:
+        if not os.path.exists(caminho):
+            raise ValueError(f"Partição de origem '{caminho}' não encontrada")
+    for caminho in destinos:
+        if os.path.exists(caminho):
+            raise ValueError(f"O arquivo de destino '{caminho}' já existe")
+
+    conexoes_origem = []
+    conexoes_destino = []
+    try:
+        for indice, caminho in enumerate(origens):
+            conn = sqlite3.connect(caminho)
+            conexoes_origem.append(conn)
+            if particoes_origem > 1:
+                registrar_particao(conn, indice, particoes_origem)
+
+        for indice, caminho in enumerate(destinos):
+            conn = sqlite3.connect(caminho, isolation_level=None)
+            conexoes_destino.append(conn)
+            conn.execute('PRAGMA journal_mode = WAL')
+            conn.execute('BEGIN')
+            criar_tabelas(conn)
+            if particoes_destino > 1:
+                registrar_particao(conn, indice, particoes_destino)
+
+        eleitores = _Gravador(conexoes_destino, 'INSERT INTO eleitores (cpf, nome, chave_publica_der, tipo_chave) '
+                                                'VALUES (?, ?, ?, ?)')
+        for conn in conexoes_origem:
+            for row in conn.execute('SELECT cpf, nome, chave_publica_der, tipo_chave FROM eleitores'):
+                eleitores.adicionar(indice_particao(row[0], particoes_destino), row)
+
+        votos = _Gravador(conexoes_destino, 'INSERT INTO votos (eleitor_cpf, candidato_id, mensagem_assinada, assinatura) '
+                                            'VALUES (?, ?, ?, ?)')
+        for conn in conexoes_origem:
+            for row in conn.execute('SELECT eleitor_cpf, candidato_id, mensagem_assinada, assinatura '
+                                    'FROM votos ORDER BY id'):
+                votos.adicionar(indice_particao(row[0], particoes_destino), row)
+
+        # O progresso das importações em massa fica sempre na partição 0
+        conexoes_destino[0].executemany(
+            'INSERT INTO importacao_progresso (id_importacao, ultima_linha) VALUES (?, ?)',
+            conexoes_origem[0].execute('SELECT id_importacao, ultima_linha FROM importacao_progresso'))
+
+        resumo = {'eleitores_por_particao': eleitores.finalizar(), 'votos_por_particao': votos.finalizar()}
+        for conn in conexoes_destino:
+            conn.execute('COMMIT')
+        return resumo
+    except Exception:
+        for conn in conexoes_destino:
+            conn.close()
+        conexoes_destino = []
+        for caminho in destinos:
+            for sufixo in ('', '-wal', '-shm'):
+                if os.path.exists(caminho + sufixo):
+                    os.remove(caminho + sufixo)
+        raise
+    finally:
+        for conn in conexoes_origem + conexoes_destino:
+            conn.close()
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('banco', help='caminho base da urna de origem (o DATABASE_NAME do servidor)')
+    parser.add_argument('--de', type=int, default=1, help='número de partições da urna de origem')
+    parser.add_argument('--para', type=int, required=True, help='número de partições da urna de destino')
+    parser.add_argument('--destino', help='caminho base da urna de destino (padrão: o mesmo da origem)')
+    args = parser.parse_args()
+
+    inicio = time.perf_counter()
+    try:
+        resumo = reparticionar(args.banco, args.de, args.destino or args.banco, args.para)
+    except (ValueError, sqlite3.Error) as e:
+        sys.exit(str(e))
+    resumo['arquivos'] = caminhos_particoes(args.destino or args.banco, args.para)
+    resumo['segundos'] = round(time.perf_counter() - inicio, 2)
+    print(json.dumps(resumo, ensure_ascii=False, indent=2))
+    print(f"Inicie o servidor com URNA_NUM_PARTICOES={args.para}.", file=sys.stderr)
+
+
+if __name__ == '__main__':
+    main()
@@ -1,65 +1,518 @@
 # servidor.py
+import argparse
 import sqlite3
 import json
 import base64
-from flask import Flask, request, jsonify
-from crypto_utils import verificar_assinatura
+import atexit
+import binascii
+import cProfile
+import os
+import sys
+import threading
+import time
+from contextlib import contextmanager
+from itertools import islice
+from flask import Flask, Response, g, request, jsonify, stream_with_context
+from armazenamento import executar_com_retentativa, buscar_cpfs_existentes, BancoOcupadoError
+from crypto_utils import validar_chave_publica_pem, cache_chaves, mensagem_canonica
+from verificacao_paralela import verificar_votos, iterar_itens_votos
+from importacao_eleitores import criar_tabela_progresso, importar_eleitores
+from apuracao_incremental import (criar_tabelas_apuracao, processar_votos_pendentes,
+                                  ler_apuracao, VerificadorEmSegundoPlano)
+from apuracao_retomavel import (criar_tabela_checkpoints, avancar_apuracao, ultimo_checkpoint,
+                                listar_invalidos, contar_pendentes, auditar)
+from metricas import registro, TIPO_CONTEUDO
+from urna import Urna, registrar_particao
+from aquecimento_urna import ler_urna, carregar_chaves
+from cache_apuracao import CacheApuracao
+from auditoria_invalidos import (ler_cursor, formatar_cursor, invalidos_incrementais, invalidos_checkpoints,
+                                 localizar_invalidos, paginar_localizados)
+from fila_votos import FilaVotos, FilaIndisponivelError, criar_tabela_fila, listar_segmentos, caminho_segmento
+from validacao_cpf import normalizar_cpf
+from verificacao_paralela import verificar_particoes
 
 app = Flask(__name__)
 DATABASE_NAME = 'votacao_database.db'
 
-def get_db_connection():
-    """Cria uma conexão com o banco de dados."""
-    conn = sqlite3.connect(DATABASE_NAME)
-    conn.row_factory = sqlite3.Row
-    return conn
+# Número de arquivos SQLite entre os quais eleitores e votos são distribuídos
+# pelo hash do CPF. Com 1 (padrão), a urna é o arquivo DATABASE_NAME; com K > 1,
+# são os arquivos votacao_database.particao0.db ... votacao_database.particao{K-1}.db
+# (ver urna.caminhos_particoes), cada um com o seu próprio lock de escrita. Para
+# mudar K numa urna existente, use reparticionar_urna.py.
+URNA_NUM_PARTICOES = int(os.environ.get('URNA_NUM_PARTICOES', 1))
+
+# Configuração da apuração paralela: número de processos verificadores e
+# quantidade de votos enviada a cada processo por vez.
+APURACAO_NUM_WORKERS = int(os.environ.get('APURACAO_NUM_WORKERS', os.cpu_count() or 1))
+APURACAO_TAMANHO_LOTE = int(os.environ.get('APURACAO_TAMANHO_LOTE', 500))
+
+# Modo de apuração: 'recontagem' verifica a urna inteira a cada GET /apurar;
+# 'incremental' verifica cada voto uma única vez e mantém a contagem materializada;
+# 'retomavel' apura em checkpoints encadeados por hash, continuando do último
+# checkpoint a cada GET /apurar (e após uma queda do servidor).
+# No modo incremental, a verificação ocorre no próprio /votar ou em uma thread
+# de fundo, conforme APURACAO_VERIFICAR_NA_VOTACAO.
+APURACAO_MODO = os.environ.get('APURACAO_MODO', 'recontagem')
+APURACAO_VERIFICAR_NA_VOTACAO = os.environ.get('APURACAO_VERIFICAR_NA_VOTACAO', '0') == '1'
+APURACAO_INTERVALO_VERIFICADOR = float(os.environ.get('APURACAO_INTERVALO_VERIFICADOR', 1.0))
+
+# Quantidade de votos verificados entre dois checkpoints da apuração retomável
+APURACAO_VOTOS_POR_CHECKPOINT = int(os.environ.get('APURACAO_VOTOS_POR_CHECKPOINT', 5000))
+
+# Ingestão dos votos: 'direto' grava cada voto com um commit próprio; 'fila'
+# grava o voto num log com fsync em grupo e responde quando ele está em disco,
+# e uma thread drena o log para a tabela votos em transações grandes (ver fila_votos.py)
+INGESTAO_MODO = os.environ.get('INGESTAO_MODO', 'direto')
+
+# Quantidade máxima de votos aceitos em uma única chamada de /votar_lote
+VOTAR_LOTE_TAMANHO_MAXIMO = int(os.environ.get('VOTAR_LOTE_TAMANHO_MAXIMO', 10000))
+
+# Quantas linhas rejeitadas são listadas na resposta de /registrar_eleitores_lote
+IMPORTACAO_MAX_REJEITADOS_RESPOSTA = 1000
+
+# Votos inválidos por página de /apurar/invalidos, quando o cliente não informa ?limite, e o máximo aceito
+AUDITORIA_LIMITE_PADRAO = 1000
+AUDITORIA_LIMITE_MAXIMO = 100000
+
+# Se definido, a próxima apuração é executada sob o cProfile e as estatísticas
+# são gravadas neste arquivo (legível com `python -m pstats`). Apenas uma
+# apuração é perfilada; o cProfile só enxerga o processo do servidor, então use
+# APURACAO_NUM_WORKERS=1 para incluir a verificação das assinaturas no perfil.
+APURACAO_PERFIL = os.environ.get('APURACAO_PERFIL')
+
+# Índice em memória de quem está registrado e de quem já votou, carregado em
+# init_db e atualizado a cada escrita do servidor: /votar e /votar_lote recusam
+# CPFs não registrados e votos repetidos sem consultar o SQLite. Eleitores
+# gravados direto no banco por outro processo (importacao_eleitores.py com o
+# servidor no ar) só entram no índice quando o servidor reinicia; nesse uso,
+# desligue o índice com INDICE_ADMISSAO=0.
+INDICE_ADMISSAO = os.environ.get('INDICE_ADMISSAO', '1') == '1'
+
+# Cache do resultado de GET /apurar, válido enquanto a urna não recebe eleitores
+# nem votos (ver cache_apuracao.py). As respostas levam um ETag, e uma
+# requisição com If-None-Match do ETag atual recebe 304 sem tocar no banco.
+# Como o índice de admissão, o cache só enxerga as escritas feitas por este
+# servidor: com outro processo gravando na urna, desligue com APURACAO_CACHE=0.
+APURACAO_CACHE = os.environ.get('APURACAO_CACHE', '1') == '1'
+
+# Versão do esquema da urna, gravada no PRAGMA user_version de cada partição.
+# O servidor só abre uma urna da versão atual (ou anterior ao controle de
+# versão, se as tabelas já estiverem no formato atual); ao mudar as tabelas,
+# avance a versão e escreva a migração correspondente.
+VERSAO_ESQUEMA = 1
+
+# Carrega no cache, na inicialização, as chaves públicas dos eleitores que já
+# votaram, para que a primeira apuração depois de reiniciar não desserialize
+# chave por chave. As chaves são lidas na mesma passada que monta o índice de
+# admissão e desserializadas numa thread de fundo, depois que o servidor já
+# está pronto. Só vale com APURACAO_NUM_WORKERS=1: com mais processos, cada
+# processo verificador tem o seu próprio cache, preenchido na primeira apuração.
+AQUECIMENTO_CHAVES = os.environ.get('AQUECIMENTO_CHAVES', '1') == '1'
+
+# Uma thread verificadora por partição, no modo incremental
+verificadores = []
+indice_admissao = None
+cache_apuracao = CacheApuracao()
+# Uma fila de votos por partição, no modo de ingestão 'fila'
+filas = []
+# Trabalho de apuração retomável em segundo plano (POST /apurar/trabalho)
+trabalho_apuracao = None
+trabalho_apuracao_erro = None
+_trabalho_lock = threading.Lock()
+_apuracao_retomavel_lock = threading.Lock()
+_perfil_pendente = bool(APURACAO_PERFIL)
+_perfil_lock = threading.Lock()
+
+# Métricas expostas em GET /metrics
+metrica_requisicoes = registro.contador(
+    'votacao_requisicoes_total', 'Requisições HTTP atendidas', ('endpoint', 'metodo', 'status'))
+metrica_latencia = registro.histograma(
+    'votacao_requisicao_duracao_segundos', 'Duração das requisições HTTP', ('endpoint', 'metodo'))
+metrica_fases_apuracao = registro.histograma(
+    'votacao_apuracao_fase_segundos',
+    'Tempo de cada fase da apuração (carga_chave e verificacao somadas entre os processos verificadores)',
+    ('modo', 'fase'), limites=(0.01, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0, 60.0, 300.0))
+metrica_recusas_indice = registro.contador(
+    'votacao_admissao_recusas_total', 'Votos recusados pelo índice de admissão, sem consultar o banco', ('motivo',))
+metrica_cache_apuracao = registro.contador(
+    'votacao_apuracao_cache_total',
+    'Respostas de GET /apurar por origem: nao_modificado (304), cache, compartilhado ou calculado', ('resultado',))
+metrica_inicializacao = registro.histograma(
+    'votacao_inicializacao_segundos',
+    'Tempo de cada fase da inicialização do servidor, até ficar pronto (fase total)', ('fase',),
+    limites=(0.01, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0, 60.0))
+
+
+def obter_urna():
+    """Os arquivos da urna, conforme DATABASE_NAME e URNA_NUM_PARTICOES."""
+    return Urna(DATABASE_NAME, URNA_NUM_PARTICOES)
+
+def get_db_connection(particao=0):
+    """
+    Obtém uma conexão do pool do banco de dados (em modo WAL e já configurada).
+    Ao chamar close(), a conexão volta para o pool em vez de ser fechada.
+    """
+    return obter_urna().conexao(particao)
+
+def get_db_connection_eleitor(cpf):
+    """Obtém uma conexão com a partição onde ficam o registro e o voto do eleitor."""
+    return obter_urna().conexao_eleitor(cpf)
 
 def init_db():
-    """Inicializa o banco de dados e cria as tabelas se não existirem."""
-    conn = get_db_connection()
+    """
+    Inicializa o banco de dados, conferindo a versão do esquema de uma urna
+    existente e criando as tabelas que não existirem. Retorna o tempo de cada fase.
+    Lança ValueError se a urna não puder ser aberta por esta versão do servidor.
+    """
+    tempos = {}
+    inicio = time.perf_counter()
+    for particao, caminho_banco in enumerate(obter_urna().caminhos):
+        conn = get_db_connection(particao)
+        try:
+            verificar_esquema(conn, caminho_banco)
+            criar_tabelas(conn)
+            # A versão só é gravada aqui, depois da conferência: criar_tabelas também
+            # é usado pelas migrações e pelo reparticionamento, sobre dados ainda não conferidos
+            conn.execute(f'PRAGMA user_version = {VERSAO_ESQUEMA}')
+            if URNA_NUM_PARTICOES > 1:
+                registrar_particao(conn, particao, URNA_NUM_PARTICOES)
+            conn.commit()
+        except Exception:
+            conn.rollback()
+            raise
+        finally:
+            conn.close()
+    print("Banco de dados inicializado.")
+    tempos['esquema'] = time.perf_counter() - inicio
+    # O log da fila é reaplicado antes de carregar o índice, que precisa ver esses votos
+    inicio = time.perf_counter()
+    iniciar_filas()
+    tempos['fila'] = time.perf_counter() - inicio
+    inicio = time.perf_counter()
+    carregar_urna_em_memoria()
+    tempos['aquecimento'] = time.perf_counter() - inicio
+    return tempos
+
+
+def verificar_esquema(conn, caminho_banco):
+    """
+    Confere se a partição pode ser aberta por esta versão do servidor, sem
+    alterar nada. Uma urna anterior ao controle de versão (user_version 0) é
+    aceita se as tabelas já estiverem no formato atual, e recebe a versão em init_db.
+    """
+    versao = conn.execute('PRAGMA user_version').fetchone()[0]
+    if versao > VERSAO_ESQUEMA:
+        raise ValueError(f"A urna '{caminho_banco}' tem o esquema na versão {versao}, "
+                         f"mais nova que a deste servidor ({VERSAO_ESQUEMA})")
+    if versao == VERSAO_ESQUEMA:
+        return
+    colunas_votos = {row[1] for row in conn.execute('PRAGMA table_info(votos)')}
+    colunas_eleitores = {row[1] for row in conn.execute('PRAGMA table_info(eleitores)')}
+    if ((colunas_votos and 'mensagem_assinada' not in colunas_votos)
+            or (colunas_eleitores and 'chave_publica_der' not in colunas_eleitores)):
+        raise ValueError(f"A urna '{caminho_banco}' está no formato antigo (votos em JSON e chaves PEM); "
+                         'converta-a com migracao_votos_binarios.py')
+    # Urnas anteriores à normalização guardavam o CPF como foi digitado
+    cpf_fora_da_forma = "length({0}) != 11 OR {0} GLOB '*[^0-9]*'"
+    if ((colunas_eleitores and conn.execute(
+            f"SELECT 1 FROM eleitores WHERE {cpf_fora_da_forma.format('cpf')} LIMIT 1").fetchone())
+            or (colunas_votos and conn.execute(
+                f"SELECT 1 FROM votos WHERE {cpf_fora_da_forma.format('eleitor_cpf')} LIMIT 1").fetchone())):
+        raise ValueError(f"A urna '{caminho_banco}' tem CPFs fora da forma normalizada; "
+                         'converta-a com migracao_cpf_normalizado.py')
+
+
+def iniciar_filas():
+    """No modo de ingestão 'fila', reaplica o log pendente de cada partição e inicia as filas."""
+    if INGESTAO_MODO != 'fila' or filas:
+        return
+    for particao, caminho_banco in enumerate(obter_urna().caminhos):
+        fila = FilaVotos(caminho_banco, ao_drenar=lambda conn, particao=particao: apos_receber_votos(conn, particao))
+        fila.iniciar()
+        if fila.votos_recuperados:
+            print(f"Fila da partição {particao}: {fila.votos_recuperados} votos do log aplicados à urna.")
+        filas.append(fila)
+    atexit.register(encerrar_filas)
+
+
+def encerrar_filas():
+    """Grava e drena para a urna os votos que ainda estão nas filas."""
+    for fila in filas:
+        fila.encerrar()
+
+
+def carregar_urna_em_memoria():
+    """
+    Numa única passada pela urna, monta o índice de admissão (se INDICE_ADMISSAO
+    estiver ligado) e lê as chaves a carregar no cache (ver AQUECIMENTO_CHAVES),
+    que são desserializadas numa thread de fundo.
+    """
+    global indice_admissao
+    limite_chaves = cache_chaves.capacidade if AQUECIMENTO_CHAVES and APURACAO_NUM_WORKERS <= 1 else 0
+    if not INDICE_ADMISSAO and not limite_chaves:
+        return
+    urna = obter_urna()
+    conexoes = [urna.conexao(particao) for particao in range(URNA_NUM_PARTICOES)]
+    try:
+        indice, chaves, resumo = ler_urna(conexoes, montar_indice=INDICE_ADMISSAO, limite_chaves=limite_chaves)
+    finally:
+        for conn in conexoes:
+            conn.close()
+    if INDICE_ADMISSAO:
+        indice_admissao = indice
+    print(f"Urna lida em {resumo['segundos']:.2f} s: {resumo['eleitores']} eleitores, {resumo['votos']} votos"
+          + (', índice de admissão carregado' if INDICE_ADMISSAO else '')
+          + (f", {resumo['chaves']} chaves a carregar no cache." if chaves else '.'))
+    if chaves:
+        threading.Thread(target=aquecer_cache_chaves, args=(chaves,), name='aquecimento-chaves', daemon=True).start()
+
+
+def aquecer_cache_chaves(chaves):
+    inicio = time.perf_counter()
+    carregadas = carregar_chaves(cache_chaves, chaves)
+    print(f"Cache de chaves: {carregadas} chaves carregadas em {time.perf_counter() - inicio:.2f} s.")
+
+
+def admissao_pelo_indice(eleitor_cpf):
+    """
+    'nao_registrado' ou 'ja_votou' se o índice já recusa o voto, 'registrado' se o
+    voto segue para o banco, ou None quando o índice está desligado.
+    """
+    if indice_admissao is None:
+        return None
+    admissao = indice_admissao.admissao(eleitor_cpf)
+    if admissao != 'registrado':
+        metrica_recusas_indice.incrementar(motivo=admissao)
+    return admissao
+
+
+def criar_tabelas(conn):
+    """Cria as tabelas e índices do servidor, sem confirmar a transação."""
     # Tabela para guardar eleitores e suas chaves públicas confiáveis
     # CPF é a chave primária, garantindo unicidade.
+    # A chave pública é validada no registro e guardada na forma compacta DER,
+    # junto do esquema de assinatura usado para verificar os votos do eleitor.
     conn.execute('''
         CREATE TABLE IF NOT EXISTS eleitores (
             cpf TEXT PRIMARY KEY,
             nome TEXT NOT NULL,
-            chave_publica_pem TEXT NOT NULL
+            chave_publica_der BLOB NOT NULL,
+            tipo_chave TEXT NOT NULL DEFAULT 'rsa-2048'
         )
     ''')
     # Tabela para guardar os votos brutos recebidos (a "urna lacrada")
     # A constraint UNIQUE no eleitor_id (que será o CPF) impede votos duplicados.
+    # O voto é guardado como os bytes exatos que foram assinados (a serialização
+    # canônica de voto_data) e a assinatura binária, prontos para a verificação.
     conn.execute('''
         CREATE TABLE IF NOT EXISTS votos (
             id INTEGER PRIMARY KEY AUTOINCREMENT,
             eleitor_cpf TEXT NOT NULL UNIQUE,
-            payload_voto_json TEXT NOT NULL
+            candidato_id TEXT NOT NULL,
+            mensagem_assinada BLOB NOT NULL,
+            assinatura BLOB NOT NULL,
+            verificado INTEGER NOT NULL DEFAULT 0
         )
     ''')
-    conn.commit()
-    conn.close()
-    print("Banco de dados inicializado.")
+    criar_tabelas_apuracao(conn)
+    criar_tabela_checkpoints(conn)
+    criar_tabela_progresso(conn)
+    criar_tabela_fila(conn)
+    # As buscas por CPF usam os índices da PRIMARY KEY e do UNIQUE; este índice
+    # atende a busca de votos ainda não verificados da apuração incremental.
+    conn.execute('CREATE INDEX IF NOT EXISTS idx_votos_verificado ON votos (verificado)')
+    conn.execute('CREATE INDEX IF NOT EXISTS idx_votos_candidato ON votos (candidato_id)')
+
+
+def iniciar_verificador():
+    """Inicia as threads que verificam os votos pendentes no modo incremental, uma por partição."""
+    if APURACAO_MODO != 'incremental' or APURACAO_VERIFICAR_NA_VOTACAO or verificadores:
+        return
+    for particao in range(URNA_NUM_PARTICOES):
+        verificador = VerificadorEmSegundoPlano(
+            lambda particao=particao: get_db_connection(particao),
+            intervalo=APURACAO_INTERVALO_VERIFICADOR,
+            num_workers=APURACAO_NUM_WORKERS,
+            tamanho_lote=APURACAO_TAMANHO_LOTE,
+            ao_processar=cache_apuracao.invalidar,
+        )
+        verificador.start()
+        verificadores.append(verificador)
+
+
+@app.before_request
+def iniciar_cronometro():
+    g.inicio_requisicao = time.perf_counter()
+
+
+@app.after_request
+def registrar_metricas_requisicao(response):
+    # Rotas desconhecidas são agrupadas, para não criar uma série por URL
+    endpoint = request.url_rule.rule if request.url_rule is not None else 'desconhecido'
+    metrica_requisicoes.incrementar(endpoint=endpoint, metodo=request.method, status=response.status_code)
+    inicio = g.get('inicio_requisicao')
+    if inicio is not None:
+        metrica_latencia.observar(time.perf_counter() - inicio, endpoint=endpoint, metodo=request.method)
+    return response
+
+
+@app.route('/metrics', methods=['GET'])
+def exportar_metricas():
+    """Métricas do servidor no formato de texto do Prometheus."""
+    return Response(registro.exposicao(), content_type=TIPO_CONTEUDO)
+
+
+@contextmanager
+def perfilar_apuracao():
+    """Executa o bloco sob o cProfile se APURACAO_PERFIL pediu o perfil de uma apuração."""
+    global _perfil_pendente
+    with _perfil_lock:
+        perfilar, _perfil_pendente = _perfil_pendente, False
+    if not perfilar:
+        yield
+        return
+    perfil = cProfile.Profile()
+    perfil.enable()
+    try:
+        yield
+    finally:
+        perfil.disable()
+        perfil.dump_stats(APURACAO_PERFIL)
+        print(f"Perfil da apuração gravado em '{APURACAO_PERFIL}'.")
+
+
+def registrar_fases_apuracao(modo, tempos):
+    for fase, segundos in tempos.items():
+        metrica_fases_apuracao.observar(segundos, modo=modo, fase=fase)
+
+
+@app.errorhandler(BancoOcupadoError)
+def banco_ocupado(erro):
+    """O banco continuou bloqueado após as retentativas: o cliente pode tentar de novo."""
+    return jsonify({'erro': 'Servidor ocupado, tente novamente em instantes'}), 503, {'Retry-After': '1'}
+
+
+@app.errorhandler(FilaIndisponivelError)
+def fila_indisponivel(erro):
+    """O log da fila não pôde ser gravado: nenhum voto foi confirmado."""
+    app.logger.error('Fila de votos indisponível: %s', erro)
+    return jsonify({'erro': 'Servidor indisponível para receber votos, tente novamente em instantes'}), 503, {'Retry-After': '1'}
+
+
+def preparar_voto(payload_completo):
+    """
+    Valida o payload de um voto e o converte para a forma armazenada na urna.
+    Retorna (eleitor_cpf, candidato_id, mensagem_assinada, assinatura), ou lança
+    ValueError com o motivo da rejeição.
+    """
+    if (not isinstance(payload_completo, dict) or not isinstance(payload_completo.get('voto_data'), dict)
+            or 'assinatura_b64' not in payload_completo):
+        raise ValueError('Payload do voto está incompleto')
+
+    # Usamos o CPF como o identificador do eleitor no voto. A urna guarda o CPF
+    # normalizado, mas a mensagem assinada mantém o voto_data como foi enviado.
+    voto_data = payload_completo['voto_data']
+    if not voto_data.get('eleitor_cpf'):
+        raise ValueError('CPF do eleitor não encontrado nos dados do voto')
+    eleitor_cpf = normalizar_cpf(voto_data['eleitor_cpf'])
+    if eleitor_cpf is None:
+        raise ValueError('CPF do eleitor inválido')
+    candidato_id = voto_data.get('candidato_id')
+    if not candidato_id:
+        raise ValueError('Candidato não encontrado nos dados do voto')
+    try:
+        assinatura = base64.b64decode(payload_completo['assinatura_b64'], validate=True)
+    except (binascii.Error, TypeError, ValueError):
+        raise ValueError('A assinatura não está em base64 válido')
+    return eleitor_cpf, candidato_id, mensagem_canonica(voto_data), assinatura
+
+
+def apos_receber_votos(conn, particao=0):
+    """
+    Chamado depois que votos novos foram confirmados na urna. No modo incremental,
+    verifica esses votos ou avisa o verificador de fundo da partição. Em todos os
+    modos, invalida o resultado da apuração em cache.
+    """
+    try:
+        if APURACAO_MODO != 'incremental':
+            return
+        if APURACAO_VERIFICAR_NA_VOTACAO:
+            processar_votos_pendentes(conn)
+        elif particao < len(verificadores):
+            verificadores[particao].notificar()
+    finally:
+        # Depois da verificação na votação, para que a nova versão já inclua a contagem
+        cache_apuracao.invalidar()
 
 
 @app.route('/registrar_eleitor', methods=['POST'])
 def registrar_eleitor():
     """Endpoint para registrar um novo eleitor com CPF, Nome e sua chave pública."""
-    dados = request.get_json()
+    corpo, status = registrar_eleitor_dados(request.get_json())
+    return jsonify(corpo), status
+
+
+def registrar_eleitor_dados(dados):
+    """
+    Valida e grava o registro de um eleitor. Retorna (corpo da resposta, status HTTP);
+    usado pela rota do Flask e pelo servidor assíncrono (servidor_asgi.py).
+    """
     if not dados or 'cpf' not in dados or 'nome' not in dados or 'chave_publica_pem' not in dados:
-        return jsonify({'erro': 'Dados incompletos. É necessário enviar cpf, nome e chave_publica_pem'}), 400
+        return {'erro': 'Dados incompletos. É necessário enviar cpf, nome e chave_publica_pem'}, 400
 
-    cpf = dados['cpf']
+    # O CPF é guardado só com os dígitos, para que 123.456.789-09 e 12345678909
+    # sejam o mesmo eleitor
+    cpf = normalizar_cpf(dados['cpf'])
+    if cpf is None:
+        return {'erro': 'CPF inválido'}, 400
     nome = dados['nome']
     chave_publica = dados['chave_publica_pem']
 
+    # Rejeita chaves malformadas já no registro, em vez de só na apuração
     try:
-        conn = get_db_connection()
-        conn.execute('INSERT INTO eleitores (cpf, nome, chave_publica_pem) VALUES (?, ?, ?)',
-                     (cpf, nome, chave_publica))
-        conn.commit()
-        conn.close()
-        return jsonify({'status': f'Eleitor {nome} (CPF: {cpf}) registrado com sucesso'}), 201
+        chave_publica_der, tipo_chave = validar_chave_publica_pem(chave_publica)
+    except ValueError:
+        return {'erro': 'A chave pública enviada não é uma chave PEM válida de um esquema suportado (RSA-2048, Ed25519 ou ECDSA P-256)'}, 400
+
+    conn = get_db_connection_eleitor(cpf)
+    try:
+        executar_com_retentativa(conn, lambda conn: conn.execute(
+            'INSERT INTO eleitores (cpf, nome, chave_publica_der, tipo_chave) VALUES (?, ?, ?, ?)',
+            (cpf, nome, chave_publica_der, tipo_chave)))
+        cache_chaves.invalidar(cpf)
+        cache_apuracao.invalidar()
+        if indice_admissao is not None:
+            indice_admissao.registrar(cpf)
+        return {'status': f'Eleitor {nome} (CPF: {cpf}) registrado com sucesso'}, 201
     except sqlite3.IntegrityError:
-        return jsonify({'erro': f'Eleitor com CPF {cpf} já existe'}), 409
+        if indice_admissao is not None:
+            indice_admissao.registrar(cpf)
+        return {'erro': f'Eleitor com CPF {cpf} já existe'}, 409
+    finally:
+        conn.close()
+
+
+@app.route('/registrar_eleitores_lote', methods=['POST'])
+def registrar_eleitores_lote():
+    """
+    Registra eleitores em massa a partir de um corpo NDJSON, lido linha a linha
+    sem carregar o arquivo inteiro na memória. Com ?id_importacao=..., um novo envio
+    do mesmo arquivo retoma a partir da última linha confirmada.
+    """
+    rejeitados = []
+
+    def ao_rejeitar(registro):
+        if len(rejeitados) < IMPORTACAO_MAX_REJEITADOS_RESPOSTA:
+            rejeitados.append(registro)
+
+    resumo = importar_eleitores(obter_urna(), request.stream, request.args.get('id_importacao'),
+                                ao_rejeitar=ao_rejeitar,
+                                ao_registrar=indice_admissao.registrar if indice_admissao is not None else None)
+    if resumo['registrados']:
+        cache_apuracao.invalidar()
+
+    resumo['rejeitados'] = rejeitados
+    return jsonify(resumo), 200
 
 
 @app.route('/votar', methods=['POST'])
@@ -68,86 +521,568 @@ def votar():
     Recebe um voto assinado. O payload do voto deve conter o CPF do eleitor.
     Ex: {"voto_data": {"eleitor_cpf": "123.456.789-00", "candidato_id": "..."}, "assinatura_b64": "..."}
     """
-    payload_completo = request.get_json()
-    if not payload_completo or 'voto_data' not in payload_completo or 'assinatura_b64' not in payload_completo:
-        return jsonify({'erro': 'Payload do voto está incompleto'}), 400
-
-    # Usamos o CPF como o identificador do eleitor no voto
-    eleitor_cpf = payload_completo['voto_data'].get('eleitor_cpf')
-    if not eleitor_cpf:
-        return jsonify({'erro': 'CPF do eleitor não encontrado nos dados do voto'}), 400
-    
-    conn = get_db_connection()
-    eleitor_existe = conn.execute('SELECT 1 FROM eleitores WHERE cpf = ?', (eleitor_cpf,)).fetchone()
-    if not eleitor_existe:
+    corpo, status = receber_voto(request.get_json(silent=True))
+    return jsonify(corpo), status
+
+
+def receber_voto(payload_completo):
+    """
+    Valida o voto, confere a admissão e o grava (ou o anexa à fila). Retorna
+    (corpo da resposta, status HTTP); usado pela rota do Flask e pelo servidor assíncrono.
+    """
+    try:
+        eleitor_cpf, candidato_id, mensagem_assinada, assinatura = preparar_voto(payload_completo)
+    except ValueError as e:
+        return {'erro': str(e)}, 400
+
+    voto = (eleitor_cpf, candidato_id, mensagem_assinada, assinatura)
+
+    # Recusas óbvias saem do índice em memória, sem abrir conexão com o banco
+    admissao = admissao_pelo_indice(eleitor_cpf)
+    if admissao in (None, 'registrado'):
+        if INGESTAO_MODO == 'fila':
+            [(_, status)] = receber_na_fila(obter_urna().particao(eleitor_cpf), [(0, voto)])
+            admissao = status['status']
+        else:
+            admissao = gravar_voto_direto(voto, consultar_registro=admissao is None)
+        if indice_admissao is not None and admissao in ('ok', 'ja_votou'):
+            indice_admissao.marcar_voto(eleitor_cpf)
+
+    if admissao == 'nao_registrado':
+        return {'erro': f'O CPF {eleitor_cpf} não está registrado no sistema.'}, 404
+    if admissao == 'ja_votou':
+        return {'erro': f'O eleitor de CPF {eleitor_cpf} já votou!'}, 409
+    return {'status': f'Voto do eleitor de CPF {eleitor_cpf} recebido e armazenado'}, 200
+
+
+def gravar_voto_direto(voto, consultar_registro=True):
+    """
+    Grava o voto (eleitor_cpf, candidato_id, mensagem_assinada, assinatura) com
+    um commit próprio. Retorna 'ok', 'ja_votou' ou 'nao_registrado'.
+    """
+    urna = obter_urna()
+    particao = urna.particao(voto[0])
+    conn = urna.conexao(particao)
+    try:
+        if consultar_registro and not conn.execute('SELECT 1 FROM eleitores WHERE cpf = ?', (voto[0],)).fetchone():
+            return 'nao_registrado'
+        # Armazena a mensagem assinada e a assinatura. A verificação será na apuração.
+        try:
+            executar_com_retentativa(conn, lambda conn: conn.execute(
+                'INSERT INTO votos (eleitor_cpf, candidato_id, mensagem_assinada, assinatura) VALUES (?, ?, ?, ?)',
+                voto))
+        except sqlite3.IntegrityError:
+            return 'ja_votou'
+        apos_receber_votos(conn, particao)
+        return 'ok'
+    finally:
         conn.close()
-        return jsonify({'erro': f'O CPF {eleitor_cpf} não está registrado no sistema.'}), 404
-        
+
+
+def receber_na_fila(particao, votos_particao):
+    """
+    Modo de ingestão 'fila': reserva os CPFs na fila da partição, confere na
+    urna o registro e os votos anteriores e grava os votos admitidos no log,
+    retornando quando estiverem em disco. Recebe [(posicao, voto)] e retorna
+    [(posicao, {'cpf', 'status'})] com ok, nao_registrado ou ja_votou.
+    """
+    fila = filas[particao]
+    status_particao = []
+    reservados = []
+    for posicao, voto in votos_particao:
+        # A reserva recusa também o segundo voto do mesmo CPF dentro do lote
+        if fila.reservar(voto[0]):
+            reservados.append((posicao, voto))
+        else:
+            status_particao.append((posicao, {'cpf': voto[0], 'status': 'ja_votou'}))
+    if not reservados:
+        return status_particao
+
+    # Com o CPF reservado, nenhum outro voto dele entra na urna ou no log entre a consulta e a gravação
+    cpfs = {voto[0] for _, voto in reservados}
+    conn = get_db_connection(particao)
     try:
-        # conn = get_db_connection()
-        # Armazena o payload completo. A verificação será na apuração.
-        conn.execute('INSERT INTO votos (eleitor_cpf, payload_voto_json) VALUES (?, ?)',
-                     (eleitor_cpf, json.dumps(payload_completo)))
-        conn.commit()
+        registrados = buscar_cpfs_existentes(conn, 'eleitores', 'cpf', cpfs)
+        ja_votaram = buscar_cpfs_existentes(conn, 'votos', 'eleitor_cpf', cpfs & registrados)
+    finally:
         conn.close()
-        return jsonify({'status': f'Voto do eleitor de CPF {eleitor_cpf} recebido e armazenado'}), 200
-    except sqlite3.IntegrityError:
-        return jsonify({'erro': f'O eleitor de CPF {eleitor_cpf} já votou!'}), 409
+
+    admitidos = []
+    for posicao, voto in reservados:
+        if voto[0] not in registrados:
+            status_particao.append((posicao, {'cpf': voto[0], 'status': 'nao_registrado'}))
+        elif voto[0] in ja_votaram:
+            status_particao.append((posicao, {'cpf': voto[0], 'status': 'ja_votou'}))
+        else:
+            admitidos.append((posicao, voto))
+    fila.liberar(cpfs - {voto[0] for _, voto in admitidos})
+    if admitidos:
+        try:
+            fila.anexar([voto for _, voto in admitidos])
+        except FilaIndisponivelError:
+            fila.liberar({voto[0] for _, voto in admitidos})
+            raise
+    status_particao.extend((posicao, {'cpf': voto[0], 'status': 'ok'}) for posicao, voto in admitidos)
+    return status_particao
+
+
+def ler_itens_lote():
+    """
+    Lê o corpo de /votar_lote: um array JSON ou NDJSON (um voto por linha).
+    Retorna a lista de itens, ou None se o corpo não puder ser interpretado.
+    """
+    if request.mimetype in ('application/x-ndjson', 'application/jsonl'):
+        try:
+            return [json.loads(linha) for linha in request.get_data(as_text=True).splitlines() if linha.strip()]
+        except ValueError:
+            return None
+    itens = request.get_json(silent=True)
+    return itens if isinstance(itens, list) else None
+
+
+@app.route('/votar_lote', methods=['POST'])
+def votar_lote():
+    """
+    Recebe vários votos assinados de uma vez, como array JSON ou NDJSON de itens
+    {"voto_data": {...}, "assinatura_b64": "..."}. O registro dos eleitores e os
+    votos anteriores são consultados uma vez para o lote inteiro, e todos os votos
+    aceitos são gravados em uma única transação (uma por partição, se a urna for
+    particionada) ou, no modo de ingestão 'fila', em uma única gravação no log.
+    Retorna um status por item, na ordem recebida: ok, nao_registrado, ja_votou ou invalido.
+    """
+    itens = ler_itens_lote()
+    if itens is None:
+        return jsonify({'erro': 'O lote deve ser um array JSON ou NDJSON de votos'}), 400
+    if len(itens) > VOTAR_LOTE_TAMANHO_MAXIMO:
+        return jsonify({'erro': f'O lote excede o máximo de {VOTAR_LOTE_TAMANHO_MAXIMO} votos'}), 413
+
+    status_itens = [None] * len(itens)
+    votos_preparados = []
+    for posicao, payload_completo in enumerate(itens):
+        try:
+            votos_preparados.append((posicao, preparar_voto(payload_completo)))
+        except ValueError:
+            status_itens[posicao] = {'cpf': None, 'status': 'invalido'}
+
+    # Com o índice de admissão, os votos obviamente recusados nem chegam ao banco
+    if indice_admissao is not None:
+        admitidos = []
+        for posicao, voto in votos_preparados:
+            admissao = admissao_pelo_indice(voto[0])
+            if admissao == 'registrado':
+                admitidos.append((posicao, voto))
+            else:
+                status_itens[posicao] = {'cpf': voto[0], 'status': admissao}
+        votos_preparados = admitidos
+
+    def gravar_lote(conn, votos_particao):
+        # Dentro da transação de escrita, nenhum outro voto destes CPFs pode entrar entre a checagem e o insert
+        cpfs_lote = {voto[0] for _, voto in votos_particao}
+        registrados = buscar_cpfs_existentes(conn, 'eleitores', 'cpf', cpfs_lote)
+        ja_votaram = buscar_cpfs_existentes(conn, 'votos', 'eleitor_cpf', cpfs_lote & registrados)
+
+        status_particao = []
+        novos_votos = []
+        for posicao, voto in votos_particao:
+            eleitor_cpf = voto[0]
+            if eleitor_cpf not in registrados:
+                status_particao.append((posicao, {'cpf': eleitor_cpf, 'status': 'nao_registrado'}))
+            elif eleitor_cpf in ja_votaram:
+                # Inclui o segundo voto do mesmo CPF dentro deste lote
+                status_particao.append((posicao, {'cpf': eleitor_cpf, 'status': 'ja_votou'}))
+            else:
+                ja_votaram.add(eleitor_cpf)
+                novos_votos.append(voto)
+                status_particao.append((posicao, {'cpf': eleitor_cpf, 'status': 'ok'}))
+
+        conn.executemany('INSERT INTO votos (eleitor_cpf, candidato_id, mensagem_assinada, assinatura) '
+                         'VALUES (?, ?, ?, ?)', novos_votos)
+        return status_particao, len(novos_votos)
+
+    # Numa urna particionada, cada partição recebe a sua parte do lote em uma transação própria
+    urna = obter_urna()
+    aceitos = 0
+    for particao, votos_particao in urna.agrupar(votos_preparados, lambda item: item[1][0]).items():
+        if INGESTAO_MODO == 'fila':
+            status_particao = receber_na_fila(particao, [item for _, item in votos_particao])
+            aceitos_particao = sum(1 for _, status in status_particao if status['status'] == 'ok')
+        else:
+            conn = urna.conexao(particao)
+            try:
+                status_particao, aceitos_particao = executar_com_retentativa(
+                    conn, lambda conn: gravar_lote(conn, [item for _, item in votos_particao]))
+                if aceitos_particao:
+                    apos_receber_votos(conn, particao)
+            finally:
+                conn.close()
+        for posicao, status in status_particao:
+            status_itens[posicao] = status
+            if indice_admissao is not None and status['status'] in ('ok', 'ja_votou'):
+                indice_admissao.marcar_voto(status['cpf'])
+        aceitos += aceitos_particao
+
+    return jsonify({
+        'status': f'{aceitos} de {len(itens)} voto(s) recebidos e armazenados',
+        'itens': status_itens
+    }), 200
 
 
 @app.route('/apurar', methods=['GET'])
 def apurar_votos():
     """
-    Endpoint para apurar os votos. Lê a urna, verifica cada assinatura e conta os votos.
+    Endpoint para apurar os votos. O resultado da última apuração é reaproveitado
+    enquanto a urna não muda, e um If-None-Match com o ETag atual recebe 304.
+    Com ?invalidos=0, a lista de votos inválidos é trocada pela quantidade
+    (total_votos_invalidos), para quem a lê paginada em /apurar/invalidos.
+    """
+    if apuracao_nao_modificada(request.if_none_match):
+        resposta = Response(status=304)
+        etag = cache_apuracao.etag()
+    else:
+        corpo, etag = apuracao_atual(resumida=request.args.get('invalidos') == '0')
+        resposta = app.response_class(corpo, mimetype='application/json')
+    if etag is not None:
+        # no-cache: clientes e proxies podem guardar a resposta, mas revalidam a cada uso
+        resposta.set_etag(etag)
+        resposta.cache_control.no_cache = True
+    return resposta
+
+
+def apuracao_nao_modificada(if_none_match):
+    """
+    True se o If-None-Match (um werkzeug ETags) já traz o ETag da versão atual da
+    urna. O ETag depende só da versão: o 304 sai sem consultar o banco nem o cache.
+    """
+    if APURACAO_CACHE and if_none_match.contains(cache_apuracao.etag()):
+        metrica_cache_apuracao.incrementar(resultado='nao_modificado')
+        return True
+    return False
+
+
+def apuracao_atual(resumida=False):
+    """
+    Corpo JSON da apuração na versão atual da urna e o seu ETag (None com o cache
+    desligado). Com `resumida`, o corpo traz só a quantidade de votos inválidos.
+    """
+    if not APURACAO_CACHE:
+        corpo, corpo_resumido, _ = calcular_apuracao()
+        return corpo_resumido if resumida else corpo, None
+    resultado, origem = cache_apuracao.obter(calcular_apuracao)
+    metrica_cache_apuracao.incrementar(resultado=origem)
+    return resultado.corpo_resumido if resumida else resultado.corpo, resultado.etag
+
+
+def serializar_apuracao(resultado):
     """
-    conn = get_db_connection()
-    votos_brutos = conn.execute('SELECT * FROM votos').fetchall()
-    
+    Corpo JSON de /apurar e o resumido (?invalidos=0), em que a lista de votos
+    inválidos dá lugar à quantidade, em total_votos_invalidos.
+    """
+    resumido = {chave: valor for chave, valor in resultado.items() if chave != 'votos_invalidos_detectados'}
+    resumido['total_votos_invalidos'] = len(resultado['votos_invalidos_detectados'])
+    return app.json.dumps(resultado), app.json.dumps(resumido)
+
+
+def calcular_apuracao():
+    """
+    Apura os votos e retorna os corpos JSON da resposta de /apurar, completo e
+    resumido, e, na recontagem, a lista de votos inválidos, que /apurar/invalidos
+    localiza na urna só quando é pedida.
+    No modo incremental, lê a contagem materializada; no retomável, avança a
+    partir do último checkpoint; caso contrário, faz a recontagem completa da urna.
+    """
+    if APURACAO_MODO == 'retomavel':
+        avancar_apuracao_retomavel()
+        estado = estado_apuracao_retomavel()
+        return *serializar_apuracao({
+            'status_apuracao': 'Finalizada' if estado['votos_pendentes'] == 0 else 'Parcial',
+            'resultado_final': estado['resultado_final'],
+            'votos_invalidos_detectados': estado['votos_invalidos_detectados'],
+            'votos_pendentes': estado['votos_pendentes'],
+            'checkpoints': estado['checkpoints']
+        }), None
+    if APURACAO_MODO != 'incremental':
+        resultado = recontagem()
+        return (*serializar_apuracao(resultado), resultado['votos_invalidos_detectados'])
+
+    # Numa urna particionada, as contagens materializadas de cada partição são somadas
     resultados = {}
     votos_invalidos = []
+    pendentes = 0
+    inicio = time.perf_counter()
+    for particao in range(URNA_NUM_PARTICOES):
+        conn = get_db_connection(particao)
+        try:
+            resultados_particao, invalidos_particao, pendentes_particao = ler_apuracao(conn)
+        finally:
+            conn.close()
+        for candidato_id, quantidade in resultados_particao.items():
+            resultados[candidato_id] = resultados.get(candidato_id, 0) + quantidade
+        votos_invalidos.extend(invalidos_particao)
+        pendentes += pendentes_particao
+    registrar_fases_apuracao('incremental', {'leitura': time.perf_counter() - inicio})
 
-    for voto_row in votos_brutos:
-        payload_completo = json.loads(voto_row['payload_voto_json'])
-        
-        voto_data = payload_completo['voto_data']
-        assinatura_b64 = payload_completo['assinatura_b64']
-        eleitor_cpf = voto_data['eleitor_cpf']
-        candidato_id = voto_data['candidato_id']
-
-        # Buscar os dados do eleitor (incluindo a chave pública) no registro confiável
-        eleitor_registrado = conn.execute('SELECT nome, chave_publica_pem FROM eleitores WHERE cpf = ?', (eleitor_cpf,)).fetchone()
-        
-        if not eleitor_registrado:
-            votos_invalidos.append({'cpf': eleitor_cpf, 'nome': 'Desconhecido', 'motivo': 'Eleitor não registrado'})
-            continue
+    return *serializar_apuracao({
+        'status_apuracao': 'Finalizada' if pendentes == 0 else 'Parcial',
+        'resultado_final': resultados,
+        'votos_invalidos_detectados': votos_invalidos,
+        'votos_pendentes': pendentes
+    }), None
 
-        nome_eleitor = eleitor_registrado['nome']
-        chave_publica_pem = eleitor_registrado['chave_publica_pem']
-        assinatura_bytes = base64.b64decode(assinatura_b64)
 
-        # Verificar a assinatura
-        assinatura_valida = verificar_assinatura(assinatura_bytes, voto_data, chave_publica_pem)
+@app.route('/apurar/invalidos', methods=['GET'])
+def listar_votos_invalidos():
+    """
+    Votos inválidos da apuração em NDJSON, um por linha e na ordem da urna, lidos
+    e enviados aos poucos. ?motivo=... filtra pelo motivo exato ('Assinatura
+    inválida', 'Eleitor não registrado'); ?limite=N limita a página; ?cursor=...
+    continua depois do registro com esse cursor. Cada linha traz o seu cursor, e
+    uma página com menos de `limite` linhas é a última.
+    Nos modos incremental e retomável, lista o que já foi apurado; na recontagem,
+    o resultado da última recontagem (feita agora, se a urna mudou desde então),
+    o que exige o cache da apuração: sem ele, a resposta é 409.
+    """
+    try:
+        particao_inicial, id_inicial = ler_cursor(request.args.get('cursor'))
+    except ValueError as e:
+        return jsonify({'erro': str(e)}), 400
+    limite = request.args.get('limite', AUDITORIA_LIMITE_PADRAO, type=int)
+    if not 1 <= limite <= AUDITORIA_LIMITE_MAXIMO:
+        return jsonify({'erro': f'O limite deve estar entre 1 e {AUDITORIA_LIMITE_MAXIMO}'}), 400
+    motivo = request.args.get('motivo')
 
-        # Contabilizar ou descartar
-        if assinatura_valida:
-            resultados[candidato_id] = resultados.get(candidato_id, 0) + 1
-        else:
-            votos_invalidos.append({'cpf': eleitor_cpf, 'nome': nome_eleitor, 'motivo': 'Assinatura inválida'})
+    if APURACAO_MODO in ('incremental', 'retomavel'):
+        ler_particao = invalidos_incrementais if APURACAO_MODO == 'incremental' else invalidos_checkpoints
 
-    conn.close()
+        def registros():
+            for particao in range(particao_inicial, URNA_NUM_PARTICOES):
+                conn = get_db_connection(particao)
+                try:
+                    depois_de_id = id_inicial if particao == particao_inicial else 0
+                    for voto_id, registro in ler_particao(conn, depois_de_id, motivo):
+                        yield particao, voto_id, registro
+                finally:
+                    conn.close()
+    else:
+        # A recontagem não grava os inválidos: a lista vem do resultado em cache da versão
+        # atual da urna. Sem o cache, cada página refaria a recontagem inteira.
+        if not APURACAO_CACHE:
+            return jsonify({'erro': 'Na recontagem, a auditoria dos votos inválidos precisa do cache da apuração '
+                                    '(APURACAO_CACHE=1); use os modos incremental ou retomavel para lê-los da urna'}), 409
+        localizados = cache_apuracao.obter(calcular_apuracao)[0].derivado(
+            lambda votos_invalidos: localizar_invalidos(obter_urna(), votos_invalidos))
 
-    return jsonify({
+        def registros():
+            return paginar_localizados(localizados, particao_inicial, id_inicial, motivo)
+
+    def gerar():
+        for particao, voto_id, registro in islice(registros(), limite):
+            yield json.dumps(dict(registro, cursor=formatar_cursor(particao, voto_id),
+                                  particao=particao, voto_id=voto_id), ensure_ascii=False) + '\n'
+
+    return Response(stream_with_context(gerar()), mimetype='application/x-ndjson')
+
+
+@app.route('/apurar/recontagem', methods=['GET'])
+def recontar_votos():
+    """
+    Endpoint para a recontagem completa, usado em auditorias. Lê a urna, verifica
+    cada assinatura e conta os votos, sempre, sem passar pelo cache de /apurar.
+    """
+    return jsonify(recontagem()), 200
+
+
+def recontagem():
+    """Verifica todas as assinaturas da urna e retorna o resultado da recontagem."""
+    # Verificar as assinaturas em lotes distribuídos entre os processos e contabilizar
+    # A consulta unida traz a chave pública junto de cada voto, sem uma consulta por eleitor
+    tempos = {}
+    with perfilar_apuracao():
+        if URNA_NUM_PARTICOES > 1:
+            # Cada processo verificador lê os votos direto dos arquivos das partições
+            resultados, votos_invalidos = verificar_particoes(
+                obter_urna().caminhos,
+                num_workers=APURACAO_NUM_WORKERS,
+                tamanho_lote=APURACAO_TAMANHO_LOTE,
+                tempos=tempos,
+            )
+        else:
+            conn = get_db_connection()
+            try:
+                resultados, votos_invalidos = verificar_votos(
+                    iterar_itens_votos(conn, tempos),
+                    num_workers=APURACAO_NUM_WORKERS,
+                    tamanho_lote=APURACAO_TAMANHO_LOTE,
+                    tempos=tempos,
+                )
+            finally:
+                conn.close()
+    registrar_fases_apuracao('recontagem', tempos)
+
+    return {
         'status_apuracao': 'Finalizada',
         'resultado_final': resultados,
         'votos_invalidos_detectados': votos_invalidos
-    }), 200
+    }
+
+
+def avancar_apuracao_retomavel():
+    """Leva a apuração retomável de cada partição até o fim da urna, um trabalho por vez."""
+    with _apuracao_retomavel_lock:
+        inicio = time.perf_counter()
+        for particao in range(URNA_NUM_PARTICOES):
+            conn = get_db_connection(particao)
+            try:
+                avancar_apuracao(conn, APURACAO_NUM_WORKERS, APURACAO_TAMANHO_LOTE, APURACAO_VOTOS_POR_CHECKPOINT)
+            finally:
+                conn.close()
+        registrar_fases_apuracao('retomavel', {'verificacao': time.perf_counter() - inicio})
+
+
+def estado_apuracao_retomavel():
+    """Resultado do último checkpoint de cada partição, somado, e o que falta apurar."""
+    resultados = {}
+    votos_invalidos = []
+    pendentes = 0
+    checkpoints = []
+    for particao in range(URNA_NUM_PARTICOES):
+        conn = get_db_connection(particao)
+        try:
+            checkpoint = ultimo_checkpoint(conn)
+            # O voto_id dos checkpoints fica de fora: /apurar traz os inválidos no mesmo
+            # formato em todos os modos, e /apurar/invalidos já o lê dos checkpoints
+            votos_invalidos.extend({'cpf': invalido['cpf'], 'nome': invalido['nome'], 'motivo': invalido['motivo']}
+                                   for invalido in listar_invalidos(conn))
+            pendentes_particao = contar_pendentes(conn, checkpoint)
+        finally:
+            conn.close()
+        pendentes += pendentes_particao
+        if checkpoint is None:
+            checkpoints.append({'particao': particao, 'checkpoint': None, 'votos_pendentes': pendentes_particao})
+            continue
+        for candidato_id, quantidade in checkpoint['contagem'].items():
+            resultados[candidato_id] = resultados.get(candidato_id, 0) + quantidade
+        checkpoints.append({
+            'particao': particao,
+            'checkpoint': checkpoint['id'],
+            'ultimo_voto_id': checkpoint['ultimo_voto_id'],
+            'votos_apurados': checkpoint['votos_apurados'],
+            'hash_cadeia': checkpoint['hash_cadeia'].hex(),
+            'votos_pendentes': pendentes_particao,
+        })
+    return {
+        'resultado_final': resultados,
+        'votos_invalidos_detectados': votos_invalidos,
+        'votos_pendentes': pendentes,
+        'checkpoints': checkpoints,
+    }
+
+
+def executar_trabalho_apuracao():
+    global trabalho_apuracao_erro
+    try:
+        avancar_apuracao_retomavel()
+        trabalho_apuracao_erro = None
+    except Exception as e:
+        trabalho_apuracao_erro = str(e)
+        print(f"Erro no trabalho de apuração: {e}")
+
+
+@app.route('/apurar/trabalho', methods=['POST'])
+def iniciar_trabalho_apuracao():
+    """
+    Inicia (ou retoma, a partir do último checkpoint) a apuração retomável em
+    segundo plano. Se um trabalho já estiver em execução, apenas informa o estado.
+    """
+    global trabalho_apuracao
+    with _trabalho_lock:
+        if trabalho_apuracao is None or not trabalho_apuracao.is_alive():
+            trabalho_apuracao = threading.Thread(target=executar_trabalho_apuracao,
+                                                 name='apuracao-retomavel', daemon=True)
+            trabalho_apuracao.start()
+    return consultar_trabalho_apuracao()[0], 202
+
+
+@app.route('/apurar/trabalho', methods=['GET'])
+def consultar_trabalho_apuracao():
+    """Estado da apuração retomável: último checkpoint de cada partição e votos ainda pendentes."""
+    estado = estado_apuracao_retomavel()
+    estado['em_execucao'] = trabalho_apuracao is not None and trabalho_apuracao.is_alive()
+    estado['erro'] = trabalho_apuracao_erro
+    return jsonify(estado), 200
+
+
+@app.route('/apurar/auditoria', methods=['GET'])
+def auditar_apuracao():
+    """
+    Confere os checkpoints da apuração retomável contra a urna: cadeia de hash e
+    contagem, sem verificar assinaturas. Com ?amostra=N, verifica de novo N votos
+    sorteados por partição e compara com o veredicto gravado.
+    """
+    amostra = request.args.get('amostra', 0, type=int)
+    particoes = []
+    for particao in range(URNA_NUM_PARTICOES):
+        conn = get_db_connection(particao)
+        try:
+            relatorio = auditar(conn, amostra)
+        finally:
+            conn.close()
+        relatorio['particao'] = particao
+        particoes.append(relatorio)
+    confere = all(relatorio['cadeia_confere'] is not False and relatorio['contagem_confere'] is not False
+                  and not relatorio.get('amostra', {}).get('divergencias') for relatorio in particoes)
+    return jsonify({'confere': confere, 'particoes': particoes}), 200
+
+
+def remover_urna():
+    """Apaga os arquivos da urna (partições, arquivos do WAL e log da fila), para começar uma votação do zero."""
+    for caminho_banco in obter_urna().caminhos:
+        if os.path.exists(caminho_banco):
+            os.remove(caminho_banco)
+            print(f"Banco de dados antigo '{caminho_banco}' removido.")
+        # Arquivos auxiliares do modo WAL
+        for sufixo in ('-wal', '-shm'):
+            if os.path.exists(caminho_banco + sufixo):
+                os.remove(caminho_banco + sufixo)
+        # Log da fila de votos, que seria reaplicado à urna nova
+        for numero in listar_segmentos(caminho_banco):
+            os.remove(caminho_segmento(caminho_banco, numero))
+
+
+def inicializar():
+    """
+    Deixa o servidor pronto para atender: inicializa a urna (init_db) e inicia o
+    verificador. Informa o tempo até ficar pronto, também em GET /metrics.
+    """
+    inicio = time.perf_counter()
+    tempos = init_db()
+    iniciar_verificador()
+    tempos['total'] = time.perf_counter() - inicio
+    for fase, segundos in tempos.items():
+        metrica_inicializacao.observar(segundos, fase=fase)
+    print(f"Servidor pronto em {tempos['total']:.2f} s ("
+          + ', '.join(f'{fase} {segundos:.2f} s' for fase, segundos in tempos.items() if fase != 'total') + ').')
+
+
+def main():
+    parser = argparse.ArgumentParser(
+        description='Servidor de votação (Flask). Sem --producao, a urna é apagada e a votação começa do zero.')
+    parser.add_argument('--producao', action='store_true',
+                        help='mantém a urna existente (depois de uma queda, por exemplo), conferindo a versão do '
+                             'esquema, e roda sem o modo de depuração do Flask')
+    parser.add_argument('--host', default='0.0.0.0')
+    parser.add_argument('--porta', type=int, default=5000)
+    args = parser.parse_args()
+
+    if not args.producao:
+        remover_urna()
+    try:
+        inicializar()
+    except ValueError as e:
+        sys.exit(str(e))
+    # Sem o reloader: o processo filho executaria main() de novo, apagando a urna
+    # e iniciando uma segunda fila e um segundo verificador sobre os mesmos arquivos
+    app.run(host=args.host, port=args.porta, debug=not args.producao, use_reloader=False)
 
 
 if __name__ == '__main__':
-    import os
-    if os.path.exists(DATABASE_NAME):
-        os.remove(DATABASE_NAME)
-        print(f"Banco de dados antigo '{DATABASE_NAME}' removido.")
-        
-    init_db()
-    app.run(host='0.0.0.0', port=5000, debug=True)
\ No newline at end of file
+    main()
@@ -0,0 +1,226 @@
+# servidor_asgi.py
+"""
+Modo assíncrono (ASGI) do servidor de votação, alternativo ao Flask (WSGI) de
+servidor.py, que continua disponível.
+
+Serve /registrar_eleitor, /votar e /apurar (e /metrics) com Starlette sob o
+uvicorn, usando a mesma lógica, urna, filas, índice e cache de servidor.py. Uma
+conexão aberta é só uma corrotina no laço de eventos, e não uma thread, então
+milhares de eleitores podem ficar conectados ao mesmo tempo. O laço de eventos
+apenas lê e responde as requisições: o acesso ao SQLite, a validação das chaves
+e a apuração (que verifica as assinaturas no pool de processos) rodam em
+executores de threads de tamanho fixo.
+
+Cada executor aceita no máximo `threads + fila` tarefas. Quando a fila enche, a
+requisição recebe 503 com Retry-After na hora, em vez de se acumular na memória
+até estourar os tempos limite; o cliente_lote.py já repete esses 503 com espera.
+O uvicorn também recusa com 503 as conexões acima de --limite-conexoes.
+
+Medido numa máquina de 1 CPU (com o cliente de carga na mesma CPU), 2000
+eleitores ed25519 por HTTP, c = clientes simultâneos:
+
+    servidor  c   registrar req/s (p99)  votar req/s (p99)  apurar condicional
+    flask     16  407 (77 ms)            425 (75 ms)        486 req/s
+    flask     64  320 (538 ms)           349 (472 ms)       359 req/s
+    asgi      16  492 (59 ms)            441 (62 ms)        618 req/s
+    asgi      64  435 (197 ms)           460 (206 ms)       598 req/s
+
+Com 2000 conexões ociosas abertas pela metade, o Flask ficou com 2001 threads
+e 109 MB de RSS, e o ASGI com 2 threads e 70 MB; o /votar de um cliente ativo
+teve p50 de 3,4 ms no Flask e 1,9 ms no ASGI. Com ASGI_THREADS_BANCO=1,
+ASGI_FILA_BANCO=2 e 48 clientes simultâneos, 261 dos 300 registros foram
+recusados com 503 e os demais foram gravados.
+
+Para reproduzir, a partir da raiz do repositório (--servidor flask ou asgi,
+--concorrencia 16 ou 64):
+    python -m benchmarks.carga --eleitores 2000 --esquema ed25519 --alvo http --servidor asgi --concorrencia 16
+
+Requer: pip install starlette uvicorn
+
+Uso:
+    python servidor_asgi.py [--producao] [--host 0.0.0.0] [--porta 5000] [--limite-conexoes 10000]
+    uvicorn servidor_asgi:app --port 5000      (mantém a urna existente, como --producao)
+"""
+import argparse
+import asyncio
+import contextlib
+import os
+import time
+from concurrent.futures import ThreadPoolExecutor
+from starlette.applications import Starlette
+from starlette.responses import Response
+from starlette.routing import Route
+from werkzeug.http import parse_etags
+import servidor
+from armazenamento import BancoOcupadoError
+from fila_votos import FilaIndisponivelError
+from metricas import registro, TIPO_CONTEUDO
+
+# Threads que acessam o SQLite (registro e votos) e tarefas que podem esperar
+# por uma delas. No modo de ingestão 'fila', cada thread espera o fsync do seu
+# voto, então mais threads formam grupos maiores por fsync.
+ASGI_THREADS_BANCO = int(os.environ.get('ASGI_THREADS_BANCO', 16))
+ASGI_FILA_BANCO = int(os.environ.get('ASGI_FILA_BANCO', 2048))
+
+# Threads da apuração, separadas para que uma recontagem não ocupe as threads dos votos
+ASGI_THREADS_APURACAO = int(os.environ.get('ASGI_THREADS_APURACAO', 2))
+ASGI_FILA_APURACAO = int(os.environ.get('ASGI_FILA_APURACAO', 256))
+
+# Conexões simultâneas aceitas pelo uvicorn antes de responder 503
+ASGI_LIMITE_CONEXOES = int(os.environ.get('ASGI_LIMITE_CONEXOES', 10000))
+
+metrica_recusas_executor = registro.contador(
+    'votacao_asgi_recusas_total', 'Requisições recusadas com 503 porque a fila do executor estava cheia', ('executor',))
+
+
+class ExecutorSobrecarregadoError(Exception):
+    """A fila do executor está cheia: a requisição é recusada em vez de esperar."""
+
+
+class ExecutorLimitado:
+    """
+    Executor de threads com um limite de tarefas pendentes (em execução ou na
+    fila). O contador só é alterado no laço de eventos, então dispensa lock.
+    """
+
+    def __init__(self, nome, threads, fila):
+        self.nome = nome
+        self.limite = threads + fila
+        self.pendentes = 0
+        self._executor = ThreadPoolExecutor(max_workers=threads, thread_name_prefix=f'asgi-{nome}')
+
+    async def executar(self, funcao, *args):
+        if self.pendentes >= self.limite:
+            metrica_recusas_executor.incrementar(executor=self.nome)
+            raise ExecutorSobrecarregadoError(self.nome)
+        loop = asyncio.get_running_loop()
+        futuro = self._executor.submit(funcao, *args)
+        self.pendentes += 1
+        # A tarefa só deixa de contar quando a thread termina ou quando é cancelada
+        # ainda na fila: se o cliente desconecta, o await é cancelado, mas a thread
+        # continua ocupada com ela
+        futuro.add_done_callback(lambda _: loop.call_soon_threadsafe(self._concluir))
+        return await asyncio.wrap_future(futuro)
+
+    def _concluir(self):
+        self.pendentes -= 1
+
+    def encerrar(self):
+        self._executor.shutdown(wait=True)
+
+
+executor_banco = ExecutorLimitado('banco', ASGI_THREADS_BANCO, ASGI_FILA_BANCO)
+executor_apuracao = ExecutorLimitado('apuracao', ASGI_THREADS_APURACAO, ASGI_FILA_APURACAO)
+
+
+def resposta_json(corpo, status=200, cabecalhos=None):
+    # Mesma serialização das respostas do Flask
+    return Response(servidor.app.json.dumps(corpo), status_code=status, headers=cabecalhos,
+                    media_type='application/json')
+
+
+def servidor_ocupado():
+    return resposta_json({'erro': 'Servidor ocupado, tente novamente em instantes'}, 503, {'Retry-After': '1'})
+
+
+def medida(endpoint):
+    """Registra contagem e latência da rota nas mesmas métricas do servidor Flask."""
+    def decorar(rota):
+        async def medir(request):
+            inicio = time.perf_counter()
+            resposta = await rota(request)
+            servidor.metrica_requisicoes.incrementar(endpoint=endpoint, metodo=request.method,
+                                                     status=resposta.status_code)
+            servidor.metrica_latencia.observar(time.perf_counter() - inicio, endpoint=endpoint, metodo=request.method)
+            return resposta
+        return medir
+    return decorar
+
+
+async def ler_json(request):
+    """O corpo da requisição como JSON, ou None se não for JSON válido."""
+    try:
+        return await request.json()
+    except ValueError:
+        return None
+
+
+async def executar_no_banco(funcao, *args):
+    """Executa `funcao` no executor do banco e devolve a resposta JSON, ou 503 se não houver vaga."""
+    try:
+        corpo, status = await executor_banco.executar(funcao, *args)
+    except (ExecutorSobrecarregadoError, BancoOcupadoError):
+        return servidor_ocupado()
+    except FilaIndisponivelError as e:
+        print(f'Fila de votos indisponível: {e}')
+        return resposta_json({'erro': 'Servidor indisponível para receber votos, tente novamente em instantes'},
+                             503, {'Retry-After': '1'})
+    return resposta_json(corpo, status)
+
+
+@medida('/registrar_eleitor')
+async def registrar_eleitor(request):
+    return await executar_no_banco(servidor.registrar_eleitor_dados, await ler_json(request))
+
+
+@medida('/votar')
+async def votar(request):
+    return await executar_no_banco(servidor.receber_voto, await ler_json(request))
+
+
+@medida('/apurar')
+async def apurar(request):
+    # O 304 só compara o ETag com a versão da urna, e sai direto do laço de eventos
+    if servidor.apuracao_nao_modificada(parse_etags(request.headers.get('if-none-match'))):
+        return Response(status_code=304, headers={'ETag': f'"{servidor.cache_apuracao.etag()}"',
+                                                  'Cache-Control': 'no-cache'})
+    try:
+        corpo, etag = await executor_apuracao.executar(servidor.apuracao_atual,
+                                                       request.query_params.get('invalidos') == '0')
+    except (ExecutorSobrecarregadoError, BancoOcupadoError):
+        return servidor_ocupado()
+    cabecalhos = {'ETag': f'"{etag}"', 'Cache-Control': 'no-cache'} if etag is not None else None
+    return Response(corpo, headers=cabecalhos, media_type='application/json')
+
+
+async def exportar_metricas(request):
+    return Response(registro.exposicao(), headers={'Content-Type': TIPO_CONTEUDO})
+
+
+@contextlib.asynccontextmanager
+async def ciclo_de_vida(app):
+    servidor.inicializar()
+    yield
+    executor_banco.encerrar()
+    executor_apuracao.encerrar()
+    servidor.encerrar_filas()
+
+
+app = Starlette(routes=[
+    Route('/registrar_eleitor', registrar_eleitor, methods=['POST']),
+    Route('/votar', votar, methods=['POST']),
+    Route('/apurar', apurar, methods=['GET']),
+    Route('/metrics', exportar_metricas, methods=['GET']),
+], lifespan=ciclo_de_vida)
+
+
+def main():
+    import uvicorn
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--host', default='0.0.0.0')
+    parser.add_argument('--porta', type=int, default=5000)
+    parser.add_argument('--producao', action='store_true',
+                        help='mantém a urna existente, conferindo a versão do esquema (ver servidor.py)')
+    parser.add_argument('--limite-conexoes', type=int, default=ASGI_LIMITE_CONEXOES,
+                        help='conexões simultâneas antes de responder 503')
+    args = parser.parse_args()
+
+    # Como em `python servidor.py`, sem --producao a urna começa vazia
+    if not args.producao:
+        servidor.remover_urna()
+    uvicorn.run(app, host=args.host, port=args.porta, limit_concurrency=args.limite_conexoes,
+                backlog=args.limite_conexoes, log_level='warning')
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,248 @@
+# snapshot_urna.py
+"""
+Exporta os votos da urna, unidos às chaves públicas dos eleitores, para um
+arquivo de snapshot de layout fixo, lido pela apuração offline
+(apuracao_offline.py) sem SQLite e sem competir com o servidor.
+
+Layout do arquivo (inteiros little-endian):
+
+    cabeçalho    CABECALHO, no início do arquivo, ocupando TAMANHO_CABECALHO bytes
+    tabela       um REGISTRO por voto, na ordem da urna (partição, depois id)
+    dados        os campos de cada voto, em sequência: cpf, candidato, nome,
+                 mensagem assinada, assinatura e chave pública DER
+    metadados    JSON com a origem, os votos por partição e os tipos de chave
+    digest       SHA-256 de tudo o que vem antes, nos últimos 32 bytes
+
+Cada registro guarda a posição dos campos do voto na área de dados e o tamanho
+de cada um, de modo que o leitor chega a qualquer voto sem percorrer os
+anteriores e lê os campos como fatias do arquivo mapeado em memória, sem cópia.
+
+O digest também é impresso pela exportação: publicado junto do snapshot, ele
+permite à apuração offline recusar um arquivo alterado depois de exportado
+(o digest gravado no próprio arquivo só detecta corrupção).
+
+Cada partição é lida dentro de uma única transação de leitura, então o
+snapshot é consistente mesmo com o servidor recebendo votos.
+
+Uso:
+    python snapshot_urna.py votacao_database.db urna.snapshot [--particoes 4]
+"""
+import argparse
+import hashlib
+import json
+import mmap
+import os
+import sqlite3
+import struct
+import sys
+import time
+from urna import caminhos_particoes
+from verificacao_paralela import CONSULTA_VOTOS_COM_ELEITORES
+
+ASSINATURA_ARQUIVO = b'URNASNP1'
+VERSAO_FORMATO = 1
+
+# assinatura do arquivo, versão, votos, início da tabela, início dos dados, início e tamanho dos metadados
+CABECALHO = struct.Struct('<8sI4xQQQQQ')
+TAMANHO_CABECALHO = 64
+
+# voto_id, posição dos campos na área de dados, partição, tamanho da mensagem,
+# do candidato, do nome, da assinatura, da chave e do CPF, e o tipo de chave
+# (índice em metadados['tipos_chave'], ou SEM_ELEITOR se o eleitor não está registrado)
+REGISTRO = struct.Struct('<QQIIHHHHBB2x')
+SEM_ELEITOR = 255
+
+TAMANHO_DIGEST = 32
+
+# Registros acumulados antes de serem gravados na tabela
+REGISTROS_POR_GRAVACAO = 10000
+
+# Bytes lidos por vez no cálculo do digest da exportação
+TAMANHO_BLOCO_DIGEST = 1 << 20
+
+
+class SnapshotInvalidoError(Exception):
+    """O arquivo não é um snapshot da urna, ou está truncado ou corrompido."""
+
+
+def exportar(caminho_banco, caminho_snapshot, num_particoes=1):
+    """
+    Grava o snapshot de todas as partições da urna em `caminho_snapshot`, de forma
+    atômica (um arquivo temporário renomeado no fim). Retorna o resumo da exportação.
+    """
+    inicio = time.perf_counter()
+    caminhos = caminhos_particoes(caminho_banco, num_particoes)
+    for caminho in caminhos:
+        if not os.path.exists(caminho):
+            raise ValueError(f"Partição '{caminho}' não encontrada")
+
+    conexoes = []
+    try:
+        # As transações de leitura ficam abertas até o fim: a contagem e os votos
+        # exportados vêm do mesmo estado de cada partição
+        for caminho in caminhos:
+            conn = sqlite3.connect(f'file:{caminho}?mode=ro', uri=True, isolation_level=None)
+            conn.row_factory = sqlite3.Row
+            conn.execute('BEGIN')
+            conexoes.append(conn)
+        votos_por_particao = [conn.execute('SELECT COUNT(*) FROM votos').fetchone()[0] for conn in conexoes]
+
+        caminho_temporario = caminho_snapshot + '.tmp'
+        with open(caminho_temporario, 'w+b') as f:
+            digest = _gravar(f, conexoes, sum(votos_por_particao), {
+                'origem': os.path.abspath(caminho_banco),
+                'num_particoes': num_particoes,
+                'votos_por_particao': votos_por_particao,
+                'exportado_em': time.time(),
+            })
+            f.flush()
+            os.fsync(f.fileno())
+            tamanho = f.tell()
+        os.replace(caminho_temporario, caminho_snapshot)
+    finally:
+        for conn in conexoes:
+            conn.close()
+
+    return {
+        'arquivo': caminho_snapshot,
+        'votos': sum(votos_por_particao),
+        'votos_por_particao': votos_por_particao,
+        'bytes': tamanho,
+        'sha256': digest,
+        'segundos': round(time.perf_counter() - inicio, 2),
+    }
+
+
+def _gravar(f, conexoes, num_votos, metadados):
+    """Grava cabeçalho, tabela, dados, metadados e digest no arquivo aberto. Retorna o digest em hexadecimal."""
+    inicio_tabela = TAMANHO_CABECALHO
+    inicio_dados = inicio_tabela + num_votos * REGISTRO.size
+    tipos_chave = []
+    tabela = bytearray()
+    posicao_tabela = inicio_tabela
+    posicao_dados = 0
+    exportados = 0
+
+    f.seek(inicio_dados)
+    for particao, conn in enumerate(conexoes):
+        for row in conn.execute(CONSULTA_VOTOS_COM_ELEITORES + ' ORDER BY v.id'):
+            cpf = row['eleitor_cpf'].encode('utf-8')
+            candidato = row['candidato_id'].encode('utf-8')
+            if row['chave_publica_der'] is None:
+                nome, chave, tipo = b'', b'', SEM_ELEITOR
+            else:
+                nome, chave = row['nome'].encode('utf-8'), row['chave_publica_der']
+                if row['tipo_chave'] not in tipos_chave:
+                    tipos_chave.append(row['tipo_chave'])
+                tipo = tipos_chave.index(row['tipo_chave'])
+            mensagem, assinatura = row['mensagem_assinada'], row['assinatura']
+            try:
+                tabela += REGISTRO.pack(row['id'], posicao_dados, particao, len(mensagem), len(candidato),
+                                        len(nome), len(assinatura), len(chave), len(cpf), tipo)
+            except struct.error:
+                raise ValueError(f"O voto {row['id']} da partição {particao} tem um campo grande demais "
+                                 'para o formato do snapshot')
+            for campo in (cpf, candidato, nome, mensagem, assinatura, chave):
+                f.write(campo)
+                posicao_dados += len(campo)
+            exportados += 1
+            if len(tabela) >= REGISTROS_POR_GRAVACAO * REGISTRO.size:
+                os.pwrite(f.fileno(), tabela, posicao_tabela)
+                posicao_tabela += len(tabela)
+                tabela = bytearray()
+    if exportados != num_votos:
+        raise RuntimeError('A quantidade de votos mudou durante a exportação')
+
+    metadados = json.dumps(dict(metadados, tipos_chave=tipos_chave), ensure_ascii=False).encode('utf-8')
+    inicio_metadados = inicio_dados + posicao_dados
+    f.write(metadados)
+    f.flush()
+    os.pwrite(f.fileno(), tabela, posicao_tabela)
+    cabecalho = CABECALHO.pack(ASSINATURA_ARQUIVO, VERSAO_FORMATO, num_votos, inicio_tabela, inicio_dados,
+                               inicio_metadados, len(metadados))
+    os.pwrite(f.fileno(), cabecalho.ljust(TAMANHO_CABECALHO, b'\0'), 0)
+
+    f.seek(0)
+    sha256 = hashlib.sha256()
+    for bloco in iter(lambda: f.read(TAMANHO_BLOCO_DIGEST), b''):
+        sha256.update(bloco)
+    digest = sha256.digest()
+    f.seek(0, os.SEEK_END)
+    f.write(digest)
+    return digest.hex()
+
+
+class Snapshot:
+    """Um snapshot da urna mapeado em memória, somente para leitura."""
+
+    def __init__(self, caminho):
+        self.caminho = caminho
+        with open(caminho, 'rb') as f:
+            tamanho = os.fstat(f.fileno()).st_size
+            if tamanho < TAMANHO_CABECALHO + TAMANHO_DIGEST:
+                raise SnapshotInvalidoError(f"'{caminho}' é pequeno demais para ser um snapshot da urna")
+            self._mapa = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+        self.dados = memoryview(self._mapa)
+
+        (assinatura, versao, self.num_votos, self._inicio_tabela, self._inicio_dados,
+         inicio_metadados, tamanho_metadados) = CABECALHO.unpack_from(self.dados, 0)
+        if assinatura != ASSINATURA_ARQUIVO:
+            self.fechar()
+            raise SnapshotInvalidoError(f"'{caminho}' não é um snapshot da urna")
+        if versao != VERSAO_FORMATO:
+            self.fechar()
+            raise SnapshotInvalidoError(f'Versão {versao} do formato não suportada (esperada: {VERSAO_FORMATO})')
+        if (self._inicio_dados != self._inicio_tabela + self.num_votos * REGISTRO.size
+                or inicio_metadados + tamanho_metadados + TAMANHO_DIGEST != tamanho):
+            self.fechar()
+            raise SnapshotInvalidoError(f"'{caminho}' está truncado ou corrompido")
+        self._fim_conteudo = tamanho - TAMANHO_DIGEST
+        self.metadados = json.loads(bytes(self.dados[inicio_metadados:inicio_metadados + tamanho_metadados]))
+
+    def digest_gravado(self):
+        return bytes(self.dados[self._fim_conteudo:]).hex()
+
+    def calcular_digest(self):
+        """SHA-256 do conteúdo, calculado direto sobre o arquivo mapeado."""
+        return hashlib.sha256(self.dados[:self._fim_conteudo]).hexdigest()
+
+    def voto(self, indice):
+        """
+        (particao, voto_id, cpf, candidato_id, nome, mensagem, assinatura, chave, tipo_chave) do voto de
+        índice `indice`. Mensagem, assinatura e chave são fatias do arquivo mapeado, sem cópia; nome,
+        chave e tipo_chave são None se o eleitor não estava registrado.
+        """
+        (voto_id, posicao, particao, tam_mensagem, tam_candidato, tam_nome, tam_assinatura, tam_chave,
+         tam_cpf, tipo) = REGISTRO.unpack_from(self.dados, self._inicio_tabela + indice * REGISTRO.size)
+        posicao += self._inicio_dados
+        campos = []
+        for tamanho in (tam_cpf, tam_candidato, tam_nome, tam_mensagem, tam_assinatura, tam_chave):
+            campos.append(self.dados[posicao:posicao + tamanho])
+            posicao += tamanho
+        cpf, candidato, nome, mensagem, assinatura, chave = campos
+        if tipo == SEM_ELEITOR:
+            return particao, voto_id, str(cpf, 'utf-8'), str(candidato, 'utf-8'), None, mensagem, assinatura, None, None
+        return (particao, voto_id, str(cpf, 'utf-8'), str(candidato, 'utf-8'), str(nome, 'utf-8'),
+                mensagem, assinatura, chave, self.metadados['tipos_chave'][tipo])
+
+    def fechar(self):
+        self.dados.release()
+        self._mapa.close()
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('banco', help='caminho base da urna (o DATABASE_NAME do servidor)')
+    parser.add_argument('snapshot', help='arquivo de snapshot a gravar')
+    parser.add_argument('--particoes', type=int, default=1, help='número de partições da urna')
+    args = parser.parse_args()
+
+    try:
+        resumo = exportar(args.banco, args.snapshot, args.particoes)
+    except (ValueError, RuntimeError, sqlite3.Error) as e:
+        sys.exit(str(e))
+    print(json.dumps(resumo, ensure_ascii=False, indent=2))
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,84 @@
+# urna.py
+"""
+Localização dos arquivos SQLite da urna. Por padrão a urna é um único arquivo;
+com mais de uma partição, eleitores e votos são distribuídos entre K arquivos
+pelo hash do CPF normalizado. O eleitor e o voto dele ficam sempre na mesma
+partição, então a checagem de registro e o UNIQUE contra voto duplicado
+continuam valendo dentro de cada arquivo, e cada partição tem o seu próprio
+lock de escrita.
+"""
+import hashlib
+import os
+from armazenamento import obter_conexao
+from validacao_cpf import normalizar_cpf
+
+
+def caminhos_particoes(caminho_base, num_particoes=1):
+    """
+    Retorna os arquivos da urna. Com uma partição, é o próprio `caminho_base`;
+    com K partições, 'votacao.db' vira 'votacao.particao0.db' ... 'votacao.particao{K-1}.db'.
+    """
+    if num_particoes < 1:
+        raise ValueError('A urna precisa de pelo menos uma partição')
+    if num_particoes == 1:
+        return [caminho_base]
+    raiz, extensao = os.path.splitext(caminho_base)
+    return [f'{raiz}.particao{indice}{extensao}' for indice in range(num_particoes)]
+
+
+def indice_particao(cpf, num_particoes):
+    """Partição do eleitor, pelo hash do CPF normalizado (ou do texto recebido, se o CPF for inválido)."""
+    if num_particoes == 1:
+        return 0
+    chave = normalizar_cpf(cpf) or str(cpf)
+    return int.from_bytes(hashlib.sha256(chave.encode('utf-8')).digest()[:8], 'big') % num_particoes
+
+
+def registrar_particao(conn, indice, total):
+    """
+    Grava em cada arquivo qual partição ele é e de quantas. Lança ValueError se o
+    arquivo já pertencer a outra divisão, o que espalharia os eleitores errado.
+    Não confirma a transação.
+    """
+    conn.execute('''
+        CREATE TABLE IF NOT EXISTS urna_particao (
+            indice INTEGER NOT NULL,
+            total INTEGER NOT NULL
+        )
+    ''')
+    row = conn.execute('SELECT indice, total FROM urna_particao').fetchone()
+    if row is None:
+        conn.execute('INSERT INTO urna_particao (indice, total) VALUES (?, ?)', (indice, total))
+    elif (row[0], row[1]) != (indice, total):
+        raise ValueError(f'O arquivo é a partição {row[0]} de {row[1]}, mas foi aberto como {indice} de {total}; '
+                         'use reparticionar_urna.py para mudar o número de partições')
+
+
+class Urna:
+    """Os arquivos de uma urna e o roteamento de cada CPF para a sua partição."""
+
+    def __init__(self, caminho_base, num_particoes=1):
+        self.caminho_base = caminho_base
+        self.num_particoes = num_particoes
+        self.caminhos = caminhos_particoes(caminho_base, num_particoes)
+
+    def particao(self, cpf):
+        return indice_particao(cpf, self.num_particoes)
+
+    def conexao(self, indice=0):
+        """Conexão (do pool) com a partição de índice `indice`."""
+        return obter_conexao(self.caminhos[indice])
+
+    def conexao_eleitor(self, cpf):
+        """Conexão com a partição onde o eleitor e o voto dele são guardados."""
+        return self.conexao(self.particao(cpf))
+
+    def agrupar(self, itens, cpf_do_item):
+        """
+        Distribui os itens entre as partições, preservando a posição de cada um.
+        Retorna {indice_particao: [(posicao, item), ...]}.
+        """
+        grupos = {}
+        for posicao, item in enumerate(itens):
+            grupos.setdefault(self.particao(cpf_do_item(item)), []).append((posicao, item))
+        return grupos
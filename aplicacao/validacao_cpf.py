@@ -0,0 +1,151 @@
+# validacao_cpf.py
+try:
+    import numpy as np
+except ImportError:  # sem NumPy, os lotes são validados CPF a CPF
+    np = None
+
+# Tamanho máximo de um CPF formatado (000.000.000-00) tratado pelo caminho vetorizado
+_TAMANHO_MAXIMO_FORMATADO = 14
+
+# Formatos mais comuns: as posições dos dígitos e a máscara de bits dessas
+# posições, para extrair os dígitos sem reordenar cada linha
+_FORMATOS_COMUNS = []
+for _formato in ('00000000000', '000.000.000-00'):
+    _colunas = [i for i, caractere in enumerate(_formato) if caractere == '0']
+    _FORMATOS_COMUNS.append((_colunas, sum(1 << i for i in _colunas)))
+
+
+def validar_cpf(cpf):
+    """
+    Valida um CPF, verificando formato, dígitos repetidos e os dígitos verificadores.
+    
+    Args:
+        cpf: O CPF a ser validado, podendo conter ou não pontuação.
+
+    Returns:
+        True se o CPF for válido, False caso contrário.
+    """
+    
+    cpf_limpo = ''.join(filter(str.isdigit, cpf))
+
+    # Só os dígitos ASCII valem: '٠٣٣٢٠٦٨٨١١١' (dígitos arábicos) seria guardado
+    # como um eleitor diferente de '03320688111'
+    if len(cpf_limpo) != 11 or not cpf_limpo.isascii():
+        return False
+
+    if len(set(cpf_limpo)) == 1:
+        return False
+
+    try:
+        # Cálculo do primeiro dígito verificador
+        soma = 0
+        for i in range(9):
+            soma += int(cpf_limpo[i]) * (10 - i)
+        
+        resto = soma % 11
+        digito_verificador_1 = 0 if resto < 2 else 11 - resto
+
+        if digito_verificador_1 != int(cpf_limpo[9]):
+            return False
+
+        # Cálculo do segundo dígito verificador
+        soma = 0
+        for i in range(10):
+            soma += int(cpf_limpo[i]) * (11 - i)
+            
+        resto = soma % 11
+        digito_verificador_2 = 0 if resto < 2 else 11 - resto
+
+        if digito_verificador_2 != int(cpf_limpo[10]):
+            return False
+
+    except (ValueError, IndexError):
+        
+        return False
+
+    return True
+
+
+def normalizar_cpf(cpf):
+    """
+    Remove a pontuação do CPF, deixando apenas os 11 dígitos.
+    Retorna None se o CPF for inválido.
+    """
+    if not isinstance(cpf, str) or not validar_cpf(cpf):
+        return None
+    return ''.join(filter(str.isdigit, cpf))
+
+
+def _normalizar_lote_numpy(cpfs):
+    """
+    Valida e normaliza os CPFs com operações vetorizadas sobre uma matriz de
+    códigos de caractere (um CPF por linha). Retorna (normalizados, validos):
+    um array de strings de 11 dígitos e a máscara dos CPFs válidos.
+    """
+    try:
+        comprimentos = np.fromiter(map(len, cpfs), dtype=np.int64, count=len(cpfs))
+    except TypeError:
+        cpfs = [cpf if isinstance(cpf, str) else '' for cpf in cpfs]
+        comprimentos = np.fromiter(map(len, cpfs), dtype=np.int64, count=len(cpfs))
+    codigos = np.array(cpfs, dtype=f'U{_TAMANHO_MAXIMO_FORMATADO}').view(np.uint32)
+    codigos = codigos.reshape(len(cpfs), _TAMANHO_MAXIMO_FORMATADO)
+
+    eh_digito = (codigos >= ord('0')) & (codigos <= ord('9'))
+    padroes = eh_digito @ (1 << np.arange(_TAMANHO_MAXIMO_FORMATADO))
+
+    # Os 11 primeiros dígitos de cada linha, na ordem em que aparecem; só as
+    # linhas fora dos formatos comuns precisam ser reordenadas
+    digitos = codigos[:, :11]
+    restantes = np.ones(len(cpfs), dtype=bool)
+    for colunas, padrao in _FORMATOS_COMUNS:
+        linhas = padroes == padrao
+        digitos = np.where(linhas[:, None], codigos[:, colunas], digitos)
+        restantes &= ~linhas
+    if restantes.any():
+        posicoes = np.argsort(~eh_digito[restantes], axis=1, kind='stable')[:, :11]
+        digitos[restantes] = np.take_along_axis(codigos[restantes], posicoes, axis=1)
+    digitos = digitos.astype(np.int32) - ord('0')
+
+    resto = digitos[:, :9] @ np.arange(10, 1, -1, dtype=np.int32) % 11
+    digito_verificador_1 = np.where(resto < 2, 0, 11 - resto)
+    resto = digitos[:, :10] @ np.arange(11, 1, -1, dtype=np.int32) % 11
+    digito_verificador_2 = np.where(resto < 2, 0, 11 - resto)
+
+    validos = ((np.count_nonzero(eh_digito, axis=1) == 11)
+               & (digito_verificador_1 == digitos[:, 9])
+               & (digito_verificador_2 == digitos[:, 10])
+               & (digitos.min(axis=1) != digitos.max(axis=1)))
+    normalizados = (digitos + ord('0')).astype(np.uint32).view('U11').ravel()
+
+    # Textos longos ou com caracteres fora do ASCII (dígitos de outras escritas,
+    # por exemplo) seguem a regra da função escalar
+    fora_do_padrao = np.flatnonzero((comprimentos > _TAMANHO_MAXIMO_FORMATADO) | (codigos > 127).any(axis=1))
+    for indice in fora_do_padrao.tolist():
+        normalizado = normalizar_cpf(cpfs[indice])
+        validos[indice] = normalizado is not None
+        normalizados[indice] = normalizado or ''
+    return normalizados, validos
+
+
+def validar_cpfs(cpfs):
+    """
+    Valida uma sequência de CPFs de uma vez, com NumPy quando disponível.
+    Retorna uma lista de booleanos na mesma ordem.
+    """
+    cpfs = list(cpfs)
+    if np is None or not cpfs:
+        return [isinstance(cpf, str) and validar_cpf(cpf) for cpf in cpfs]
+    return _normalizar_lote_numpy(cpfs)[1].tolist()
+
+
+def normalizar_cpfs(cpfs):
+    """
+    Normaliza uma sequência de CPFs de uma vez, com NumPy quando disponível.
+    Retorna uma lista na mesma ordem com os 11 dígitos de cada CPF, ou None
+    para os inválidos, como normalizar_cpf.
+    """
+    cpfs = list(cpfs)
+    if np is None or not cpfs:
+        return [normalizar_cpf(cpf) for cpf in cpfs]
+    normalizados, validos = _normalizar_lote_numpy(cpfs)
+    return [cpf if valido else None for cpf, valido in zip(normalizados.tolist(), validos.tolist())]
@@ -0,0 +1,229 @@
+# verificacao_paralela.py
+import os
+import sqlite3
+import time
+from collections import deque
+from concurrent.futures import ProcessPoolExecutor
+from crypto_utils import obter_chave_verificacao, verificar_com_chave
+
+# Pool de processos reaproveitado entre apurações, para não pagar o custo
+# de criar os processos a cada chamada de /apurar.
+_executor = None
+_executor_num_workers = None
+
+
+def _obter_executor(num_workers):
+    """Retorna o pool de processos, recriando-o se o número de workers mudou."""
+    global _executor, _executor_num_workers
+    if _executor is None or _executor_num_workers != num_workers:
+        if _executor is not None:
+            _executor.shutdown(wait=True)
+        _executor = ProcessPoolExecutor(max_workers=num_workers)
+        _executor_num_workers = num_workers
+    return _executor
+
+
+def encerrar_executor():
+    """Encerra o pool de processos, se existir."""
+    global _executor, _executor_num_workers
+    if _executor is not None:
+        _executor.shutdown(wait=True)
+    _executor = None
+    _executor_num_workers = None
+
+
+# Lê cada voto já unido ao registro do eleitor em uma única consulta. O LEFT JOIN
+# mantém os votos de eleitores não registrados, que são reportados como inválidos.
+CONSULTA_VOTOS_COM_ELEITORES = '''
+    SELECT v.id, v.eleitor_cpf, v.candidato_id, v.mensagem_assinada, v.assinatura,
+           e.nome, e.chave_publica_der, e.tipo_chave
+    FROM votos v LEFT JOIN eleitores e ON e.cpf = v.eleitor_cpf
+'''
+
+
+def item_de_voto(voto_row):
+    """
+    Converte uma linha de votos (unida a eleitores) em um item de verificação.
+    A mensagem assinada e a assinatura já estão guardadas como bytes e seguem
+    direto para a verificação, sem decodificação.
+    """
+    return (voto_row['eleitor_cpf'], voto_row['nome'], voto_row['candidato_id'], voto_row['mensagem_assinada'],
+            voto_row['assinatura'], voto_row['chave_publica_der'], voto_row['tipo_chave'])
+
+
+def _acumular(tempos, fase, segundos):
+    tempos[fase] = tempos.get(fase, 0.0) + segundos
+
+
+def iterar_itens_votos(conn, tempos=None):
+    """
+    Percorre a urna inteira com o cursor da consulta unida, sem carregar todas as
+    linhas na memória, e gera os itens de verificação na ordem dos votos.
+    Se `tempos` for um dicionário, acumula nele o tempo das fases 'leitura'
+    (SQLite) e 'decodificacao' (conversão das linhas em itens).
+    """
+    if tempos is None:
+        for voto_row in conn.execute(CONSULTA_VOTOS_COM_ELEITORES + ' ORDER BY v.id'):
+            yield item_de_voto(voto_row)
+        return
+
+    inicio = time.perf_counter()
+    cursor = conn.execute(CONSULTA_VOTOS_COM_ELEITORES + ' ORDER BY v.id')
+    while True:
+        voto_row = cursor.fetchone()
+        meio = time.perf_counter()
+        _acumular(tempos, 'leitura', meio - inicio)
+        if voto_row is None:
+            return
+        item = item_de_voto(voto_row)
+        _acumular(tempos, 'decodificacao', time.perf_counter() - meio)
+        yield item
+        # O tempo do consumidor entre um item e outro não entra em nenhuma fase
+        inicio = time.perf_counter()
+
+
+def dividir_em_lotes(itens, tamanho_lote):
+    """Agrupa os itens de um iterável em listas de até `tamanho_lote` elementos."""
+    lote = []
+    for item in itens:
+        lote.append(item)
+        if len(lote) >= tamanho_lote:
+            yield lote
+            lote = []
+    if lote:
+        yield lote
+
+
+def verificar_lote(lote):
+    """
+    Verifica um lote de votos. Cada item é uma tupla
+    (cpf, nome, candidato_id, mensagem_bytes, assinatura_bytes, chave_publica, tipo_chave);
+    nome, chave_publica e tipo_chave são None quando o eleitor não está registrado.
+    Retorna a contagem parcial por candidato, a lista de votos inválidos do lote e
+    o tempo gasto nas fases 'carga_chave' e 'verificacao'.
+    """
+    resultados = {}
+    votos_invalidos = []
+    tempo_carga_chave = 0.0
+    tempo_verificacao = 0.0
+    for cpf, nome, candidato_id, mensagem_bytes, assinatura_bytes, chave_publica, tipo_chave in lote:
+        if chave_publica is None:
+            votos_invalidos.append({'cpf': cpf, 'nome': 'Desconhecido', 'motivo': 'Eleitor não registrado'})
+            continue
+
+        inicio = time.perf_counter()
+        public_key = obter_chave_verificacao(chave_publica, cpf)
+        meio = time.perf_counter()
+        valido = public_key is not None and verificar_com_chave(assinatura_bytes, mensagem_bytes, public_key, tipo_chave)
+        tempo_carga_chave += meio - inicio
+        tempo_verificacao += time.perf_counter() - meio
+
+        if valido:
+            resultados[candidato_id] = resultados.get(candidato_id, 0) + 1
+        else:
+            votos_invalidos.append({'cpf': cpf, 'nome': nome, 'motivo': 'Assinatura inválida'})
+    return resultados, votos_invalidos, {'carga_chave': tempo_carga_chave, 'verificacao': tempo_verificacao}
+
+
+def _combinar(resultados, votos_invalidos, tempos, parcial):
+    resultados_lote, invalidos_lote, tempos_lote = parcial
+    for candidato_id, quantidade in resultados_lote.items():
+        resultados[candidato_id] = resultados.get(candidato_id, 0) + quantidade
+    votos_invalidos.extend(invalidos_lote)
+    if tempos is not None:
+        for fase, segundos in tempos_lote.items():
+            _acumular(tempos, fase, segundos)
+
+
+def _executar_tarefas(funcao, tarefas, num_workers, tempos):
+    """
+    Executa `funcao` sobre cada tarefa no pool de processos e combina os
+    resultados parciais na ordem das tarefas. Retorna (resultados, votos_invalidos).
+    """
+    resultados = {}
+    votos_invalidos = []
+
+    if num_workers <= 1:
+        for tarefa in tarefas:
+            _combinar(resultados, votos_invalidos, tempos, funcao(tarefa))
+        return resultados, votos_invalidos
+
+    # Limita a quantidade de tarefas em voo para não carregar a urna inteira na memória
+    executor = _obter_executor(num_workers)
+    pendentes = deque()
+    for tarefa in tarefas:
+        pendentes.append(executor.submit(funcao, tarefa))
+        if len(pendentes) >= num_workers * 2:
+            _combinar(resultados, votos_invalidos, tempos, pendentes.popleft().result())
+    while pendentes:
+        _combinar(resultados, votos_invalidos, tempos, pendentes.popleft().result())
+
+    return resultados, votos_invalidos
+
+
+def verificar_votos(itens, num_workers=None, tamanho_lote=500, tempos=None):
+    """
+    Verifica as assinaturas dos votos distribuindo lotes entre um pool de processos.
+    Os resultados parciais são combinados na ordem dos lotes, de modo que a lista
+    de votos inválidos mantém a ordem da urna.
+    Se `tempos` for um dicionário, acumula nele o tempo das fases 'carga_chave' e
+    'verificacao', somado entre os processos.
+    Retorna (resultados, votos_invalidos).
+    """
+    num_workers = num_workers or os.cpu_count() or 1
+    return _executar_tarefas(verificar_lote, dividir_em_lotes(itens, tamanho_lote), num_workers, tempos)
+
+
+def verificar_intervalo(tarefa):
+    """
+    Lê e verifica, dentro do processo verificador, os votos de uma partição
+    com id no intervalo [id_inicial, id_final].
+    """
+    caminho_banco, id_inicial, id_final = tarefa
+    inicio = time.perf_counter()
+    # Uma conexão por tarefa: abrir custa bem menos que verificar o lote, e uma
+    # conexão nunca é compartilhada entre processos ou threads
+    conn = sqlite3.connect(caminho_banco)
+    conn.row_factory = sqlite3.Row
+    try:
+        votos = conn.execute(
+            CONSULTA_VOTOS_COM_ELEITORES + ' WHERE v.id BETWEEN ? AND ? ORDER BY v.id', (id_inicial, id_final)
+        ).fetchall()
+    finally:
+        conn.close()
+    meio = time.perf_counter()
+    itens = [item_de_voto(voto_row) for voto_row in votos]
+    fim = time.perf_counter()
+
+    resultados, votos_invalidos, tempos = verificar_lote(itens)
+    tempos['leitura'] = meio - inicio
+    tempos['decodificacao'] = fim - meio
+    return resultados, votos_invalidos, tempos
+
+
+def intervalos_particoes(caminhos_bancos, tamanho_lote):
+    """Divide os votos de cada arquivo de partição em intervalos de até `tamanho_lote` ids."""
+    for caminho_banco in caminhos_bancos:
+        conn = sqlite3.connect(caminho_banco)
+        try:
+            menor_id, maior_id = conn.execute('SELECT MIN(id), MAX(id) FROM votos').fetchone()
+        finally:
+            conn.close()
+        if menor_id is None:
+            continue
+        for id_inicial in range(menor_id, maior_id + 1, tamanho_lote):
+            yield caminho_banco, id_inicial, id_inicial + tamanho_lote - 1
+
+
+def verificar_particoes(caminhos_bancos, num_workers=None, tamanho_lote=500, tempos=None):
+    """
+    Apura uma urna particionada: os votos de todas as partições são divididos em
+    intervalos de ids, e cada processo verificador lê e verifica os seus intervalos
+    diretamente do arquivo, em paralelo. Os resultados são combinados na ordem
+    das partições.
+    Retorna (resultados, votos_invalidos), como verificar_votos, e acumula em
+    `tempos` também as fases 'leitura' e 'decodificacao'.
+    """
+    num_workers = num_workers or os.cpu_count() or 1
+    return _executar_tarefas(verificar_intervalo, intervalos_particoes(caminhos_bancos, tamanho_lote),
+                             num_workers, tempos)
@@ -0,0 +1,135 @@
+# bench_armazenamento_votos.py
+"""
+Compara o armazenamento dos votos em JSON (payload_voto_json, formato antigo)
+com o armazenamento binário (mensagem assinada e assinatura em BLOB):
+
+- tamanho do arquivo SQLite, após VACUUM;
+- tempo de apuração em um único processo, separando a decodificação dos votos
+  da verificação das assinaturas.
+
+A urna no formato antigo é criada com votos assinados de verdade e depois
+convertida com migracao_votos_binarios.py, de modo que as duas apurações leem
+exatamente os mesmos votos.
+
+Uso:
+    python benchmarks/bench_armazenamento_votos.py --votos 20000
+"""
+import argparse
+import base64
+import json
+import os
+import shutil
+import sqlite3
+import sys
+import tempfile
+import time
+
+RAIZ = os.path.join(os.path.dirname(os.path.abspath(__file__)), '..')
+sys.path.insert(0, os.path.join(RAIZ, 'aplicacao'))
+sys.path.insert(0, RAIZ)
+
+from crypto_utils import verificar_assinatura, verificar_assinatura_mensagem, validar_chave_publica_pem  # noqa: E402
+from migracao_votos_binarios import migrar  # noqa: E402
+from verificacao_paralela import iterar_itens_votos  # noqa: E402
+from benchmarks.carga.eleitorado import gerar_eleitorado  # noqa: E402
+
+
+def criar_urna_antiga(caminho, registros, votos):
+    """Cria a urna com o esquema anterior à migração."""
+    conn = sqlite3.connect(caminho)
+    conn.execute('CREATE TABLE eleitores (cpf TEXT PRIMARY KEY, nome TEXT NOT NULL, chave_publica_pem TEXT NOT NULL)')
+    conn.execute('CREATE TABLE votos (id INTEGER PRIMARY KEY AUTOINCREMENT, '
+                 'eleitor_cpf TEXT NOT NULL UNIQUE, payload_voto_json TEXT NOT NULL)')
+    conn.executemany('INSERT INTO eleitores VALUES (?, ?, ?)',
+                     ((r['cpf'], r['nome'], r['chave_publica_pem']) for r in registros))
+    conn.executemany('INSERT INTO votos (eleitor_cpf, payload_voto_json) VALUES (?, ?)',
+                     ((v['voto_data']['eleitor_cpf'], json.dumps(v)) for v in votos))
+    conn.commit()
+    conn.execute('VACUUM')
+    conn.close()
+
+
+def apurar_antiga(caminho):
+    """Apuração como era feita sobre o JSON: json.loads, b64decode e nova serialização antes de verificar."""
+    conn = sqlite3.connect(caminho)
+    conn.row_factory = sqlite3.Row
+    tempo_decodificacao = 0.0
+    tempo_verificacao = 0.0
+    validos = 0
+    consulta = ('SELECT v.payload_voto_json, e.chave_publica_pem FROM votos v '
+                'JOIN eleitores e ON e.cpf = v.eleitor_cpf ORDER BY v.id')
+    for row in conn.execute(consulta):
+        inicio = time.perf_counter()
+        payload_completo = json.loads(row['payload_voto_json'])
+        voto_data = payload_completo['voto_data']
+        assinatura = base64.b64decode(payload_completo['assinatura_b64'])
+        meio = time.perf_counter()
+        # verificar_assinatura serializa voto_data novamente para obter os bytes assinados
+        validos += verificar_assinatura(assinatura, voto_data, row['chave_publica_pem'], cpf=voto_data['eleitor_cpf'])
+        fim = time.perf_counter()
+        tempo_decodificacao += meio - inicio
+        tempo_verificacao += fim - meio
+    conn.close()
+    return validos, tempo_decodificacao, tempo_verificacao
+
+
+def apurar_binaria(caminho):
+    """Apuração sobre os BLOBs: os bytes guardados seguem direto para a verificação."""
+    conn = sqlite3.connect(caminho)
+    conn.row_factory = sqlite3.Row
+    tempo_decodificacao = 0.0
+    tempo_verificacao = 0.0
+    validos = 0
+    itens = iterar_itens_votos(conn)
+    while True:
+        inicio = time.perf_counter()
+        item = next(itens, None)
+        meio = time.perf_counter()
+        if item is None:
+            break
+        cpf, _, _, mensagem, assinatura, chave, tipo_chave = item
+        validos += verificar_assinatura_mensagem(assinatura, mensagem, chave, cpf=cpf, tipo_chave=tipo_chave)
+        tempo_decodificacao += meio - inicio
+        tempo_verificacao += time.perf_counter() - meio
+    conn.close()
+    return validos, tempo_decodificacao, tempo_verificacao
+
+
+def medir(nome, caminho, apuracao):
+    validos, decodificacao, verificacao = apuracao(caminho)
+    return {
+        'formato': nome,
+        'bytes_arquivo': os.path.getsize(caminho),
+        'votos_validos': validos,
+        'leitura_decodificacao_s': round(decodificacao, 3),
+        'verificacao_s': round(verificacao, 3),
+        'apuracao_total_s': round(decodificacao + verificacao, 3),
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--votos', type=int, default=20000)
+    args = parser.parse_args()
+
+    registros, votos = gerar_eleitorado(args.votos)
+    # Garante que as chaves sintéticas passam pela mesma validação do registro
+    validar_chave_publica_pem(registros[0]['chave_publica_pem'])
+
+    with tempfile.TemporaryDirectory() as pasta:
+        antiga = os.path.join(pasta, 'urna_json.db')
+        binaria = os.path.join(pasta, 'urna_binaria.db')
+        criar_urna_antiga(antiga, registros, votos)
+        shutil.copy(antiga, binaria)
+        migrar(binaria)
+        conn = sqlite3.connect(binaria)
+        conn.execute('VACUUM')
+        conn.close()
+
+        medicoes = [medir('json', antiga, apurar_antiga), medir('binario', binaria, apurar_binaria)]
+
+    print(json.dumps(medicoes, indent=2, ensure_ascii=False))
+
+
+if __name__ == '__main__':
+    main()
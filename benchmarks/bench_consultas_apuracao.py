@@ -0,0 +1,132 @@
+# bench_consultas_apuracao.py
+"""
+Compara a leitura da urna feita pela apuração antes e depois da consulta unida:
+
+- antiga: SELECT * FROM votos com fetchall() e um SELECT em eleitores por voto (N+1);
+- nova:   uma única consulta com LEFT JOIN percorrida pelo cursor.
+
+A verificação das assinaturas não entra na medição, apenas a leitura e a
+decodificação dos votos. Cada variante roda em um processo próprio, para que o
+pico de memória (RSS) de uma não contamine a outra.
+
+Uso:
+    python benchmarks/bench_consultas_apuracao.py --votos 100000
+"""
+import argparse
+import json
+import os
+import resource
+import sqlite3
+import subprocess
+import sys
+import tempfile
+import time
+
+PASTA_APLICACAO = os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', 'aplicacao')
+sys.path.insert(0, PASTA_APLICACAO)
+
+from crypto_utils import mensagem_canonica  # noqa: E402
+from verificacao_paralela import iterar_itens_votos  # noqa: E402
+
+# Uma fração dos votos vem de CPFs não registrados, para exercitar o LEFT JOIN
+FRACAO_NAO_REGISTRADOS = 0.05
+
+
+def criar_banco_sintetico(caminho, num_votos):
+    """Cria uma urna sintética com `num_votos` votos e seus eleitores."""
+    import servidor
+    servidor.DATABASE_NAME = caminho
+    servidor.init_db()
+
+    # A mesma chave e a mesma assinatura servem para todos: a verificação não é medida
+    chave_der = os.urandom(294)
+    assinatura = os.urandom(256)
+    candidatos = ['10 - Lorena', '4 - Caetano', '12 - Vitor Hugo']
+    limite_registrados = int(num_votos * (1 - FRACAO_NAO_REGISTRADOS))
+
+    conn = sqlite3.connect(caminho)
+    conn.executemany('INSERT INTO eleitores (cpf, nome, chave_publica_der) VALUES (?, ?, ?)',
+                     ((f'{i:011d}', f'Eleitor {i}', chave_der) for i in range(limite_registrados)))
+
+    def votos():
+        for i in range(num_votos):
+            voto_data = {'eleitor_cpf': f'{i:011d}', 'candidato_id': candidatos[i % len(candidatos)]}
+            yield f'{i:011d}', voto_data['candidato_id'], mensagem_canonica(voto_data), assinatura
+
+    conn.executemany('INSERT INTO votos (eleitor_cpf, candidato_id, mensagem_assinada, assinatura) '
+                     'VALUES (?, ?, ?, ?)', votos())
+    conn.commit()
+    conn.close()
+
+
+def ler_urna_antiga(conn):
+    """Reproduz a leitura original de apurar_votos: fetchall() e uma consulta por voto."""
+    votos_brutos = conn.execute('SELECT * FROM votos').fetchall()
+    for voto_row in votos_brutos:
+        eleitor_registrado = conn.execute('SELECT nome, chave_publica_der, tipo_chave FROM eleitores WHERE cpf = ?',
+                                          (voto_row['eleitor_cpf'],)).fetchone()
+        if not eleitor_registrado:
+            yield (voto_row['eleitor_cpf'], None, voto_row['candidato_id'], voto_row['mensagem_assinada'],
+                   voto_row['assinatura'], None, None)
+            continue
+        yield (voto_row['eleitor_cpf'], eleitor_registrado['nome'], voto_row['candidato_id'],
+               voto_row['mensagem_assinada'], voto_row['assinatura'], eleitor_registrado['chave_publica_der'],
+               eleitor_registrado['tipo_chave'])
+
+
+def medir_variante(caminho, variante):
+    """Executa uma variante da leitura e retorna as métricas coletadas."""
+    consultas = 0
+
+    def contar_consulta(sql):
+        nonlocal consultas
+        consultas += 1
+
+    conn = sqlite3.connect(caminho)
+    conn.row_factory = sqlite3.Row
+    conn.set_trace_callback(contar_consulta)
+
+    leitor = ler_urna_antiga if variante == 'antiga' else iterar_itens_votos
+    inicio = time.perf_counter()
+    num_itens = sum(1 for _ in leitor(conn))
+    duracao = time.perf_counter() - inicio
+    conn.close()
+
+    return {
+        'variante': variante,
+        'votos': num_itens,
+        'consultas': consultas,
+        'segundos': round(duracao, 3),
+        # ru_maxrss é dado em KiB no Linux
+        'pico_rss_mib': round(resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024, 1),
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--votos', type=int, default=100000, help='quantidade de votos na urna sintética')
+    parser.add_argument('--banco', help='reaproveita um banco sintético já criado')
+    parser.add_argument('--variante', choices=['antiga', 'nova'], help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    if args.variante:
+        print(json.dumps(medir_variante(args.banco, args.variante)))
+        return
+
+    with tempfile.TemporaryDirectory() as pasta:
+        caminho = args.banco or os.path.join(pasta, 'urna_sintetica.db')
+        if not args.banco:
+            print(f"Criando urna sintética com {args.votos} votos...", file=sys.stderr)
+            criar_banco_sintetico(caminho, args.votos)
+
+        medicoes = []
+        for variante in ('antiga', 'nova'):
+            saida = subprocess.run([sys.executable, os.path.abspath(__file__), '--banco', caminho,
+                                    '--variante', variante], check=True, capture_output=True, text=True)
+            medicoes.append(json.loads(saida.stdout))
+
+    print(json.dumps(medicoes, indent=2, ensure_ascii=False))
+
+
+if __name__ == '__main__':
+    main()
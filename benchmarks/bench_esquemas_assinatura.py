@@ -0,0 +1,78 @@
+# bench_esquemas_assinatura.py
+"""
+Compara os esquemas de assinatura suportados (RSA-2048, Ed25519 e ECDSA P-256)
+em tempo de geração de chaves, assinatura e verificação de votos, e no espaço
+ocupado por voto armazenado e por chave pública registrada.
+
+Uso:
+    python benchmarks/bench_esquemas_assinatura.py --repeticoes 200
+"""
+import argparse
+import base64
+import json
+import os
+import sys
+import time
+
+PASTA_APLICACAO = os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', 'aplicacao')
+sys.path.insert(0, PASTA_APLICACAO)
+
+from cryptography.hazmat.primitives import serialization  # noqa: E402
+from crypto_utils import (ESQUEMAS_ASSINATURA, gerar_chave_privada, assinar_bytes,  # noqa: E402
+                          verificar_assinatura)
+
+
+def cronometrar(funcao, repeticoes):
+    """Retorna o tempo médio de uma chamada, em milissegundos."""
+    inicio = time.perf_counter()
+    for _ in range(repeticoes):
+        funcao()
+    return (time.perf_counter() - inicio) * 1000 / repeticoes
+
+
+def medir_esquema(esquema, repeticoes):
+    voto_data = {'eleitor_cpf': '52998224725', 'candidato_id': '10 - Lorena'}
+    dados_bytes = json.dumps(voto_data, sort_keys=True).encode('utf-8')
+
+    # A geração de RSA é ordens de grandeza mais lenta: usa menos repetições
+    repeticoes_geracao = max(1, repeticoes // 10)
+    ms_geracao = cronometrar(lambda: gerar_chave_privada(esquema), repeticoes_geracao)
+
+    private_key = gerar_chave_privada(esquema)
+    chave_der = private_key.public_key().public_bytes(
+        encoding=serialization.Encoding.DER,
+        format=serialization.PublicFormat.SubjectPublicKeyInfo
+    )
+    assinatura = assinar_bytes(private_key, dados_bytes)
+    ms_assinatura = cronometrar(lambda: assinar_bytes(private_key, dados_bytes), repeticoes)
+    # Com o CPF informado, a chave vem do cache, como na apuração
+    ms_verificacao = cronometrar(
+        lambda: verificar_assinatura(assinatura, voto_data, chave_der, cpf=voto_data['eleitor_cpf'], tipo_chave=esquema),
+        repeticoes)
+    assert verificar_assinatura(assinatura, voto_data, chave_der, tipo_chave=esquema)
+
+    # Voto como o servidor o guarda em votos.payload_voto_json
+    payload_armazenado = json.dumps({'voto_data': voto_data,
+                                     'assinatura_b64': base64.b64encode(assinatura).decode('utf-8')})
+    return {
+        'esquema': esquema,
+        'geracao_chave_ms': round(ms_geracao, 3),
+        'assinatura_ms': round(ms_assinatura, 3),
+        'verificacao_ms': round(ms_verificacao, 3),
+        'assinatura_bytes': len(assinatura),
+        'voto_armazenado_bytes': len(payload_armazenado.encode('utf-8')),
+        'chave_publica_der_bytes': len(chave_der),
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--repeticoes', type=int, default=200, help='repetições de assinatura e verificação')
+    args = parser.parse_args()
+
+    medicoes = [medir_esquema(esquema, args.repeticoes) for esquema in ESQUEMAS_ASSINATURA]
+    print(json.dumps(medicoes, indent=2, ensure_ascii=False))
+
+
+if __name__ == '__main__':
+    main()
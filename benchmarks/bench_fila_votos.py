@@ -0,0 +1,126 @@
+# bench_fila_votos.py
+"""
+Compara a ingestão de votos com um commit por requisição (INGESTAO_MODO=direto)
+com a fila de votos com log e fsync em grupo (INGESTAO_MODO=fila).
+
+Cada configuração roda em um processo próprio, porque os modos são lidos das
+variáveis de ambiente na importação do servidor:
+
+- direto/NORMAL: commit por voto com SQLITE_SYNCHRONOUS=NORMAL (o padrão; no
+  modo WAL o commit não faz fsync, então um voto confirmado pode se perder numa
+  queda de energia);
+- direto/FULL: commit por voto com fsync, durável como a fila;
+- fila: voto confirmado após o fsync do log, com os fsyncs agrupados.
+
+Os votos são enviados pelo test client do Flask, com várias threads, para
+medir o servidor sem o custo do HTTP. Também é medido o tempo de um fsync na
+pasta usada, que é o que o agrupamento economiza: em discos com fsync lento,
+a diferença entre direto/FULL e fila cresce.
+
+Uso:
+    python benchmarks/bench_fila_votos.py --votos 4000 --concorrencias 1,8,32 [--pasta /caminho/no/disco]
+"""
+import argparse
+import contextlib
+import json
+import os
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+
+RAIZ = os.path.join(os.path.dirname(os.path.abspath(__file__)), '..')
+sys.path.insert(0, os.path.join(RAIZ, 'aplicacao'))
+sys.path.insert(0, RAIZ)
+
+CONFIGURACOES = {
+    'direto/NORMAL': {'INGESTAO_MODO': 'direto', 'SQLITE_SYNCHRONOUS': 'NORMAL'},
+    'direto/FULL': {'INGESTAO_MODO': 'direto', 'SQLITE_SYNCHRONOUS': 'FULL'},
+    'fila': {'INGESTAO_MODO': 'fila', 'SQLITE_SYNCHRONOUS': 'NORMAL'},
+}
+
+
+def medir_fsync(pasta, repeticoes=200):
+    """Tempo médio, em microssegundos, de uma escrita pequena seguida de fsync."""
+    caminho = os.path.join(pasta, 'bench_fsync.tmp')
+    fd = os.open(caminho, os.O_WRONLY | os.O_CREAT)
+    try:
+        inicio = time.perf_counter()
+        for _ in range(repeticoes):
+            os.write(fd, b'x' * 256)
+            os.fsync(fd)
+        return round((time.perf_counter() - inicio) / repeticoes * 1e6, 1)
+    finally:
+        os.close(fd)
+        os.remove(caminho)
+
+
+def executar_filho(args):
+    """Registra os eleitores, envia os votos com `concorrencia` threads e imprime a medição em JSON."""
+    import servidor
+    from benchmarks.carga.cenarios import medir
+    from benchmarks.carga.eleitorado import gerar_eleitorado
+
+    servidor.DATABASE_NAME = os.path.join(args.pasta, 'bench_fila.db')
+    with contextlib.redirect_stdout(sys.stderr):
+        servidor.init_db()
+    registros, votos = gerar_eleitorado(args.votos, 'ed25519', semente=2024)
+    cliente = servidor.app.test_client()
+    for registro in registros:
+        cliente.post('/registrar_eleitor', json=registro)
+
+    local = threading.local()
+
+    def votar(voto):
+        if not hasattr(local, 'cliente'):
+            local.cliente = servidor.app.test_client()
+        return local.cliente.post('/votar', json=voto).status_code
+
+    resultado = medir(votar, votos, args.concorrencia)
+    with contextlib.redirect_stdout(sys.stderr):
+        servidor.encerrar_filas()
+    conn = servidor.get_db_connection()
+    resultado['votos_na_urna'] = conn.execute('SELECT COUNT(*) FROM votos').fetchone()[0]
+    conn.close()
+    print(json.dumps(resultado))
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--votos', type=int, default=4000)
+    parser.add_argument('--concorrencias', default='1,8,32', help='quantidades de threads, separadas por vírgula')
+    parser.add_argument('--pasta', help='pasta onde os bancos e logs são criados (padrão: uma pasta temporária)')
+    parser.add_argument('--filho', action='store_true', help=argparse.SUPPRESS)
+    parser.add_argument('--concorrencia', type=int, default=1, help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    if args.filho:
+        executar_filho(args)
+        return
+
+    with tempfile.TemporaryDirectory(dir=args.pasta) as pasta:
+        relatorio = {'votos': args.votos, 'fsync_us': medir_fsync(pasta), 'resultados': {}}
+        for concorrencia in [int(valor) for valor in args.concorrencias.split(',')]:
+            for nome, variaveis in CONFIGURACOES.items():
+                with tempfile.TemporaryDirectory(dir=pasta) as pasta_execucao:
+                    saida = subprocess.run(
+                        [sys.executable, os.path.abspath(__file__), '--filho', '--votos', str(args.votos),
+                         '--concorrencia', str(concorrencia), '--pasta', pasta_execucao],
+                        env=dict(os.environ, **variaveis), capture_output=True, text=True, check=True)
+                medicao = json.loads(saida.stdout)
+                relatorio['resultados'][f'{nome} c={concorrencia}'] = {
+                    'vazao_req_s': medicao['vazao_req_s'],
+                    'p50_ms': medicao['latencia_ms']['p50'],
+                    'p99_ms': medicao['latencia_ms']['p99'],
+                    'status': medicao['status'],
+                    'votos_na_urna': medicao['votos_na_urna'],
+                }
+                print(f"{nome:>14} c={concorrencia:<3} {medicao['vazao_req_s']:>8} req/s  "
+                      f"p50 {medicao['latencia_ms']['p50']} ms  p99 {medicao['latencia_ms']['p99']} ms",
+                      file=sys.stderr)
+    print(json.dumps(relatorio, indent=2))
+
+
+if __name__ == '__main__':
+    main()
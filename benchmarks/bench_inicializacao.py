@@ -0,0 +1,147 @@
+# bench_inicializacao.py
+"""
+Mede o reinício do servidor sobre uma urna já populada (python servidor.py
+--producao), como depois de uma queda no meio da votação:
+
+- prontidão:        do início do processo até a primeira resposta HTTP;
+- primeira apuração: duração do primeiro GET /apurar depois de pronto.
+
+Cada configuração roda em um servidor novo, com e sem o aquecimento do cache
+de chaves (AQUECIMENTO_CHAVES). Com o aquecimento, a apuração só é pedida
+depois que a thread de fundo termina de carregar as chaves. A verificação roda
+no processo do servidor (APURACAO_NUM_WORKERS=1), o único caso em que o cache
+do servidor é usado pela apuração.
+
+Uso:
+    python benchmarks/bench_inicializacao.py --eleitores 20000 [--esquema ed25519]
+"""
+import argparse
+import base64
+import contextlib
+import json
+import os
+import socket
+import sqlite3
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+import urllib.error
+import urllib.request
+
+RAIZ = os.path.join(os.path.dirname(os.path.abspath(__file__)), '..')
+PASTA_APLICACAO = os.path.join(RAIZ, 'aplicacao')
+sys.path.insert(0, PASTA_APLICACAO)
+sys.path.insert(0, RAIZ)
+
+from crypto_utils import mensagem_canonica, validar_chave_publica_pem  # noqa: E402
+
+CONFIGURACOES = {
+    'sem_aquecimento': {'AQUECIMENTO_CHAVES': '0', 'APURACAO_NUM_WORKERS': '1'},
+    'com_aquecimento': {'AQUECIMENTO_CHAVES': '1', 'APURACAO_NUM_WORKERS': '1'},
+}
+
+
+def criar_urna(pasta, num_eleitores, esquema):
+    """Cria em `pasta` a urna do servidor com `num_eleitores` eleitores registrados, todos já tendo votado."""
+    import servidor
+    from benchmarks.carga.eleitorado import gerar_eleitorado
+    servidor.DATABASE_NAME = os.path.join(pasta, 'votacao_database.db')
+    with contextlib.redirect_stdout(sys.stderr):
+        servidor.init_db()
+
+    registros, votos = gerar_eleitorado(num_eleitores, esquema)
+    chaves_der = {}
+    for registro in registros:
+        if registro['chave_publica_pem'] not in chaves_der:
+            chaves_der[registro['chave_publica_pem']] = validar_chave_publica_pem(registro['chave_publica_pem'])
+    conn = sqlite3.connect(servidor.DATABASE_NAME)
+    conn.executemany('INSERT INTO eleitores (cpf, nome, chave_publica_der, tipo_chave) VALUES (?, ?, ?, ?)',
+                     ((registro['cpf'], registro['nome'], *chaves_der[registro['chave_publica_pem']])
+                      for registro in registros))
+    conn.executemany('INSERT INTO votos (eleitor_cpf, candidato_id, mensagem_assinada, assinatura) '
+                     'VALUES (?, ?, ?, ?)',
+                     ((voto['voto_data']['eleitor_cpf'], voto['voto_data']['candidato_id'],
+                       mensagem_canonica(voto['voto_data']), base64.b64decode(voto['assinatura_b64']))
+                      for voto in votos))
+    conn.commit()
+    conn.close()
+
+
+def porta_livre():
+    with socket.socket() as s:
+        s.bind(('127.0.0.1', 0))
+        return s.getsockname()[1]
+
+
+def medir_reinicio(pasta, variaveis, tempo_limite=120):
+    """Sobe o servidor em modo de produção sobre a urna de `pasta` e mede a prontidão e a primeira apuração."""
+    porta = porta_livre()
+    url = f'http://127.0.0.1:{porta}'
+    inicio = time.perf_counter()
+    processo = subprocess.Popen(
+        [sys.executable, '-u', os.path.join(PASTA_APLICACAO, 'servidor.py'),
+         '--producao', '--host', '127.0.0.1', '--porta', str(porta)],
+        cwd=pasta, env=dict(os.environ, **variaveis), stdout=subprocess.PIPE, stderr=subprocess.DEVNULL, text=True)
+    chaves_carregadas = threading.Event()
+    linhas = []
+
+    def ler_saida():
+        for linha in processo.stdout:
+            linhas.append(linha.rstrip())
+            if linha.startswith('Cache de chaves:'):
+                chaves_carregadas.set()
+
+    threading.Thread(target=ler_saida, daemon=True).start()
+    try:
+        limite = time.monotonic() + tempo_limite
+        while True:
+            try:
+                urllib.request.urlopen(url + '/metrics', timeout=1).read()
+                break
+            except (urllib.error.URLError, ConnectionError):
+                if time.monotonic() > limite:
+                    raise RuntimeError('O servidor não ficou pronto a tempo')
+                time.sleep(0.02)
+        prontidao = time.perf_counter() - inicio
+
+        if variaveis.get('AQUECIMENTO_CHAVES') == '1':
+            chaves_carregadas.wait(tempo_limite)
+        espera_chaves = time.perf_counter() - inicio - prontidao
+
+        inicio_apuracao = time.perf_counter()
+        resultado = json.loads(urllib.request.urlopen(url + '/apurar', timeout=tempo_limite).read())
+        primeira_apuracao = time.perf_counter() - inicio_apuracao
+    finally:
+        processo.terminate()
+        processo.wait()
+    return {
+        'prontidao_s': round(prontidao, 3),
+        'espera_chaves_s': round(espera_chaves, 3),
+        'primeira_apuracao_s': round(primeira_apuracao, 3),
+        'votos_validos': sum(resultado['resultado_final'].values()),
+        'saida_servidor': [linha for linha in linhas if linha],
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--eleitores', type=int, default=20000)
+    parser.add_argument('--esquema', default='ed25519')
+    parser.add_argument('--pasta', help='pasta onde a urna é criada (padrão: uma pasta temporária)')
+    args = parser.parse_args()
+
+    relatorio = {'eleitores': args.eleitores, 'esquema': args.esquema, 'resultados': {}}
+    with tempfile.TemporaryDirectory(dir=args.pasta) as pasta:
+        criar_urna(pasta, args.eleitores, args.esquema)
+        for nome, variaveis in CONFIGURACOES.items():
+            medicao = medir_reinicio(pasta, variaveis)
+            relatorio['resultados'][nome] = medicao
+            print(f"{nome:>16}  pronto em {medicao['prontidao_s']} s  "
+                  f"primeira apuração {medicao['primeira_apuracao_s']} s", file=sys.stderr)
+    print(json.dumps(relatorio, ensure_ascii=False, indent=2))
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,102 @@
+# __main__.py
+"""
+Teste de carga reproduzível do servidor de votação.
+
+Gera um eleitorado sintético (CPFs válidos e chaves reaproveitadas de um cache
+local), registra os eleitores, envia os votos assinados e apura a urna, medindo
+vazão, latências p50/p95/p99 e o tempo de apuração por 10 mil votos. O resultado
+sai em JSON, para ser comparado entre execuções com --comparar.
+
+Uso (a partir da raiz do repositório):
+    python -m benchmarks.carga --eleitores 2000 --alvo test_client
+    python -m benchmarks.carga --eleitores 2000 --alvo http --concorrencia 16
+    python -m benchmarks.carga --eleitores 2000 --alvo http --servidor asgi --concorrencia 16
+    python -m benchmarks.carga --alvo http --url http://127.0.0.1:5000 --saida atual.json --comparar anterior.json
+"""
+import argparse
+import json
+import os
+import platform
+import sys
+import time
+
+PASTA_APLICACAO = os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', '..', 'aplicacao')
+sys.path.insert(0, PASTA_APLICACAO)
+
+from crypto_utils import ESQUEMAS_ASSINATURA, ESQUEMA_RSA  # noqa: E402
+from .eleitorado import gerar_eleitorado  # noqa: E402
+from .cenarios import AlvoTestClient, AlvoHTTP, executar_cenarios  # noqa: E402
+
+
+def comparar(atual, anterior):
+    """Variação percentual da vazão e do p95 de cada cenário em relação à execução anterior."""
+    comparacao = {}
+    for cenario, medicao in atual['resultados'].items():
+        base = anterior.get('resultados', {}).get(cenario)
+        if not base:
+            continue
+
+        def variacao(novo, antigo):
+            return round((novo - antigo) / antigo * 100, 1) if novo is not None and antigo else None
+
+        comparacao[cenario] = {
+            'vazao_%': variacao(medicao['vazao_req_s'], base['vazao_req_s']),
+            'p95_%': variacao(medicao['latencia_ms']['p95'], base['latencia_ms']['p95']),
+        }
+    return comparacao
+
+
+def main():
+    parser = argparse.ArgumentParser(prog='python -m benchmarks.carga', description=__doc__,
+                                     formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--eleitores', type=int, default=1000, help='tamanho do eleitorado sintético')
+    parser.add_argument('--alvo', choices=['test_client', 'http'], default='test_client')
+    parser.add_argument('--url', help='servidor já em execução (padrão: sobe um servidor local temporário)')
+    parser.add_argument('--servidor', choices=['flask', 'asgi'], default='flask',
+                        help='modo do servidor local do alvo http: Flask (WSGI) ou servidor_asgi.py')
+    parser.add_argument('--concorrencia', type=int, default=1, help='clientes simultâneos')
+    parser.add_argument('--esquema', choices=ESQUEMAS_ASSINATURA, default=ESQUEMA_RSA)
+    parser.add_argument('--repeticoes-apuracao', type=int, default=3)
+    parser.add_argument('--semente', type=int, default=2024)
+    parser.add_argument('--saida', help='arquivo onde o resultado em JSON é gravado')
+    parser.add_argument('--comparar', help='resultado JSON de uma execução anterior')
+    args = parser.parse_args()
+
+    inicio = time.perf_counter()
+    registros, votos = gerar_eleitorado(args.eleitores, args.esquema, args.semente)
+    preparo = time.perf_counter() - inicio
+
+    alvo = AlvoTestClient() if args.alvo == 'test_client' else AlvoHTTP(args.url, args.servidor)
+    try:
+        resultados = executar_cenarios(alvo, registros, votos, args.concorrencia, args.repeticoes_apuracao)
+    finally:
+        alvo.encerrar()
+
+    relatorio = {
+        'configuracao': {
+            'alvo': alvo.nome,
+            'servidor': getattr(alvo, 'servidor', None),
+            'eleitores': args.eleitores,
+            'concorrencia': args.concorrencia,
+            'esquema': args.esquema,
+            'semente': args.semente,
+            'modo_apuracao': os.environ.get('APURACAO_MODO', 'recontagem'),
+            'python': platform.python_version(),
+            'cpus': os.cpu_count(),
+        },
+        'preparo_segundos': round(preparo, 3),
+        'resultados': resultados,
+    }
+    if args.comparar:
+        with open(args.comparar, encoding='utf-8') as f:
+            relatorio['comparacao'] = comparar(relatorio, json.load(f))
+
+    saida = json.dumps(relatorio, indent=2, ensure_ascii=False)
+    if args.saida:
+        with open(args.saida, 'w', encoding='utf-8') as f:
+            f.write(saida + '\n')
+    print(saida)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,207 @@
+# cenarios.py
+"""Alvos (Flask test client ou servidor HTTP real) e medição dos cenários de carga."""
+import contextlib
+import os
+import socket
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+PASTA_APLICACAO = os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', '..', 'aplicacao')
+
+
+class AlvoTestClient:
+    """Executa as requisições no próprio processo, pelo test client do Flask."""
+
+    nome = 'test_client'
+
+    def __init__(self):
+        import servidor
+        self._pasta = tempfile.TemporaryDirectory()
+        servidor.DATABASE_NAME = os.path.join(self._pasta.name, 'carga.db')
+        # Mantém a saída padrão limpa para o relatório em JSON
+        with contextlib.redirect_stdout(sys.stderr):
+            servidor.init_db()
+            servidor.iniciar_verificador()
+        self._app = servidor.app
+        self._local = threading.local()
+
+    def _cliente(self):
+        # Um test client por thread
+        cliente = getattr(self._local, 'cliente', None)
+        if cliente is None:
+            cliente = self._local.cliente = self._app.test_client()
+        return cliente
+
+    def post(self, caminho, payload):
+        return self._cliente().post(caminho, json=payload).status_code
+
+    def get(self, caminho, cabecalhos=None):
+        return self._cliente().get(caminho, headers=cabecalhos).status_code
+
+    def etag(self, caminho):
+        return self._cliente().get(caminho).headers.get('ETag')
+
+    def encerrar(self):
+        self._pasta.cleanup()
+
+
+# Código que sobe o servidor local, por modo: o Flask (WSGI, uma thread por
+# conexão) ou o servidor assíncrono de servidor_asgi.py sob o uvicorn
+CODIGO_SERVIDOR_LOCAL = {
+    'flask': (
+        "import sys, servidor\n"
+        "servidor.DATABASE_NAME = sys.argv[1]\n"
+        "servidor.init_db()\n"
+        "servidor.iniciar_verificador()\n"
+        "servidor.app.run(host='127.0.0.1', port=int(sys.argv[2]), threaded=True)\n"
+    ),
+    'asgi': (
+        "import sys, servidor, servidor_asgi, uvicorn\n"
+        "servidor.DATABASE_NAME = sys.argv[1]\n"
+        "uvicorn.run(servidor_asgi.app, host='127.0.0.1', port=int(sys.argv[2]), log_level='warning',\n"
+        "            limit_concurrency=servidor_asgi.ASGI_LIMITE_CONEXOES, backlog=servidor_asgi.ASGI_LIMITE_CONEXOES)\n"
+    ),
+}
+
+
+class AlvoHTTP:
+    """
+    Executa as requisições contra um servidor HTTP real. Sem `url`, sobe um
+    servidor local (no modo `servidor`) em um banco temporário, numa porta livre.
+    """
+
+    nome = 'http'
+
+    def __init__(self, url=None, servidor='flask'):
+        import requests
+        self._requests = requests
+        self._processo = None
+        self._pasta = None
+        self.servidor = servidor if url is None else None
+        if url is None:
+            url = self._iniciar_servidor_local()
+        self.url = url.rstrip('/')
+        self._local = threading.local()
+
+    def _iniciar_servidor_local(self):
+        self._pasta = tempfile.TemporaryDirectory()
+        with socket.socket() as s:
+            s.bind(('127.0.0.1', 0))
+            porta = s.getsockname()[1]
+        self._processo = subprocess.Popen(
+            [sys.executable, '-c', CODIGO_SERVIDOR_LOCAL[self.servidor], os.path.join(self._pasta.name, 'carga.db'), str(porta)],
+            cwd=PASTA_APLICACAO, stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
+
+        url = f'http://127.0.0.1:{porta}'
+        limite = time.monotonic() + 30
+        while time.monotonic() < limite:
+            try:
+                self._requests.get(url + '/', timeout=1)
+                return url
+            except self._requests.exceptions.ConnectionError:
+                time.sleep(0.1)
+        self.encerrar()
+        raise RuntimeError('O servidor local não respondeu a tempo')
+
+    def _sessao(self):
+        # Uma sessão (com conexões keep-alive) por thread
+        sessao = getattr(self._local, 'sessao', None)
+        if sessao is None:
+            sessao = self._local.sessao = self._requests.Session()
+        return sessao
+
+    def post(self, caminho, payload):
+        return self._sessao().post(self.url + caminho, json=payload).status_code
+
+    def get(self, caminho, cabecalhos=None):
+        return self._sessao().get(self.url + caminho, headers=cabecalhos).status_code
+
+    def etag(self, caminho):
+        return self._sessao().get(self.url + caminho).headers.get('ETag')
+
+    def encerrar(self):
+        if self._processo is not None:
+            self._processo.terminate()
+            self._processo.wait()
+        if self._pasta is not None:
+            self._pasta.cleanup()
+
+
+def percentil(valores_ordenados, p):
+    """Percentil pelo método do vizinho mais próximo, sobre uma lista já ordenada."""
+    if not valores_ordenados:
+        return None
+    indice = min(len(valores_ordenados) - 1, max(0, round(p / 100 * len(valores_ordenados)) - 1))
+    return valores_ordenados[indice]
+
+
+def medir(operacao, itens, concorrencia=1):
+    """
+    Executa `operacao(item)` para cada item, com `concorrencia` threads, e
+    retorna vazão, latências (ms) e a contagem de códigos de status HTTP.
+    """
+    latencias = []
+    status = {}
+    lock = threading.Lock()
+
+    def executar(item):
+        inicio = time.perf_counter()
+        codigo = operacao(item)
+        duracao = time.perf_counter() - inicio
+        with lock:
+            latencias.append(duracao * 1000)
+            status[str(codigo)] = status.get(str(codigo), 0) + 1
+
+    inicio = time.perf_counter()
+    if concorrencia <= 1:
+        for item in itens:
+            executar(item)
+    else:
+        with ThreadPoolExecutor(max_workers=concorrencia) as executor:
+            list(executor.map(executar, itens))
+    total = time.perf_counter() - inicio
+
+    latencias.sort()
+    return {
+        'requisicoes': len(latencias),
+        'segundos': round(total, 3),
+        'vazao_req_s': round(len(latencias) / total, 1) if total else None,
+        'latencia_ms': {
+            'p50': round(percentil(latencias, 50), 3) if latencias else None,
+            'p95': round(percentil(latencias, 95), 3) if latencias else None,
+            'p99': round(percentil(latencias, 99), 3) if latencias else None,
+            'max': round(latencias[-1], 3) if latencias else None,
+        },
+        'status': status,
+    }
+
+
+def executar_cenarios(alvo, registros, votos, concorrencia=1, repeticoes_apuracao=3):
+    """
+    Mede o registro dos eleitores, o envio dos votos, o reenvio dos mesmos votos
+    e a apuração, nessa ordem. A primeira apuração é medida sozinha, porque as
+    seguintes, sem votos novos, saem do cache do servidor (apurar_repetido) ou
+    recebem 304 com o ETag da primeira (apurar_condicional).
+    """
+    resultados = {
+        'registrar_eleitor': medir(lambda registro: alvo.post('/registrar_eleitor', registro), registros, concorrencia),
+        'votar': medir(lambda voto: alvo.post('/votar', voto), votos, concorrencia),
+        # Reenvio de todos os votos, como numa enxurrada de retentativas: todos devem ser recusados com 409
+        'votar_repetido': medir(lambda voto: alvo.post('/votar', voto), votos, concorrencia),
+    }
+
+    apuracao = medir(lambda _: alvo.get('/apurar'), range(1))
+    if votos:
+        # Normaliza pelo tamanho da urna, para comparar execuções com eleitorados diferentes
+        apuracao['segundos_por_10k_votos'] = round(apuracao['latencia_ms']['p50'] / 1000 * 10000 / len(votos), 3)
+    resultados['apurar'] = apuracao
+    resultados['apurar_repetido'] = medir(lambda _: alvo.get('/apurar'), range(repeticoes_apuracao), concorrencia)
+    etag = alvo.etag('/apurar')
+    if etag:
+        resultados['apurar_condicional'] = medir(lambda _: alvo.get('/apurar', {'If-None-Match': etag}),
+                                                 range(repeticoes_apuracao), concorrencia)
+    return resultados
@@ -0,0 +1,84 @@
+# eleitorado.py
+"""Eleitorado sintético e corpus de votos assinados para os testes de carga."""
+import base64
+import json
+import os
+import random
+
+from cryptography.hazmat.primitives import serialization
+
+from crypto_utils import ESQUEMA_RSA, gerar_chave_privada, assinar_bytes
+
+PASTA_CACHE = os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', '.cache')
+
+# Quantidade de pares de chaves distintos. Os eleitores reaproveitam as chaves
+# em rodízio: o servidor não exige chaves únicas e a geração (sobretudo RSA) é
+# a parte cara da preparação.
+TAMANHO_POOL_CHAVES = 64
+
+CANDIDATOS = ['10 - Lorena', '4 - Caetano', '12 - Vitor Hugo']
+
+
+def completar_cpf(nove_digitos):
+    """Calcula os dois dígitos verificadores e retorna o CPF de 11 dígitos."""
+    digitos = [int(d) for d in f'{nove_digitos:09d}']
+    for tamanho in (9, 10):
+        soma = sum(d * (tamanho + 1 - i) for i, d in enumerate(digitos[:tamanho]))
+        resto = soma % 11
+        digitos.append(0 if resto < 2 else 11 - resto)
+    return ''.join(map(str, digitos))
+
+
+def carregar_pool_chaves(esquema=ESQUEMA_RSA, tamanho=TAMANHO_POOL_CHAVES):
+    """
+    Retorna `tamanho` chaves privadas do esquema, geradas uma única vez e
+    guardadas em benchmarks/.cache para as execuções seguintes.
+    """
+    os.makedirs(PASTA_CACHE, exist_ok=True)
+    chaves = []
+    for indice in range(tamanho):
+        caminho = os.path.join(PASTA_CACHE, f'{esquema}_{indice}.pem')
+        if os.path.exists(caminho):
+            with open(caminho, 'rb') as f:
+                chaves.append(serialization.load_pem_private_key(f.read(), password=None))
+            continue
+        private_key = gerar_chave_privada(esquema)
+        with open(caminho, 'wb') as f:
+            f.write(private_key.private_bytes(
+                encoding=serialization.Encoding.PEM,
+                format=serialization.PrivateFormat.PKCS8,
+                encryption_algorithm=serialization.NoEncryption()
+            ))
+        chaves.append(private_key)
+    return chaves
+
+
+def gerar_eleitorado(num_eleitores, esquema=ESQUEMA_RSA, semente=2024):
+    """
+    Gera os payloads de /registrar_eleitor e de /votar para `num_eleitores`
+    eleitores com CPFs válidos e distintos. A semente torna o corpus reproduzível.
+    Retorna (registros, votos).
+    """
+    aleatorio = random.Random(semente)
+    chaves = carregar_pool_chaves(esquema)
+    pems_publicos = [
+        chave.public_key().public_bytes(
+            encoding=serialization.Encoding.PEM,
+            format=serialization.PublicFormat.SubjectPublicKeyInfo
+        ).decode('utf-8')
+        for chave in chaves
+    ]
+
+    bases = aleatorio.sample(range(1, 10 ** 9), num_eleitores)
+    registros = []
+    votos = []
+    for indice, base in enumerate(bases):
+        cpf = completar_cpf(base)
+        chave = indice % len(chaves)
+        registros.append({'cpf': cpf, 'nome': f'Eleitor Sintético {indice}',
+                          'chave_publica_pem': pems_publicos[chave]})
+
+        voto_data = {'eleitor_cpf': cpf, 'candidato_id': aleatorio.choice(CANDIDATOS)}
+        assinatura = assinar_bytes(chaves[chave], json.dumps(voto_data, sort_keys=True).encode('utf-8'))
+        votos.append({'voto_data': voto_data, 'assinatura_b64': base64.b64encode(assinatura).decode('utf-8')})
+    return registros, votos
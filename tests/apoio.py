@@ -0,0 +1,22 @@
+# apoio.py
+"""Eleitores e votos assinados, no formato das requisições do servidor, para os testes."""
+import base64
+
+from cryptography.hazmat.primitives import serialization
+
+from crypto_utils import ESQUEMA_ED25519, assinar_bytes, gerar_chave_privada, mensagem_canonica
+
+
+def gerar_eleitor(cpf, esquema=ESQUEMA_ED25519):
+    """Chave privada do eleitor e o corpo de /registrar_eleitor com a chave pública."""
+    chave = gerar_chave_privada(esquema)
+    chave_publica_pem = chave.public_key().public_bytes(
+        serialization.Encoding.PEM, serialization.PublicFormat.SubjectPublicKeyInfo).decode('ascii')
+    return chave, {'cpf': cpf, 'nome': f'Eleitor {cpf}', 'chave_publica_pem': chave_publica_pem}
+
+
+def assinar_voto(chave, cpf, candidato_id):
+    """Corpo de /votar com o voto assinado pela chave do eleitor."""
+    voto_data = {'eleitor_cpf': cpf, 'candidato_id': candidato_id}
+    assinatura = assinar_bytes(chave, mensagem_canonica(voto_data))
+    return {'voto_data': voto_data, 'assinatura_b64': base64.b64encode(assinatura).decode('ascii')}
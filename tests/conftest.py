@@ -0,0 +1,6 @@
+# conftest.py
+import os
+import sys
+
+# Os módulos da aplicação são importados pelo nome, como o servidor faz
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', 'aplicacao'))
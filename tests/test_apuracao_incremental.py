@@ -0,0 +1,82 @@
+# test_apuracao_incremental.py
+import pytest
+
+import apuracao_incremental
+import servidor
+from armazenamento import abrir_conexao
+from apuracao_incremental import ler_apuracao, processar_votos_pendentes
+from crypto_utils import ESQUEMA_ED25519, assinar_bytes, gerar_chave_privada, mensagem_canonica
+from cryptography.hazmat.primitives import serialization
+
+VOTOS = [('11144477735', 'Candidato_A'), ('52998224725', 'Candidato_B'), ('39053344705', 'Candidato_A')]
+CPF_ASSINATURA_INVALIDA = '39053344705'
+
+
+@pytest.fixture
+def urna(tmp_path, monkeypatch):
+    """Urna do servidor com votos ainda não verificados; um deles com a assinatura de outra mensagem."""
+    caminho = str(tmp_path / 'votacao_database.db')
+    monkeypatch.setattr(servidor, 'DATABASE_NAME', caminho)
+    servidor.init_db()
+    conn = abrir_conexao(caminho)
+    for cpf, candidato_id in VOTOS:
+        chave = gerar_chave_privada(ESQUEMA_ED25519)
+        chave_der = chave.public_key().public_bytes(serialization.Encoding.DER,
+                                                    serialization.PublicFormat.SubjectPublicKeyInfo)
+        mensagem = mensagem_canonica({'eleitor_cpf': cpf, 'candidato_id': candidato_id})
+        assinatura = assinar_bytes(chave, b'outra mensagem' if cpf == CPF_ASSINATURA_INVALIDA else mensagem)
+        conn.execute('INSERT INTO eleitores (cpf, nome, chave_publica_der, tipo_chave) VALUES (?, ?, ?, ?)',
+                     (cpf, f'Eleitor {cpf}', chave_der, ESQUEMA_ED25519))
+        conn.execute('INSERT INTO votos (eleitor_cpf, candidato_id, mensagem_assinada, assinatura) '
+                     'VALUES (?, ?, ?, ?)', (cpf, candidato_id, mensagem, assinatura))
+    conn.commit()
+    conn.close()
+    return caminho
+
+
+def test_verificacao_fora_da_transacao_de_escrita(urna, monkeypatch):
+    conn = abrir_conexao(urna)
+    outra = abrir_conexao(urna)
+    verificar_votos = apuracao_incremental.verificar_votos
+
+    def verificar_sem_trava(itens, **kwargs):
+        # Outro escritor consegue a trava enquanto as assinaturas são verificadas
+        assert not conn.in_transaction
+        outra.execute('BEGIN IMMEDIATE')
+        outra.rollback()
+        return verificar_votos(itens, **kwargs)
+
+    monkeypatch.setattr(apuracao_incremental, 'verificar_votos', verificar_sem_trava)
+    assert processar_votos_pendentes(conn, tamanho_lote=2) == len(VOTOS)
+
+    resultados, votos_invalidos, pendentes = ler_apuracao(conn)
+    assert resultados == {'Candidato_A': 1, 'Candidato_B': 1}
+    assert [invalido['cpf'] for invalido in votos_invalidos] == [CPF_ASSINATURA_INVALIDA]
+    assert pendentes == 0
+    conn.close()
+    outra.close()
+
+
+def test_voto_verificado_por_outro_verificador_nao_e_contado_de_novo(urna, monkeypatch):
+    conn = abrir_conexao(urna)
+    outra = abrir_conexao(urna)
+    verificar_votos = apuracao_incremental.verificar_votos
+    concorrente = {}
+
+    def verificar_com_concorrente(itens, **kwargs):
+        # Enquanto este verificador confere o lote, outro apura todos os votos
+        if 'processados' not in concorrente:
+            concorrente['processados'] = None
+            concorrente['processados'] = processar_votos_pendentes(outra)
+        return verificar_votos(itens, **kwargs)
+
+    monkeypatch.setattr(apuracao_incremental, 'verificar_votos', verificar_com_concorrente)
+    assert processar_votos_pendentes(conn) == 0
+    assert concorrente['processados'] == len(VOTOS)
+
+    resultados, votos_invalidos, pendentes = ler_apuracao(conn)
+    assert resultados == {'Candidato_A': 1, 'Candidato_B': 1}
+    assert len(votos_invalidos) == 1
+    assert pendentes == 0
+    conn.close()
+    outra.close()
@@ -0,0 +1,126 @@
+# test_apuracao_retomavel.py
+import sqlite3
+
+import pytest
+
+import servidor
+from apoio import assinar_voto, gerar_eleitor
+from apuracao_incremental import processar_votos_pendentes
+from apuracao_retomavel import auditar, avancar_apuracao, contar_pendentes, ultimo_checkpoint
+from armazenamento import abrir_conexao
+
+CPFS = ['11144477735', '52998224725', '39053344705', '86288366757', '12345678909']
+CPF_ASSINATURA_INVALIDA = '86288366757'
+CPF_NAO_REGISTRADO = '98765432100'
+
+
+@pytest.fixture
+def urna(tmp_path, monkeypatch):
+    """Urna de uma partição com cinco votos registrados, um de assinatura inválida, e um voto sem registro."""
+    caminho = str(tmp_path / 'votacao_database.db')
+    monkeypatch.setattr(servidor, 'DATABASE_NAME', caminho)
+    monkeypatch.setattr(servidor, 'APURACAO_NUM_WORKERS', 1)
+    servidor.init_db()
+    cliente = servidor.app.test_client()
+    votos = []
+    for indice, cpf in enumerate(CPFS):
+        chave, registro = gerar_eleitor(cpf)
+        assert cliente.post('/registrar_eleitor', json=registro).status_code == 201
+        voto = assinar_voto(chave, cpf, f'Candidato_{indice % 2}')
+        if cpf == CPF_ASSINATURA_INVALIDA:
+            voto['voto_data']['candidato_id'] = 'Candidato_1'
+            voto = dict(voto, assinatura_b64=assinar_voto(chave, cpf, 'Candidato_0')['assinatura_b64'])
+        votos.append(voto)
+    assert cliente.post('/votar_lote', json=votos).status_code == 200
+    # Sem o índice de admissão, o voto sem registro chega à urna como a apuração o encontraria
+    conn = sqlite3.connect(caminho)
+    conn.execute("INSERT INTO votos (eleitor_cpf, candidato_id, mensagem_assinada, assinatura) "
+                 "VALUES (?, 'Candidato_0', x'00', x'00')", (CPF_NAO_REGISTRADO,))
+    conn.commit()
+    conn.close()
+    return caminho
+
+
+@pytest.fixture
+def conn(urna):
+    conn = abrir_conexao(urna)
+    yield conn
+    conn.fechar()
+
+
+def test_apuracao_retoma_do_ultimo_checkpoint(conn):
+    paradas = iter([False, True])
+    assert avancar_apuracao(conn, votos_por_checkpoint=2, deve_parar=lambda: next(paradas)) == 2
+    checkpoint = ultimo_checkpoint(conn)
+    assert checkpoint['votos_apurados'] == 2
+    assert contar_pendentes(conn, checkpoint) == 4
+
+    assert avancar_apuracao(conn, votos_por_checkpoint=2) == 4
+    checkpoint = ultimo_checkpoint(conn)
+    assert checkpoint['votos_apurados'] == 6
+    assert checkpoint['contagem'] == {'Candidato_0': 3, 'Candidato_1': 1}
+    assert avancar_apuracao(conn, votos_por_checkpoint=2) == 0
+
+    relatorio = auditar(conn, amostra=10)
+    assert relatorio['checkpoints'] == 3
+    assert relatorio['cadeia_confere'] and relatorio['contagem_confere']
+    assert relatorio['amostra'] == {'verificados': 6, 'divergencias': []}
+
+
+def checkpoint_do_voto(conn, voto_id):
+    return conn.execute('SELECT MIN(id) FROM apuracao_checkpoints WHERE ultimo_voto_id >= ?',
+                        (voto_id,)).fetchone()[0]
+
+
+@pytest.mark.parametrize('adulteracao', [
+    "UPDATE votos SET candidato_id = 'Candidato_1' WHERE id = 3",
+    "UPDATE votos SET assinatura = x'00' WHERE id = 3",
+    'DELETE FROM votos WHERE id = 3',
+])
+def test_auditoria_detecta_a_urna_adulterada(conn, adulteracao):
+    avancar_apuracao(conn, votos_por_checkpoint=2)
+    conn.execute(adulteracao)
+    conn.commit()
+
+    relatorio = auditar(conn)
+    assert not relatorio['cadeia_confere']
+    assert relatorio['checkpoint_divergente'] == checkpoint_do_voto(conn, 3)
+
+
+def test_auditoria_detecta_a_contagem_adulterada(conn):
+    avancar_apuracao(conn, votos_por_checkpoint=2)
+    conn.execute("""UPDATE apuracao_checkpoints SET contagem_json = '{"Candidato_0": 2, "Candidato_1": 2}'
+                    WHERE id = (SELECT MAX(id) FROM apuracao_checkpoints)""")
+    conn.commit()
+
+    relatorio = auditar(conn)
+    assert relatorio['cadeia_confere']
+    assert not relatorio['contagem_confere']
+
+
+def test_auditoria_por_amostra_detecta_o_veredicto_adulterado(conn):
+    avancar_apuracao(conn, votos_por_checkpoint=10)
+    # O voto de assinatura inválida registrado como válido: a contagem e a cadeia não mudam
+    conn.execute("UPDATE apuracao_checkpoints SET invalidos_json = '[]', "
+                 """contagem_json = '{"Candidato_0": 4, "Candidato_1": 2}'""")
+    conn.commit()
+
+    relatorio = auditar(conn, amostra=10)
+    assert relatorio['cadeia_confere']
+    assert sorted(divergencia['cpf'] for divergencia in relatorio['amostra']['divergencias']) == \
+        sorted([CPF_ASSINATURA_INVALIDA, CPF_NAO_REGISTRADO])
+
+
+def test_invalidos_de_apurar_tem_o_mesmo_formato_em_todos_os_modos(urna, monkeypatch):
+    cliente = servidor.app.test_client()
+    monkeypatch.setattr(servidor, 'APURACAO_CACHE', False)
+    conn = abrir_conexao(urna)
+    processar_votos_pendentes(conn)
+    conn.fechar()
+
+    invalidos = {}
+    for modo in ('recontagem', 'incremental', 'retomavel'):
+        monkeypatch.setattr(servidor, 'APURACAO_MODO', modo)
+        invalidos[modo] = cliente.get('/apurar').get_json()['votos_invalidos_detectados']
+    assert invalidos['recontagem'] == invalidos['incremental'] == invalidos['retomavel']
+    assert [set(invalido) for invalido in invalidos['retomavel']] == [{'cpf', 'nome', 'motivo'}] * 2
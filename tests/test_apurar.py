@@ -0,0 +1,102 @@
+# test_apurar.py
+import json
+import sqlite3
+
+import pytest
+
+import servidor
+from cache_apuracao import CacheApuracao
+from crypto_utils import ESQUEMA_ED25519, assinar_bytes, gerar_chave_privada, mensagem_canonica
+from cryptography.hazmat.primitives import serialization
+
+VOTOS = [('11144477735', 'Candidato_A'), ('52998224725', 'Candidato_B'), ('39053344705', 'Candidato_A')]
+CPF_ASSINATURA_INVALIDA = '39053344705'
+
+
+@pytest.fixture
+def cliente(tmp_path, monkeypatch):
+    """Cliente de teste do servidor, sobre uma urna com um voto de assinatura inválida."""
+    caminho = str(tmp_path / 'votacao_database.db')
+    monkeypatch.setattr(servidor, 'DATABASE_NAME', caminho)
+    monkeypatch.setattr(servidor, 'APURACAO_NUM_WORKERS', 1)
+    monkeypatch.setattr(servidor, 'cache_apuracao', CacheApuracao())
+    servidor.init_db()
+    conn = sqlite3.connect(caminho)
+    for cpf, candidato_id in VOTOS:
+        chave = gerar_chave_privada(ESQUEMA_ED25519)
+        chave_der = chave.public_key().public_bytes(serialization.Encoding.DER,
+                                                    serialization.PublicFormat.SubjectPublicKeyInfo)
+        mensagem = mensagem_canonica({'eleitor_cpf': cpf, 'candidato_id': candidato_id})
+        assinatura = assinar_bytes(chave, b'outra mensagem' if cpf == CPF_ASSINATURA_INVALIDA else mensagem)
+        conn.execute('INSERT INTO eleitores (cpf, nome, chave_publica_der, tipo_chave) VALUES (?, ?, ?, ?)',
+                     (cpf, f'Eleitor {cpf}', chave_der, ESQUEMA_ED25519))
+        conn.execute('INSERT INTO votos (eleitor_cpf, candidato_id, mensagem_assinada, assinatura) '
+                     'VALUES (?, ?, ?, ?)', (cpf, candidato_id, mensagem, assinatura))
+    conn.commit()
+    conn.close()
+    return servidor.app.test_client()
+
+
+@pytest.mark.parametrize('cache', [True, False])
+def test_apuracao_sem_a_lista_de_invalidos(cliente, monkeypatch, cache):
+    monkeypatch.setattr(servidor, 'APURACAO_CACHE', cache)
+    completa = cliente.get('/apurar')
+    resumida = cliente.get('/apurar?invalidos=0')
+    assert completa.status_code == resumida.status_code == 200
+
+    assert [invalido['cpf'] for invalido in completa.get_json()['votos_invalidos_detectados']] == \
+        [CPF_ASSINATURA_INVALIDA]
+    dados = resumida.get_json()
+    assert 'votos_invalidos_detectados' not in dados
+    assert dados['total_votos_invalidos'] == 1
+    assert dados['resultado_final'] == completa.get_json()['resultado_final'] == {'Candidato_A': 1, 'Candidato_B': 1}
+
+
+def test_apuracao_resumida_revalida_pelo_etag(cliente):
+    resumida = cliente.get('/apurar?invalidos=0')
+    assert cliente.get('/apurar?invalidos=0', headers={'If-None-Match': resumida.headers['ETag']}).status_code == 304
+
+
+def test_auditoria_da_recontagem_localiza_os_invalidos_uma_vez(cliente, monkeypatch):
+    # Um voto sem eleitor registrado, para que a listagem tenha duas páginas
+    conn = sqlite3.connect(servidor.DATABASE_NAME)
+    conn.execute("INSERT INTO votos (eleitor_cpf, candidato_id, mensagem_assinada, assinatura) "
+                 "VALUES ('86288366757', 'Candidato_A', x'00', x'00')")
+    conn.commit()
+    conn.close()
+    localizar_invalidos = servidor.localizar_invalidos
+    chamadas = []
+
+    def localizar_contando(urna, votos_invalidos):
+        chamadas.append(len(votos_invalidos))
+        return localizar_invalidos(urna, votos_invalidos)
+
+    monkeypatch.setattr(servidor, 'localizar_invalidos', localizar_contando)
+    assert cliente.get('/apurar').status_code == 200
+    # Sem pedido de auditoria, a recontagem não procura os votos inválidos na urna
+    assert chamadas == []
+
+    paginas = []
+    cursor = None
+    while True:
+        parametros = {'limite': 1, **({'cursor': cursor} if cursor else {})}
+        linhas = [json.loads(linha) for linha in
+                  cliente.get('/apurar/invalidos', query_string=parametros).get_data(as_text=True).splitlines()]
+        if not linhas:
+            break
+        paginas.append([linha['cpf'] for linha in linhas])
+        cursor = linhas[-1]['cursor']
+    assert paginas == [[CPF_ASSINATURA_INVALIDA], ['86288366757']]
+    assert chamadas == [2]
+
+
+def test_auditoria_da_recontagem_sem_cache_e_recusada(cliente, monkeypatch):
+    monkeypatch.setattr(servidor, 'APURACAO_CACHE', False)
+    recontagem = servidor.recontagem
+    recontagens = []
+    monkeypatch.setattr(servidor, 'recontagem', lambda: recontagens.append(1) or recontagem())
+
+    resposta = cliente.get('/apurar/invalidos')
+    assert resposta.status_code == 409
+    assert 'incremental' in resposta.get_json()['erro']
+    assert recontagens == []
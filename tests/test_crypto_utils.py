@@ -0,0 +1,32 @@
+# test_crypto_utils.py
+import pytest
+from cryptography.hazmat.primitives import hashes, serialization
+from cryptography.hazmat.primitives.asymmetric import padding, rsa
+
+from crypto_utils import (ESQUEMA_RSA, gerar_chave_privada, identificar_esquema, validar_chave_publica_pem,
+                          verificar_com_chave)
+
+
+def pem_publica(chave):
+    return chave.public_key().public_bytes(serialization.Encoding.PEM,
+                                           serialization.PublicFormat.SubjectPublicKeyInfo).decode('ascii')
+
+
+def test_chave_rsa_de_2048_bits():
+    chave = gerar_chave_privada(ESQUEMA_RSA)
+    assert identificar_esquema(chave) == ESQUEMA_RSA
+    assert validar_chave_publica_pem(pem_publica(chave))[1] == ESQUEMA_RSA
+
+
+@pytest.mark.parametrize('tamanho', [1024, 3072])
+def test_chave_rsa_de_outro_tamanho_e_recusada(tamanho):
+    chave = rsa.generate_private_key(public_exponent=65537, key_size=tamanho)
+    with pytest.raises(ValueError, match=f'{tamanho} bits'):
+        identificar_esquema(chave)
+    with pytest.raises(ValueError):
+        validar_chave_publica_pem(pem_publica(chave))
+
+    # Nem uma assinatura correta é aceita com o rótulo 'rsa-2048'
+    mensagem = b'{"candidato_id": "Candidato_A"}'
+    assinatura = chave.sign(mensagem, padding.PKCS1v15(), hashes.SHA256())
+    assert not verificar_com_chave(assinatura, mensagem, chave.public_key(), ESQUEMA_RSA)
@@ -0,0 +1,62 @@
+# test_esquema_urna.py
+import sqlite3
+
+import pytest
+
+import migracao_cpf_normalizado
+import migracao_votos_binarios
+import servidor
+
+
+def criar_urna_antiga(caminho):
+    """Urna no formato anterior ao armazenamento binário, com o mesmo CPF em duas formas."""
+    conn = sqlite3.connect(caminho)
+    conn.execute('CREATE TABLE eleitores (cpf TEXT PRIMARY KEY, nome TEXT NOT NULL, chave_publica_pem TEXT NOT NULL)')
+    conn.execute('CREATE TABLE votos (id INTEGER PRIMARY KEY AUTOINCREMENT, eleitor_cpf TEXT NOT NULL UNIQUE, '
+                 'payload_voto_json TEXT NOT NULL)')
+    conn.executemany('INSERT INTO eleitores VALUES (?, ?, ?)',
+                     [('033.206.881-11', 'Formatado', 'chave'), ('03320688111', 'Só dígitos', 'chave')])
+    conn.commit()
+    conn.close()
+
+
+@pytest.fixture
+def urna(tmp_path, monkeypatch):
+    caminho = str(tmp_path / 'votacao_database.db')
+    monkeypatch.setattr(servidor, 'DATABASE_NAME', caminho)
+    return caminho
+
+
+def versao(caminho):
+    conn = sqlite3.connect(caminho)
+    try:
+        return conn.execute('PRAGMA user_version').fetchone()[0]
+    finally:
+        conn.close()
+
+
+def test_urna_nova_recebe_a_versao(urna):
+    servidor.init_db()
+    assert versao(urna) == servidor.VERSAO_ESQUEMA
+
+
+def test_migracao_binaria_nao_dispensa_a_conferencia_dos_cpfs(urna):
+    criar_urna_antiga(urna)
+    assert migracao_votos_binarios.migrar(urna) is not None
+    assert versao(urna) == 0
+
+    with pytest.raises(ValueError, match='migracao_cpf_normalizado'):
+        servidor.init_db()
+    assert versao(urna) == 0
+
+    migracao_cpf_normalizado.migrar(urna)
+    servidor.init_db()
+    assert versao(urna) == servidor.VERSAO_ESQUEMA
+
+
+def test_urna_de_versao_mais_nova_e_recusada(urna):
+    conn = sqlite3.connect(urna)
+    conn.execute(f'PRAGMA user_version = {servidor.VERSAO_ESQUEMA + 1}')
+    conn.close()
+    with pytest.raises(ValueError, match='mais nova'):
+        servidor.init_db()
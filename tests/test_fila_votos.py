@@ -0,0 +1,158 @@
+# test_fila_votos.py
+import os
+import sqlite3
+
+import pytest
+
+import fila_votos
+import servidor
+from apoio import assinar_voto, gerar_eleitor
+from fila_votos import FilaVotos, LogCorrompidoError, caminho_segmento, codificar_registro, listar_segmentos
+
+VOTOS = [('11144477735', 'Candidato_A', b'{"a": 1}', b'assinatura-1'),
+         ('52998224725', 'Candidato_B', b'{"b": 2}', b'assinatura-2'),
+         ('39053344705', 'Candidato_A', b'{"c": 3}', b'assinatura-3')]
+
+
+@pytest.fixture
+def urna(tmp_path, monkeypatch):
+    caminho = str(tmp_path / 'votacao_database.db')
+    monkeypatch.setattr(servidor, 'DATABASE_NAME', caminho)
+    servidor.init_db()
+    return caminho
+
+
+@pytest.fixture
+def filas():
+    """Filas iniciadas no teste, encerradas no fim mesmo se o teste falhar."""
+    iniciadas = []
+
+    def iniciar(caminho):
+        fila = FilaVotos(caminho)
+        fila.iniciar()
+        iniciadas.append(fila)
+        return fila
+
+    yield iniciar
+    for fila in iniciadas:
+        fila.encerrar()
+
+
+def gravar_segmento(caminho_banco, numero, dados):
+    with open(caminho_segmento(caminho_banco, numero), 'wb') as f:
+        f.write(dados)
+
+
+def votos_na_urna(caminho):
+    conn = sqlite3.connect(caminho)
+    try:
+        return [row[0] for row in conn.execute('SELECT eleitor_cpf FROM votos ORDER BY id')]
+    finally:
+        conn.close()
+
+
+def test_registro_incompleto_no_fim_do_ultimo_segmento_e_descartado(urna, filas):
+    completos = codificar_registro(VOTOS[0]) + codificar_registro(VOTOS[1])
+    # Queda no meio da gravação do terceiro voto, que nunca foi confirmado ao eleitor
+    gravar_segmento(urna, 1, completos + codificar_registro(VOTOS[2])[:-5])
+
+    fila = filas(urna)
+    assert fila.votos_recuperados == 2
+    assert votos_na_urna(urna) == [VOTOS[0][0], VOTOS[1][0]]
+    # O log recomeça num segmento novo, e o antigo, já aplicado, é apagado
+    assert listar_segmentos(urna) == [2]
+
+
+def test_registro_corrompido_fora_do_ultimo_segmento_interrompe_a_inicializacao(urna):
+    registro = bytearray(codificar_registro(VOTOS[1]))
+    registro[-1] ^= 0xFF
+    gravar_segmento(urna, 1, codificar_registro(VOTOS[0]) + bytes(registro))
+    gravar_segmento(urna, 2, codificar_registro(VOTOS[2]))
+
+    fila = FilaVotos(urna)
+    with pytest.raises(LogCorrompidoError, match='corrompido'):
+        fila.iniciar()
+    fila._conn.fechar()
+    # Nada depois do registro corrompido é aplicado, e o log fica para ser examinado
+    assert votos_na_urna(urna) == [VOTOS[0][0]]
+    assert listar_segmentos(urna) == [1, 2]
+
+
+def test_reaplicacao_depois_de_drenar_nao_insere_de_novo(urna, filas, monkeypatch):
+    gravar_segmento(urna, 1, b''.join(codificar_registro(voto) for voto in VOTOS))
+
+    # Queda depois de a drenagem confirmar os votos e o ponto de aplicação, mas
+    # antes de o progresso passar ao segmento seguinte e de o log ser apagado
+    def cair(self, segmento, posicao):
+        raise RuntimeError('queda')
+
+    fila = FilaVotos(urna)
+    monkeypatch.setattr(FilaVotos, '_avancar_progresso', cair)
+    with pytest.raises(RuntimeError, match='queda'):
+        fila.iniciar()
+    fila._conn.fechar()
+    monkeypatch.undo()
+    assert votos_na_urna(urna) == [voto[0] for voto in VOTOS]
+    assert listar_segmentos(urna) == [1, 2]
+
+    conflitos = fila_votos.metrica_conflitos.valor()
+    fila = filas(urna)
+    assert fila.votos_recuperados == 0
+    assert fila_votos.metrica_conflitos.valor() == conflitos
+    assert votos_na_urna(urna) == [voto[0] for voto in VOTOS]
+    assert listar_segmentos(urna) == [3]
+
+
+def test_votos_drenados_nao_sao_reaplicados_depois_de_reiniciar(urna, filas):
+    fila = filas(urna)
+    for voto in VOTOS:
+        assert fila.reservar(voto[0])
+    fila.anexar(VOTOS)
+    fila.encerrar()
+    # O segmento drenado continua no disco até a próxima inicialização
+    assert os.path.getsize(caminho_segmento(urna, 1)) > 0
+
+    fila = filas(urna)
+    assert fila.votos_recuperados == 0
+    assert votos_na_urna(urna) == [voto[0] for voto in VOTOS]
+
+
+def test_reserva_recusa_o_segundo_voto_do_mesmo_cpf(urna, filas):
+    fila = filas(urna)
+    assert fila.reservar(VOTOS[0][0])
+    assert not fila.reservar(VOTOS[0][0])
+    assert fila.reservar(VOTOS[1][0])
+
+    # Um voto não gravado no log libera o CPF para uma nova tentativa
+    fila.liberar([VOTOS[0][0]])
+    assert fila.reservar(VOTOS[0][0])
+
+
+@pytest.fixture
+def cliente_fila(urna, monkeypatch):
+    """Cliente de teste do servidor no modo de ingestão 'fila'."""
+    monkeypatch.setattr(servidor, 'INGESTAO_MODO', 'fila')
+    monkeypatch.setattr(servidor, 'filas', [])
+    servidor.iniciar_filas()
+    yield servidor.app.test_client()
+    servidor.encerrar_filas()
+
+
+def test_lote_na_fila_recusa_o_segundo_voto_do_mesmo_cpf(urna, cliente_fila):
+    chaves = {}
+    for cpf, _, _, _ in VOTOS[:2]:
+        chaves[cpf], registro = gerar_eleitor(cpf)
+        assert cliente_fila.post('/registrar_eleitor', json=registro).status_code == 201
+
+    primeiro, segundo = VOTOS[0][0], VOTOS[1][0]
+    resposta = cliente_fila.post('/votar_lote', json=[
+        assinar_voto(chaves[primeiro], primeiro, 'Candidato_A'),
+        assinar_voto(chaves[primeiro], primeiro, 'Candidato_B'),
+        assinar_voto(chaves[segundo], segundo, 'Candidato_B'),
+    ])
+    assert [item['status'] for item in resposta.get_json()['itens']] == ['ok', 'ja_votou', 'ok']
+
+    # Depois de drenado, o CPF volta a ser recusado pela urna, não pela reserva
+    servidor.encerrar_filas()
+    assert votos_na_urna(urna) == [primeiro, segundo]
+    assert not servidor.filas[0]._reservados
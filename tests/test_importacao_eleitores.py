@@ -0,0 +1,63 @@
+# test_importacao_eleitores.py
+import json
+import os
+import sqlite3
+import sys
+
+import pytest
+
+import importacao_eleitores
+import servidor
+from apoio import gerar_eleitor
+from urna import caminhos_particoes, indice_particao
+
+CPFS = ['11144477735', '52998224725', '39053344705', '86288366757', '12345678909', '98765432100']
+
+
+@pytest.fixture
+def arquivo(tmp_path):
+    caminho = tmp_path / 'eleitores.jsonl'
+    caminho.write_text(''.join(json.dumps(gerar_eleitor(cpf)[1]) + '\n' for cpf in CPFS), encoding='utf-8')
+    return str(caminho)
+
+
+def importar(monkeypatch, arquivo, banco, particoes):
+    monkeypatch.setattr(sys, 'argv', ['importacao_eleitores.py', arquivo, '--banco', banco,
+                                      '--particoes', str(particoes)])
+    importacao_eleitores.main()
+
+
+def test_importacao_cria_uma_urna_particionada(tmp_path, monkeypatch, arquivo):
+    banco = str(tmp_path / 'votacao_database.db')
+    importar(monkeypatch, arquivo, banco, 2)
+
+    for indice, caminho in enumerate(caminhos_particoes(banco, 2)):
+        conn = sqlite3.connect(caminho)
+        cpfs = {row[0] for row in conn.execute('SELECT cpf FROM eleitores')}
+        conn.close()
+        assert cpfs == {cpf for cpf in CPFS if indice_particao(cpf, 2) == indice}
+
+    # O servidor abre a urna criada pela importação com o mesmo número de partições
+    monkeypatch.setattr(servidor, 'DATABASE_NAME', banco)
+    monkeypatch.setattr(servidor, 'URNA_NUM_PARTICOES', 2)
+    servidor.init_db()
+    resposta = servidor.app.test_client().post('/registrar_eleitor', json=gerar_eleitor(CPFS[0])[1])
+    assert resposta.status_code == 409
+
+
+@pytest.mark.parametrize('particoes', [1, 3])
+def test_numero_de_particoes_diferente_do_da_urna_e_recusado(tmp_path, monkeypatch, arquivo, particoes):
+    banco = str(tmp_path / 'votacao_database.db')
+    monkeypatch.setattr(servidor, 'DATABASE_NAME', banco)
+    monkeypatch.setattr(servidor, 'URNA_NUM_PARTICOES', 2)
+    servidor.init_db()
+    arquivos = sorted(os.listdir(tmp_path))
+
+    with pytest.raises(SystemExit, match='partiç'):
+        importar(monkeypatch, arquivo, banco, particoes)
+    # Nenhum arquivo de partição é criado e a urna existente não recebe eleitores
+    assert sorted(os.listdir(tmp_path)) == arquivos
+    for caminho in caminhos_particoes(banco, 2):
+        conn = sqlite3.connect(caminho)
+        assert conn.execute('SELECT COUNT(*) FROM eleitores').fetchone()[0] == 0
+        conn.close()
@@ -0,0 +1,35 @@
+# test_indice_admissao.py
+import pytest
+
+import indice_admissao
+from indice_admissao import ConjuntoCompacto, IndiceAdmissao
+
+
+@pytest.fixture
+def limite_pequeno(monkeypatch):
+    monkeypatch.setattr(indice_admissao, 'LIMITE_RECENTES', 8)
+
+
+def test_fusao_em_base_vazia_mantem_todos_os_valores(limite_pequeno):
+    conjunto = ConjuntoCompacto()
+    valores = [12345678900 + i for i in range(10)]
+    for valor in valores:
+        conjunto.adicionar(valor)
+    assert len(conjunto) == len(valores)
+    assert all(valor in conjunto for valor in valores)
+
+
+def test_fusao_em_base_existente_ignora_repetidos(limite_pequeno):
+    conjunto = ConjuntoCompacto([3, 1, 2])
+    for valor in range(2, 12):
+        conjunto.adicionar(valor)
+    assert len(conjunto) == 11
+    assert all(valor in conjunto for valor in range(1, 12))
+
+
+def test_indice_novo_admite_todos_os_registrados(limite_pequeno):
+    indice = IndiceAdmissao()
+    cpfs = [f'{12345678900 + i:011d}' for i in range(10)]
+    for cpf in cpfs:
+        indice.registrar(cpf)
+    assert [indice.admissao(cpf) for cpf in cpfs] == ['registrado'] * len(cpfs)
@@ -0,0 +1,107 @@
+# test_migracao_votos_binarios.py
+import base64
+import json
+import sqlite3
+
+import pytest
+
+import migracao_votos_binarios
+import servidor
+from apoio import assinar_voto, gerar_eleitor
+from crypto_utils import ESQUEMA_ED25519, ESQUEMA_RSA, carregar_chave_publica_der, mensagem_canonica
+
+CPFS = ['11144477735', '52998224725']
+CPF_CHAVE_INVALIDA = '39053344705'
+
+
+@pytest.fixture
+def urna_antiga(tmp_path, monkeypatch):
+    """Urna no formato JSON, com dois votos válidos, um payload malformado e uma chave inválida."""
+    caminho = str(tmp_path / 'votacao_database.db')
+    monkeypatch.setattr(servidor, 'DATABASE_NAME', caminho)
+    monkeypatch.setattr(servidor, 'APURACAO_NUM_WORKERS', 1)
+    conn = sqlite3.connect(caminho)
+    conn.execute('CREATE TABLE eleitores (cpf TEXT PRIMARY KEY, nome TEXT NOT NULL, chave_publica_pem TEXT NOT NULL)')
+    conn.execute('CREATE TABLE votos (id INTEGER PRIMARY KEY AUTOINCREMENT, eleitor_cpf TEXT NOT NULL UNIQUE, '
+                 'payload_voto_json TEXT NOT NULL)')
+    payloads = {}
+    for cpf in CPFS:
+        chave, registro = gerar_eleitor(cpf)
+        conn.execute('INSERT INTO eleitores VALUES (?, ?, ?)', (cpf, registro['nome'], registro['chave_publica_pem']))
+        payloads[cpf] = assinar_voto(chave, cpf, 'Candidato_A')
+    conn.execute('INSERT INTO eleitores VALUES (?, ?, ?)', (CPF_CHAVE_INVALIDA, 'Chave inválida', 'não é PEM'))
+    # Ids com lacunas, para conferir que são preservados
+    conn.execute('INSERT INTO votos (id, eleitor_cpf, payload_voto_json) VALUES (?, ?, ?)',
+                 (3, CPFS[0], json.dumps(payloads[CPFS[0]])))
+    conn.execute('INSERT INTO votos (id, eleitor_cpf, payload_voto_json) VALUES (?, ?, ?)',
+                 (7, CPFS[1], json.dumps(payloads[CPFS[1]])))
+    conn.execute('INSERT INTO votos (id, eleitor_cpf, payload_voto_json) VALUES (?, ?, ?)',
+                 (9, CPF_CHAVE_INVALIDA, '{payload truncado'))
+    conn.commit()
+    conn.close()
+    return caminho, payloads
+
+
+def test_migracao_converte_e_preserva_os_votos(urna_antiga):
+    caminho, payloads = urna_antiga
+    assert migracao_votos_binarios.migrar(caminho) == {'eleitores_migrados': 3, 'votos_migrados': 3}
+
+    conn = sqlite3.connect(caminho)
+    conn.row_factory = sqlite3.Row
+    votos = {row['id']: row for row in conn.execute('SELECT * FROM votos')}
+    eleitores = {row['cpf']: row for row in conn.execute('SELECT * FROM eleitores')}
+    conn.close()
+
+    assert sorted(votos) == [3, 7, 9]
+    for voto_id, cpf in ((3, CPFS[0]), (7, CPFS[1])):
+        payload = payloads[cpf]
+        assert votos[voto_id]['eleitor_cpf'] == cpf
+        assert votos[voto_id]['candidato_id'] == 'Candidato_A'
+        assert votos[voto_id]['mensagem_assinada'] == mensagem_canonica(payload['voto_data'])
+        assert votos[voto_id]['assinatura'] == base64.b64decode(payload['assinatura_b64'])
+        assert votos[voto_id]['verificado'] == 0
+        assert eleitores[cpf]['tipo_chave'] == ESQUEMA_ED25519
+        carregar_chave_publica_der(eleitores[cpf]['chave_publica_der'])
+
+    # O payload malformado e a chave inválida ficam na urna, para aparecer como inválidos
+    assert votos[9]['mensagem_assinada'] == b'{payload truncado'
+    assert votos[9]['assinatura'] == b''
+    assert eleitores[CPF_CHAVE_INVALIDA]['chave_publica_der'] == 'não é PEM'.encode('utf-8')
+    assert eleitores[CPF_CHAVE_INVALIDA]['tipo_chave'] == ESQUEMA_RSA
+
+    # A urna migrada é aberta pelo servidor e apurada com os mesmos votos
+    servidor.init_db()
+    resultado = servidor.recontagem()
+    assert resultado['resultado_final'] == {'Candidato_A': 2}
+    assert [invalido['cpf'] for invalido in resultado['votos_invalidos_detectados']] == [CPF_CHAVE_INVALIDA]
+
+    assert migracao_votos_binarios.migrar(caminho) is None
+
+
+def test_falha_na_migracao_nao_altera_a_urna(urna_antiga, monkeypatch):
+    caminho, _ = urna_antiga
+
+    def falhar(row, tem_verificado):
+        raise RuntimeError('falha no meio da migração')
+
+    monkeypatch.setattr(migracao_votos_binarios, 'converter_voto', falhar)
+    with pytest.raises(RuntimeError):
+        migracao_votos_binarios.migrar(caminho)
+
+    conn = sqlite3.connect(caminho)
+    tabelas = {row[0] for row in conn.execute("SELECT name FROM sqlite_master WHERE type = 'table'")}
+    colunas_votos = migracao_votos_binarios.colunas(conn, 'votos')
+    votos = conn.execute('SELECT COUNT(*) FROM votos').fetchone()[0]
+    conn.close()
+    assert 'votos_antigo' not in tabelas and 'eleitores_antigo' not in tabelas
+    assert 'payload_voto_json' in colunas_votos
+    assert votos == 3
+
+
+def test_banco_em_formato_desconhecido_e_recusado(tmp_path):
+    caminho = str(tmp_path / 'outro.db')
+    conn = sqlite3.connect(caminho)
+    conn.execute('CREATE TABLE votos (id INTEGER PRIMARY KEY, dados TEXT)')
+    conn.close()
+    with pytest.raises(ValueError, match='formato esperado'):
+        migracao_votos_binarios.migrar(caminho)
@@ -0,0 +1,119 @@
+# test_reparticionar_urna.py
+import os
+import sqlite3
+
+import pytest
+
+import reparticionar_urna
+import servidor
+from apoio import assinar_voto, gerar_eleitor
+from urna import caminhos_particoes, indice_particao
+
+CPFS = ['11144477735', '52998224725', '39053344705', '86288366757', '12345678909', '98765432100']
+CPF_SEM_VOTO = CPFS[-1]
+
+
+@pytest.fixture
+def urna(tmp_path, monkeypatch):
+    """Urna de uma partição, com todos os eleitores registrados e todos menos um tendo votado."""
+    caminho = str(tmp_path / 'votacao_database.db')
+    monkeypatch.setattr(servidor, 'DATABASE_NAME', caminho)
+    monkeypatch.setattr(servidor, 'URNA_NUM_PARTICOES', 1)
+    monkeypatch.setattr(servidor, 'APURACAO_NUM_WORKERS', 1)
+    servidor.init_db()
+    cliente = servidor.app.test_client()
+    votos = []
+    for indice, cpf in enumerate(CPFS):
+        chave, registro = gerar_eleitor(cpf)
+        assert cliente.post('/registrar_eleitor', json=registro).status_code == 201
+        if cpf != CPF_SEM_VOTO:
+            votos.append(assinar_voto(chave, cpf, f'Candidato_{indice % 2}'))
+    assert cliente.post('/votar_lote', json=votos).status_code == 200
+    conn = sqlite3.connect(caminho)
+    conn.execute("INSERT INTO importacao_progresso (id_importacao, ultima_linha) VALUES ('eleitores.ndjson', 42)")
+    conn.commit()
+    conn.close()
+    return caminho
+
+
+def ler_particoes(caminho_base, num_particoes):
+    """[(eleitores, votos)] de cada partição, com os votos na ordem dos ids."""
+    particoes = []
+    for caminho in caminhos_particoes(caminho_base, num_particoes):
+        conn = sqlite3.connect(caminho)
+        eleitores = {row[0] for row in conn.execute('SELECT cpf FROM eleitores')}
+        votos = conn.execute('SELECT eleitor_cpf, candidato_id, verificado FROM votos ORDER BY id').fetchall()
+        particoes.append((eleitores, votos))
+        conn.close()
+    return particoes
+
+
+def test_reparticionar_e_reunir_preserva_a_urna(urna, tmp_path, monkeypatch):
+    apuracao = servidor.recontagem()
+    destino = str(tmp_path / 'particionada.db')
+    resumo = reparticionar_urna.reparticionar(urna, 1, destino, 3)
+    assert sum(resumo['eleitores_por_particao']) == len(CPFS)
+    assert sum(resumo['votos_por_particao']) == len(CPFS) - 1
+
+    # Cada eleitor e o seu voto ficam na partição que o servidor consulta para o CPF
+    for indice, (eleitores, votos) in enumerate(ler_particoes(destino, 3)):
+        assert all(indice_particao(cpf, 3) == indice for cpf in eleitores)
+        assert {voto[0] for voto in votos} <= eleitores
+        assert all(voto[2] == 0 for voto in votos)
+
+    conn = sqlite3.connect(caminhos_particoes(destino, 3)[0])
+    assert conn.execute('SELECT id_importacao, ultima_linha FROM importacao_progresso').fetchall() == \
+        [('eleitores.ndjson', 42)]
+    conn.close()
+
+    # O servidor abre a urna particionada e chega à mesma apuração
+    monkeypatch.setattr(servidor, 'DATABASE_NAME', destino)
+    monkeypatch.setattr(servidor, 'URNA_NUM_PARTICOES', 3)
+    servidor.init_db()
+    assert servidor.recontagem()['resultado_final'] == apuracao['resultado_final']
+
+    reunida = str(tmp_path / 'reunida.db')
+    reparticionar_urna.reparticionar(destino, 3, reunida, 1)
+    [(eleitores, votos)] = ler_particoes(reunida, 1)
+    [(eleitores_originais, votos_originais)] = ler_particoes(urna, 1)
+    assert eleitores == eleitores_originais
+    assert sorted(votos) == sorted(votos_originais)
+
+
+def test_destino_existente_e_recusado(urna, tmp_path):
+    destino = str(tmp_path / 'particionada.db')
+    existente = caminhos_particoes(destino, 2)[1]
+    open(existente, 'wb').close()
+    with pytest.raises(ValueError, match='já existe'):
+        reparticionar_urna.reparticionar(urna, 1, destino, 2)
+    assert not os.path.exists(caminhos_particoes(destino, 2)[0])
+
+
+def test_numero_de_particoes_da_origem_errado_e_recusado(urna, tmp_path):
+    destino = str(tmp_path / 'particionada.db')
+    reparticionar_urna.reparticionar(urna, 1, destino, 3)
+    # Lidas como as duas primeiras de duas partições, os eleitores da terceira se perderiam
+    os.remove(caminhos_particoes(destino, 3)[2])
+    os.rename(caminhos_particoes(destino, 3)[0], caminhos_particoes(destino, 2)[0])
+    os.rename(caminhos_particoes(destino, 3)[1], caminhos_particoes(destino, 2)[1])
+
+    nova = str(tmp_path / 'nova.db')
+    with pytest.raises(ValueError, match='partição 0 de 3'):
+        reparticionar_urna.reparticionar(destino, 2, nova, 1)
+    assert not os.path.exists(nova)
+
+
+def test_falha_na_copia_apaga_o_destino(urna, tmp_path, monkeypatch):
+    monkeypatch.setattr(reparticionar_urna, 'TAMANHO_BLOCO', 1)
+    destino = str(tmp_path / 'particionada.db')
+    gravar = reparticionar_urna._Gravador._gravar
+
+    def falhar_nos_votos(self, indice):
+        if 'INTO votos' in self.sql:
+            raise sqlite3.OperationalError('disco cheio')
+        gravar(self, indice)
+
+    monkeypatch.setattr(reparticionar_urna._Gravador, '_gravar', falhar_nos_votos)
+    with pytest.raises(sqlite3.OperationalError):
+        reparticionar_urna.reparticionar(urna, 1, destino, 2)
+    assert [nome for nome in os.listdir(tmp_path) if nome.startswith('particionada')] == []
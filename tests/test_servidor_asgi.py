@@ -0,0 +1,45 @@
+# test_servidor_asgi.py
+import asyncio
+import threading
+
+import pytest
+
+pytest.importorskip('starlette')
+
+from servidor_asgi import ExecutorLimitado, ExecutorSobrecarregadoError
+
+
+def test_tarefa_cancelada_continua_contando_ate_a_thread_terminar():
+    executor = ExecutorLimitado('teste', threads=1, fila=1)
+    liberar = threading.Event()
+
+    async def cenario():
+        ocupada = asyncio.ensure_future(executor.executar(liberar.wait))
+        na_fila = asyncio.ensure_future(executor.executar(lambda: 'na fila'))
+        await asyncio.sleep(0.05)
+        assert executor.pendentes == 2
+
+        # Cancelada ainda na fila, a tarefa libera a vaga na hora
+        na_fila.cancel()
+        await asyncio.sleep(0.05)
+        assert executor.pendentes == 1
+
+        # Com o cliente desconectado, a thread continua ocupada e a vaga também
+        ocupada.cancel()
+        await asyncio.sleep(0.05)
+        assert executor.pendentes == 1
+        seguinte = asyncio.ensure_future(executor.executar(lambda: 'ok'))
+        await asyncio.sleep(0)
+        with pytest.raises(ExecutorSobrecarregadoError):
+            await executor.executar(lambda: None)
+
+        liberar.set()
+        assert await seguinte == 'ok'
+        await asyncio.sleep(0.05)
+        assert executor.pendentes == 0
+
+    try:
+        asyncio.run(cenario())
+    finally:
+        liberar.set()
+        executor.encerrar()
@@ -0,0 +1,81 @@
+# test_snapshot_urna.py
+import hashlib
+import shutil
+import sqlite3
+
+import pytest
+
+import apuracao_offline
+import servidor
+import snapshot_urna
+from crypto_utils import ESQUEMA_ED25519, assinar_bytes, gerar_chave_privada, mensagem_canonica
+from cryptography.hazmat.primitives import serialization
+from snapshot_urna import SnapshotInvalidoError
+
+VOTOS = [('11144477735', 'Alice', 'Candidato_A'), ('52998224725', 'Bruno', 'Candidato_B'),
+         ('39053344705', 'Carla', 'Candidato_A')]
+
+
+def criar_urna(caminho, candidatos=VOTOS):
+    """Urna do servidor com um voto assinado de cada eleitor."""
+    servidor.init_db()
+    conn = sqlite3.connect(caminho)
+    for cpf, nome, candidato_id in candidatos:
+        chave = gerar_chave_privada(ESQUEMA_ED25519)
+        chave_der = chave.public_key().public_bytes(serialization.Encoding.DER,
+                                                    serialization.PublicFormat.SubjectPublicKeyInfo)
+        mensagem = mensagem_canonica({'eleitor_cpf': cpf, 'candidato_id': candidato_id})
+        conn.execute('INSERT INTO eleitores (cpf, nome, chave_publica_der, tipo_chave) VALUES (?, ?, ?, ?)',
+                     (cpf, nome, chave_der, ESQUEMA_ED25519))
+        conn.execute('INSERT INTO votos (eleitor_cpf, candidato_id, mensagem_assinada, assinatura) '
+                     'VALUES (?, ?, ?, ?)', (cpf, candidato_id, mensagem, assinar_bytes(chave, mensagem)))
+    conn.commit()
+    conn.close()
+
+
+@pytest.fixture
+def urna(tmp_path, monkeypatch):
+    caminho = str(tmp_path / 'votacao_database.db')
+    monkeypatch.setattr(servidor, 'DATABASE_NAME', caminho)
+    criar_urna(caminho)
+    return caminho
+
+
+def test_digest_da_exportacao_cobre_o_arquivo(urna, tmp_path, monkeypatch):
+    # Blocos pequenos: o digest é calculado em várias leituras
+    monkeypatch.setattr(snapshot_urna, 'TAMANHO_BLOCO_DIGEST', 64)
+    caminho = str(tmp_path / 'urna.snapshot')
+    resumo = snapshot_urna.exportar(urna, caminho)
+
+    with open(caminho, 'rb') as f:
+        conteudo = f.read()
+    assert resumo['sha256'] == hashlib.sha256(conteudo[:-snapshot_urna.TAMANHO_DIGEST]).hexdigest()
+    assert conteudo[-snapshot_urna.TAMANHO_DIGEST:].hex() == resumo['sha256']
+
+
+def test_apuracao_do_snapshot(urna, tmp_path):
+    caminho = str(tmp_path / 'urna.snapshot')
+    resumo = snapshot_urna.exportar(urna, caminho)
+
+    resultado, _ = apuracao_offline.apurar_snapshot(caminho, num_workers=2, sha256_esperado=resumo['sha256'],
+                                                    tamanho_intervalo=1)
+    assert resultado['resultado_final'] == {'Candidato_A': 2, 'Candidato_B': 1}
+    assert resultado['votos_invalidos_detectados'] == []
+
+
+def test_snapshot_trocado_depois_da_conferencia_nao_e_apurado(urna, tmp_path, monkeypatch):
+    caminho = str(tmp_path / 'urna.snapshot')
+    digest = snapshot_urna.exportar(urna, caminho)['sha256']
+
+    # Outro snapshot válido, com o próprio digest, no lugar do conferido
+    outra_urna = str(tmp_path / 'outra_urna.db')
+    monkeypatch.setattr(servidor, 'DATABASE_NAME', outra_urna)
+    criar_urna(outra_urna, [(cpf, nome, 'Candidato_B') for cpf, nome, _ in VOTOS])
+    snapshot_urna.exportar(outra_urna, str(tmp_path / 'outro.snapshot'))
+    shutil.move(str(tmp_path / 'outro.snapshot'), caminho)
+
+    monkeypatch.setattr(apuracao_offline, '_snapshot', None)
+    monkeypatch.setattr(apuracao_offline, '_erro_abertura', None)
+    apuracao_offline._abrir_snapshot(caminho, digest)
+    with pytest.raises(SnapshotInvalidoError, match='alterado'):
+        apuracao_offline.apurar_intervalo((0, len(VOTOS)))
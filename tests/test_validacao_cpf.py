@@ -0,0 +1,32 @@
+# test_validacao_cpf.py
+import pytest
+
+import validacao_cpf
+from validacao_cpf import normalizar_cpf, normalizar_cpfs, validar_cpf, validar_cpfs
+
+FORMAS_NAO_ASCII = [
+    '٠٣٣٢٠٦٨٨١١١',        # dígitos arábico-índicos
+    '０３３２０６８８１１１',  # dígitos de largura total
+    '033.206.881-１１',     # mistura de ASCII e largura total
+]
+
+
+def test_formas_ascii_sao_o_mesmo_eleitor():
+    assert normalizar_cpf('033.206.881-11') == normalizar_cpf('03320688111') == '03320688111'
+
+
+@pytest.mark.parametrize('cpf', FORMAS_NAO_ASCII)
+def test_digitos_fora_do_ascii_sao_recusados(cpf):
+    assert not validar_cpf(cpf)
+    assert normalizar_cpf(cpf) is None
+
+
+@pytest.mark.parametrize('com_numpy', [True, False])
+def test_lote_segue_a_regra_da_funcao_escalar(monkeypatch, com_numpy):
+    if not com_numpy:
+        monkeypatch.setattr(validacao_cpf, 'np', None)
+    elif validacao_cpf.np is None:
+        pytest.skip('NumPy não instalado')
+    cpfs = ['03320688111', '033.206.881-11'] + FORMAS_NAO_ASCII
+    assert normalizar_cpfs(cpfs) == ['03320688111', '03320688111'] + [None] * len(FORMAS_NAO_ASCII)
+    assert validar_cpfs(cpfs) == [True, True] + [False] * len(FORMAS_NAO_ASCII)
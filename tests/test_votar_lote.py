@@ -0,0 +1,86 @@
+# test_votar_lote.py
+import json
+import sqlite3
+
+import pytest
+
+import servidor
+from apoio import assinar_voto, gerar_eleitor
+
+CPFS = ['11144477735', '52998224725', '39053344705']
+CPF_NAO_REGISTRADO = '86288366757'
+
+
+@pytest.fixture(params=[1, 2], ids=['uma_particao', 'duas_particoes'])
+def cliente(request, tmp_path, monkeypatch):
+    """Cliente de teste do servidor e as chaves dos eleitores registrados em CPFS."""
+    monkeypatch.setattr(servidor, 'DATABASE_NAME', str(tmp_path / 'votacao_database.db'))
+    monkeypatch.setattr(servidor, 'URNA_NUM_PARTICOES', request.param)
+    monkeypatch.setattr(servidor, 'APURACAO_NUM_WORKERS', 1)
+    servidor.init_db()
+    cliente = servidor.app.test_client()
+    chaves = {}
+    for cpf in CPFS:
+        chaves[cpf], registro = gerar_eleitor(cpf)
+        assert cliente.post('/registrar_eleitor', json=registro).status_code == 201
+    return cliente, chaves
+
+
+def votos_na_urna():
+    votos = {}
+    for caminho in servidor.obter_urna().caminhos:
+        conn = sqlite3.connect(caminho)
+        votos.update(conn.execute('SELECT eleitor_cpf, candidato_id FROM votos'))
+        conn.close()
+    return votos
+
+
+@pytest.mark.parametrize('indice', [True, False], ids=['com_indice', 'sem_indice'])
+def test_status_por_item_na_ordem_do_lote(cliente, monkeypatch, indice):
+    cliente, chaves = cliente
+    if not indice:
+        monkeypatch.setattr(servidor, 'indice_admissao', None)
+    chave_avulsa, _ = gerar_eleitor(CPF_NAO_REGISTRADO)
+    lote = [
+        assinar_voto(chaves[CPFS[0]], CPFS[0], 'Candidato_A'),
+        assinar_voto(chave_avulsa, CPF_NAO_REGISTRADO, 'Candidato_A'),
+        # Segundo voto do mesmo CPF no mesmo lote, com o CPF formatado
+        assinar_voto(chaves[CPFS[0]], '111.444.777-35', 'Candidato_B'),
+        {'voto_data': {'eleitor_cpf': CPFS[1]}},
+        assinar_voto(chaves[CPFS[1]], CPFS[1], 'Candidato_B'),
+    ]
+    resposta = cliente.post('/votar_lote', json=lote)
+    assert resposta.status_code == 200
+    assert resposta.get_json()['itens'] == [
+        {'cpf': CPFS[0], 'status': 'ok'},
+        {'cpf': CPF_NAO_REGISTRADO, 'status': 'nao_registrado'},
+        {'cpf': CPFS[0], 'status': 'ja_votou'},
+        {'cpf': None, 'status': 'invalido'},
+        {'cpf': CPFS[1], 'status': 'ok'},
+    ]
+    assert votos_na_urna() == {CPFS[0]: 'Candidato_A', CPFS[1]: 'Candidato_B'}
+
+    # Um voto já gravado por outra requisição também é recusado
+    resposta = cliente.post('/votar_lote', json=[assinar_voto(chaves[CPFS[1]], CPFS[1], 'Candidato_A'),
+                                                  assinar_voto(chaves[CPFS[2]], CPFS[2], 'Candidato_A')])
+    assert [item['status'] for item in resposta.get_json()['itens']] == ['ja_votou', 'ok']
+    assert servidor.calcular_apuracao()[2] == []
+
+
+def test_lote_em_ndjson(cliente):
+    cliente, chaves = cliente
+    corpo = ''.join(json.dumps(assinar_voto(chaves[cpf], cpf, 'Candidato_A')) + '\n' for cpf in CPFS)
+    resposta = cliente.post('/votar_lote', data=corpo, content_type='application/x-ndjson')
+    assert [item['status'] for item in resposta.get_json()['itens']] == ['ok'] * len(CPFS)
+    assert json.loads(servidor.calcular_apuracao()[0])['resultado_final'] == {'Candidato_A': len(CPFS)}
+
+
+def test_lote_malformado_ou_grande_demais(cliente, monkeypatch):
+    cliente, chaves = cliente
+    assert cliente.post('/votar_lote', json={'voto_data': {}}).status_code == 400
+    assert cliente.post('/votar_lote', data='{nao e json\n', content_type='application/x-ndjson').status_code == 400
+
+    monkeypatch.setattr(servidor, 'VOTAR_LOTE_TAMANHO_MAXIMO', 2)
+    lote = [assinar_voto(chaves[cpf], cpf, 'Candidato_A') for cpf in CPFS]
+    assert cliente.post('/votar_lote', json=lote).status_code == 413
+    assert votos_na_urna() == {}